@@ -1,3 +1,48 @@
+from django import forms
 from django.contrib import admin
 
-# Register your models here.
+from instagram_automation.models import InstagramAccount, ScanRun, UsernameChange
+
+
+class InstagramAccountForm(forms.ModelForm):
+    """Never renders the stored password; leaving the field blank keeps it"""
+    password = forms.CharField(
+        widget=forms.PasswordInput(render_value=False),
+        required=False,
+        help_text="Leave blank to keep the current password."
+    )
+
+    class Meta:
+        model = InstagramAccount
+        fields = "__all__"
+
+    def clean_password(self) -> str:
+        password = self.cleaned_data["password"]
+        if password:
+            return password
+        if self.instance.pk:
+            return self.instance.password
+        raise forms.ValidationError("New accounts need a password.")
+
+
+@admin.register(InstagramAccount)
+class InstagramAccountAdmin(admin.ModelAdmin):
+    form = InstagramAccountForm
+    list_display = ("username", "is_active", "max_concurrent_requests", "next_scan_at", "created_at")
+    list_filter = ("is_active",)
+    search_fields = ("username",)
+
+
+
+@admin.register(ScanRun)
+class ScanRunAdmin(admin.ModelAdmin):
+    list_display = ("scan_id", "username", "status", "started_at", "finished_at", "pages", "requests", "throttled")
+    list_filter = ("status",)
+    search_fields = ("scan_id", "username")
+
+
+
+@admin.register(UsernameChange)
+class UsernameChangeAdmin(admin.ModelAdmin):
+    list_display = ("old_username", "new_username", "user", "detected_at")
+    search_fields = ("old_username", "new_username")
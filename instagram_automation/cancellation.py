@@ -0,0 +1,57 @@
+import logging
+from typing import Optional
+
+import redis
+from redis import asyncio as aioredis
+
+logger = logging.getLogger("instagram_automation")
+
+CANCEL_TTL = 60 * 60
+
+
+class ScanCancelled(Exception):
+    """The user cancelled the scan; nothing from this run is persisted"""
+
+
+def _cancel_key(username: str) -> str:
+    return f"scan_cancel_for_{username}"
+
+
+def request_cancel(redis_client: redis.Redis, username: str, task_id: str) -> None:
+    """Ask the task `task_id` scanning `username` to stop at its next checkpoint"""
+    redis_client.set(_cancel_key(username), task_id, ex=CANCEL_TTL)
+
+
+async def arequest_cancel(redis_client: aioredis.Redis, username: str, task_id: str) -> None:
+    await redis_client.set(_cancel_key(username), task_id, ex=CANCEL_TTL)
+
+
+def is_cancel_requested(redis_client: redis.Redis, username: str) -> bool:
+    return bool(redis_client.exists(_cancel_key(username)))
+
+
+async def ais_cancel_requested(redis_client: aioredis.Redis, username: str) -> bool:
+    return bool(await redis_client.exists(_cancel_key(username)))
+
+
+class CancelToken:
+    """Checked between pages and browser steps; only a cancel aimed at this task id stops it"""
+
+    def __init__(self, *, username: str, task_id: Optional[str]):
+        self.username = username
+        self.task_id = task_id
+
+    def _matches(self, value: Optional[bytes]) -> bool:
+        return value is not None and value.decode() == self.task_id
+
+    def raise_if_cancelled(self, redis_client: redis.Redis) -> None:
+        if self._matches(redis_client.get(_cancel_key(self.username))):
+            raise ScanCancelled(f"Scan for {self.username} was cancelled.")
+
+    async def araise_if_cancelled(self, redis_client: aioredis.Redis) -> None:
+        if self._matches(await redis_client.get(_cancel_key(self.username))):
+            raise ScanCancelled(f"Scan for {self.username} was cancelled.")
+
+    def clear(self, redis_client: redis.Redis) -> None:
+        if self._matches(redis_client.get(_cancel_key(self.username))):
+            redis_client.delete(_cancel_key(self.username))
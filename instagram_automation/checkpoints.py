@@ -0,0 +1,86 @@
+import logging
+from typing import NamedTuple, Optional, Set
+
+import redis
+from django.conf import settings
+from redis import asyncio as aioredis
+
+logger = logging.getLogger("instagram_automation")
+
+LIST_TYPES = ("Followers", "Following")
+
+
+class Checkpoint(NamedTuple):
+    max_id: Optional[str]
+    user_ids: Set[int]
+    users_inserted: int
+    pages: int
+    done: bool
+
+
+def _meta_key(username: str, list_type: str) -> str:
+    return f"scan_checkpoint_for_{username}_{list_type}"
+
+
+def _ids_key(username: str, list_type: str) -> str:
+    return f"{_meta_key(username, list_type)}_ids"
+
+
+class ListCheckpointer:
+    """Saves a list's cursor and the user ids stored so far every few pages, so a retried
+    scan only fetches the missing pages. Checkpoints expire after SCAN_CHECKPOINT_TTL."""
+
+    def __init__(self, *, redis_client: aioredis.Redis, username: str, list_type: str):
+        self._redis = redis_client
+        self._meta_key = _meta_key(username, list_type)
+        self._ids_key = _ids_key(username, list_type)
+        self._unsaved_ids: Set[int] = set()
+        self._unsaved_pages = 0
+
+    async def load(self) -> Optional[Checkpoint]:
+        meta = await self._redis.hgetall(self._meta_key)
+        if not meta:
+            return None
+
+        meta = {key.decode(): value.decode() for key, value in meta.items()}
+        user_ids = {int(user_id) for user_id in await self._redis.smembers(self._ids_key)}
+        return Checkpoint(
+            max_id=meta.get("max_id") or None,
+            user_ids=user_ids,
+            users_inserted=int(meta.get("users_inserted", 0)),
+            pages=int(meta.get("pages", 0)),
+            done=meta.get("done") == "1",
+        )
+
+    async def page_stored(self, *, page_ids: Set[int], next_max_id: Optional[str], pages: int, users_inserted: int) -> None:
+        self._unsaved_ids |= page_ids
+        self._unsaved_pages += 1
+
+        done = next_max_id is None
+        if self._unsaved_pages < settings.SCAN_CHECKPOINT_EVERY_PAGES and not done:
+            return
+
+        ttl = settings.SCAN_CHECKPOINT_TTL
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if self._unsaved_ids:
+                pipe.sadd(self._ids_key, *self._unsaved_ids)
+            pipe.hset(self._meta_key, mapping={
+                "max_id": next_max_id or "",
+                "users_inserted": users_inserted,
+                "pages": pages,
+                "done": int(done),
+            })
+            pipe.expire(self._ids_key, ttl)
+            pipe.expire(self._meta_key, ttl)
+            await pipe.execute()
+
+        self._unsaved_ids = set()
+        self._unsaved_pages = 0
+
+
+def clear_checkpoints(redis_client: redis.Redis, username: str) -> None:
+    """Drop checkpoints once the snapshot they feed has been persisted"""
+    keys = []
+    for list_type in LIST_TYPES:
+        keys.extend([_meta_key(username, list_type), _ids_key(username, list_type)])
+    redis_client.delete(*keys)
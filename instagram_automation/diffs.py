@@ -0,0 +1,228 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+
+from instagram_automation.models import FollowerSnapshot, FollowMembership, InstagramUser, SnapshotDiff, SnapshotDiffMember
+from instagram_automation.packed_ids import difference
+
+
+def membership_difference(*,
+    left_snapshot: FollowerSnapshot,
+    left_relation: str,
+    right_snapshot: FollowerSnapshot,
+    right_relation: str
+) -> QuerySet:
+    """Usernames in the left set but not the right one.
+
+    Packed snapshots are compared in memory as sorted id arrays and only the
+    difference is looked up; older snapshots fall back to the interval anti-join.
+    """
+    left_ids = left_snapshot.member_id_array(left_relation)
+    right_ids = right_snapshot.member_id_array(right_relation)
+    if left_ids is not None and right_ids is not None:
+        return (
+            InstagramUser.objects.filter(id__in=difference(left_ids, right_ids).tolist())
+            .order_by("username")
+            .values_list("username", flat=True)
+        )
+
+    return interval_difference(
+        left_snapshot=left_snapshot,
+        left_relation=left_relation,
+        right_snapshot=right_snapshot,
+        right_relation=right_relation
+    )
+
+
+def _interval_anti_join(*,
+    left_snapshot: FollowerSnapshot,
+    left_relation: str,
+    right_snapshot: FollowerSnapshot,
+    right_relation: str
+) -> QuerySet:
+    right_members = FollowMembership.objects.at_snapshot(right_snapshot, right_relation).filter(
+        user_id=OuterRef("user_id")
+    )
+    return FollowMembership.objects.at_snapshot(left_snapshot, left_relation).filter(~Exists(right_members))
+
+
+def interval_difference(*,
+    left_snapshot: FollowerSnapshot,
+    left_relation: str,
+    right_snapshot: FollowerSnapshot,
+    right_relation: str
+) -> QuerySet:
+    """Usernames in the left set but not the right one, computed as a single anti-join over membership intervals"""
+    return (
+        _interval_anti_join(
+            left_snapshot=left_snapshot,
+            left_relation=left_relation,
+            right_snapshot=right_snapshot,
+            right_relation=right_relation
+        )
+        .order_by("user__username")
+        .values_list("user__username", flat=True)
+    )
+
+
+def difference_users(*,
+    left_snapshot: FollowerSnapshot,
+    left_relation: str,
+    right_snapshot: FollowerSnapshot,
+    right_relation: str
+) -> QuerySet:
+    """Users in the left set but not the right one, as an unordered InstagramUser queryset to filter and page"""
+    left_ids = left_snapshot.member_id_array(left_relation)
+    right_ids = right_snapshot.member_id_array(right_relation)
+    if left_ids is not None and right_ids is not None:
+        return InstagramUser.objects.filter(id__in=difference(left_ids, right_ids).tolist())
+
+    return InstagramUser.objects.filter(id__in=_interval_anti_join(
+        left_snapshot=left_snapshot,
+        left_relation=left_relation,
+        right_snapshot=right_snapshot,
+        right_relation=right_relation
+    ).values("user_id"))
+
+
+def unfollower_users(*, previous_snapshot: FollowerSnapshot, latest_snapshot: FollowerSnapshot) -> QuerySet:
+    return difference_users(
+        left_snapshot=previous_snapshot,
+        left_relation=FollowMembership.FOLLOWER,
+        right_snapshot=latest_snapshot,
+        right_relation=FollowMembership.FOLLOWER
+    )
+
+
+def not_following_back_users(*, snapshot: FollowerSnapshot) -> QuerySet:
+    return difference_users(
+        left_snapshot=snapshot,
+        left_relation=FollowMembership.FOLLOWING,
+        right_snapshot=snapshot,
+        right_relation=FollowMembership.FOLLOWER
+    )
+
+
+def _change_differences(*, from_snapshot: FollowerSnapshot, to_snapshot: FollowerSnapshot) -> Iterator[Tuple[str, dict]]:
+    """(name, difference arguments) of each follower/following change between two snapshots"""
+    for name, left_snapshot, right_snapshot, relation in (
+        ("lost_followers", from_snapshot, to_snapshot, FollowMembership.FOLLOWER),
+        ("new_followers", to_snapshot, from_snapshot, FollowMembership.FOLLOWER),
+        ("newly_followed", to_snapshot, from_snapshot, FollowMembership.FOLLOWING),
+        ("unfollowed_by_me", from_snapshot, to_snapshot, FollowMembership.FOLLOWING),
+    ):
+        yield name, {
+            "left_snapshot": left_snapshot,
+            "left_relation": relation,
+            "right_snapshot": right_snapshot,
+            "right_relation": relation,
+        }
+
+
+def compare_snapshots(*, from_snapshot: FollowerSnapshot, to_snapshot: FollowerSnapshot) -> Dict[str, List[str]]:
+    """Follower/following changes between two snapshots of the same profile"""
+    return {
+        name: list(membership_difference(**arguments))
+        for name, arguments in _change_differences(from_snapshot=from_snapshot, to_snapshot=to_snapshot)
+    }
+
+
+class SnapshotPairCache:
+    """Bounded LRU of pair diffs. Snapshots never change once written, but retention GC may delete them."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[int, int], dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[int, int]) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def evict(self, key: Tuple[int, int]) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.evictions += 1
+
+    def put(self, key: Tuple[int, int], entry: dict) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+snapshot_pair_cache = SnapshotPairCache(maxsize=settings.SNAPSHOT_DIFF_CACHE_SIZE)
+
+# Lists stored on every SnapshotDiff, as its JSON and count columns
+DIFF_LIST_NAMES = ("lost_followers", "new_followers", "newly_followed", "unfollowed_by_me", "not_following_back")
+
+
+def build_snapshot_diff(*, snapshot: FollowerSnapshot) -> SnapshotDiff:
+    """Compute and store the diff between `snapshot` and the profile's previous snapshot, with the members of its dashboard lists"""
+    previous_snapshot = (
+        FollowerSnapshot.objects.filter(profile_id=snapshot.profile_id, id__lt=snapshot.id)
+        .order_by("-id")
+        .first()
+    )
+
+    differences = dict(_change_differences(from_snapshot=previous_snapshot, to_snapshot=snapshot)) if previous_snapshot else {}
+    differences["not_following_back"] = {
+        "left_snapshot": snapshot,
+        "left_relation": FollowMembership.FOLLOWING,
+        "right_snapshot": snapshot,
+        "right_relation": FollowMembership.FOLLOWER,
+    }
+    # Each difference is computed once; its count, usernames or member rows all come from the same (id, username) rows.
+    rows: Dict[str, List[Tuple[int, str]]] = {name: [] for name in DIFF_LIST_NAMES}
+    for name, arguments in differences.items():
+        rows[name] = list(difference_users(**arguments).order_by("username").values_list("id", "username"))
+    member_lists = {list_name for list_name, _ in SnapshotDiffMember.LIST_CHOICES}
+    # Dashboard lists live in SnapshotDiffMember rows only; their JSON columns stay empty.
+    lists = {name: [] if name in member_lists else [username for _, username in name_rows] for name, name_rows in rows.items()}
+    counts = {f"{name}_count": len(name_rows) for name, name_rows in rows.items()}
+    with transaction.atomic():
+        diff, _ = SnapshotDiff.objects.update_or_create(
+            snapshot=snapshot,
+            defaults={
+                "previous_snapshot": previous_snapshot,
+                "is_partial": snapshot.scan_mode == FollowerSnapshot.INCREMENTAL,
+                "members_stored": True,
+                **lists,
+                **counts,
+            }
+        )
+        diff.members.all().delete()
+        SnapshotDiffMember.objects.bulk_create(
+            [
+                SnapshotDiffMember(diff=diff, list_name=list_name, user_id=user_id, username=username)
+                for list_name in member_lists
+                for user_id, username in rows[list_name]
+            ],
+            batch_size=settings.SNAPSHOT_INGEST_BATCH_SIZE
+        )
+    return diff
@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, List, Optional
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+from instagram_automation.metrics import ScanMetrics
+
+logger = logging.getLogger("instagram_automation")
+
+CHROME_DRIVER_PATH = '/app/drivers/chromedriver'
+
+
+def create_chrome_driver() -> webdriver.Chrome:
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
+
+    service = Service(executable_path=CHROME_DRIVER_PATH)
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+
+def _process_tree_rss_mb(pid: int) -> float:
+    """Resident memory of a process and all its descendants (chromedriver -> chrome -> renderers), Linux only"""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total_pages = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total_pages += int(f.read().split()[1])
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError, IndexError):
+            continue
+    return total_pages * page_size / (1024 * 1024)
+
+
+class _PooledDriver:
+    def __init__(self, driver: webdriver.Chrome, username: str):
+        self.driver = driver
+        self.username = username
+        self.uses = 0
+
+    @property
+    def rss_mb(self) -> float:
+        process = getattr(self.driver.service, "process", None)
+        return _process_tree_rss_mb(process.pid) if process else 0.0
+
+
+class DriverPool:
+    """Keeps up to `size` logged-in headless browsers alive in this worker process"""
+
+    def __init__(self, *, size: int, max_uses: int, max_rss_mb: int):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self._idle: List[_PooledDriver] = []
+        self._checked_out = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def checkout(self, *,
+        username: str,
+        login: Callable[[webdriver.Chrome], None],
+        metrics: Optional[ScanMetrics] = None
+    ) -> Iterator[webdriver.Chrome]:
+        """Borrow a browser logged in as `username`; `login` is only called for new or logged-out browsers"""
+        pooled = self._acquire(username=username, login=login, metrics=metrics)
+        try:
+            yield pooled.driver
+        finally:
+            self._release(pooled)
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._quit(pooled, reason="pool closed")
+
+    def _acquire(self, *,
+        username: str,
+        login: Callable[[webdriver.Chrome], None],
+        metrics: Optional[ScanMetrics] = None
+    ) -> _PooledDriver:
+        with self._condition:
+            while not self._idle and self._checked_out >= self.size:
+                self._condition.wait()
+            pooled = self._take_idle(username)
+            self._checked_out += 1
+
+        try:
+            if pooled and pooled.username != username:
+                self._quit(pooled, reason=f"slot needed for {username}")
+                pooled = None
+
+            if pooled and not self._is_alive(pooled):
+                self._quit(pooled, reason="dead session")
+                pooled = None
+
+            if pooled is None:
+                logger.info(f"Starting a new pooled browser for {username}...")
+                with metrics.phase("driver_startup") if metrics else nullcontext():
+                    pooled = _PooledDriver(create_chrome_driver(), username)
+                login(pooled.driver)
+            elif pooled.driver.get_cookie("sessionid") is None:
+                logger.info("Pooled browser lost its session cookie. Logging in again.")
+                login(pooled.driver)
+            else:
+                logger.info(f"Reusing warm browser for {username} (use {pooled.uses + 1}/{self.max_uses}).")
+
+            pooled.uses += 1
+            return pooled
+
+        except BaseException:
+            if pooled:
+                self._quit(pooled, reason="checkout failed")
+            with self._condition:
+                self._checked_out -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, pooled: _PooledDriver) -> None:
+        reason = None
+        if pooled.uses >= self.max_uses:
+            reason = f"reached {pooled.uses} uses"
+        else:
+            rss_mb = pooled.rss_mb
+            if rss_mb > self.max_rss_mb:
+                reason = f"RSS {rss_mb:.0f} MB over {self.max_rss_mb} MB"
+
+        if reason:
+            self._quit(pooled, reason=reason)
+
+        with self._condition:
+            self._checked_out -= 1
+            if not reason:
+                self._idle.append(pooled)
+            self._condition.notify()
+
+    def _take_idle(self, username: str) -> Optional[_PooledDriver]:
+        for index, pooled in enumerate(self._idle):
+            if pooled.username == username:
+                return self._idle.pop(index)
+        return self._idle.pop(0) if self._idle else None
+
+    @staticmethod
+    def _is_alive(pooled: _PooledDriver) -> bool:
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def _quit(pooled: _PooledDriver, *, reason: str) -> None:
+        logger.info(f"Recycling browser for {pooled.username}: {reason}.")
+        try:
+            pooled.driver.quit()
+        except WebDriverException as e:
+            logger.warning(f"Error while closing browser: {e}")
+
+
+_pool: Optional[DriverPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    """The driver pool owned by the current worker process"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Celery forks worker processes; never share browsers with the parent.
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = DriverPool(
+                size=settings.CHROME_POOL_SIZE,
+                max_uses=settings.CHROME_POOL_MAX_USES,
+                max_rss_mb=settings.CHROME_POOL_MAX_RSS_MB
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@worker_process_shutdown.connect
+def _close_driver_pool(**kwargs) -> None:
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
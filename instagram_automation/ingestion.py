@@ -0,0 +1,332 @@
+import logging
+import time
+from typing import AbstractSet, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, QuerySet
+
+from instagram_automation.models import FollowerSnapshot, FollowMembership, InstagramUser, UsernameChange
+from instagram_automation.packed_ids import pack_ids
+from instagram_automation.rollups import store_snapshot_rollup
+
+logger = logging.getLogger("instagram_automation")
+
+
+class StaleFencingTokenError(Exception):
+    """A newer scan lease holder already wrote a snapshot for this profile"""
+
+
+class UserRecord(NamedTuple):
+    """The only fields of an API user entry that we keep"""
+    pk: int
+    username: str
+    full_name: str
+
+
+def _chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _values_sql(records: Sequence[UserRecord]) -> Tuple[str, List]:
+    params: List = []
+    for record in records:
+        params.extend([record.pk, record.username, record.full_name])
+    return ", ".join(["(%s::bigint, %s, %s)"] * len(records)), params
+
+
+def _adopt_placeholder_users(records: Sequence[UserRecord]) -> int:
+    """Give rows from before pks were stored the pk of the user with their username, keeping their id and history"""
+    table = connection.ops.quote_name(InstagramUser._meta.db_table)
+    values, params = _values_sql(records)
+    sql = f"""
+        UPDATE {table} placeholder
+        SET instagram_pk = input.instagram_pk
+        FROM (VALUES {values}) AS input (instagram_pk, username, full_name)
+        WHERE placeholder.instagram_pk IS NULL
+          AND placeholder.username = input.username
+          AND NOT EXISTS (SELECT 1 FROM {table} existing WHERE existing.instagram_pk = input.instagram_pk)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _update_changed_users(changed: Sequence[Tuple[int, str, UserRecord]]) -> None:
+    """Write back new usernames and full names of (id, old username, record) and log the renames"""
+    InstagramUser.objects.bulk_update(
+        [InstagramUser(id=user_id, username=record.username, full_name=record.full_name) for user_id, _, record in changed],
+        ["username", "full_name"]
+    )
+    UsernameChange.objects.bulk_create([
+        UsernameChange(user_id=user_id, old_username=old_username, new_username=record.username)
+        for user_id, old_username, record in changed
+        if old_username != record.username
+    ])
+
+
+def _upsert_user_chunk(records: Sequence[UserRecord]) -> Tuple[Dict[int, int], int, int]:
+    """Insert the missing users of one chunk in a single statement; return (pk -> id, inserted count, changed count)"""
+    table = connection.ops.quote_name(InstagramUser._meta.db_table)
+    values, params = _values_sql(records)
+
+    sql = f"""
+        WITH input (instagram_pk, username, full_name) AS (VALUES {values}),
+        inserted AS (
+            INSERT INTO {table} (instagram_pk, username, full_name)
+            SELECT instagram_pk, username, full_name FROM input
+            ON CONFLICT (instagram_pk) DO NOTHING
+            RETURNING id, instagram_pk
+        )
+        SELECT id, instagram_pk, NULL, NULL, TRUE FROM inserted
+        UNION ALL
+        SELECT existing.id, existing.instagram_pk, existing.username, existing.full_name, FALSE
+        FROM {table} existing
+        JOIN input ON input.instagram_pk = existing.instagram_pk
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    by_pk = {record.pk: record for record in records}
+    user_ids: Dict[int, int] = {}
+    inserted = 0
+    changed: List[Tuple[int, str, UserRecord]] = []
+    for user_id, instagram_pk, username, full_name, was_inserted in rows:
+        user_ids[instagram_pk] = user_id
+        if was_inserted:
+            inserted += 1
+            continue
+        record = by_pk[instagram_pk]
+        if username != record.username or (full_name or "") != record.full_name:
+            changed.append((user_id, username, record))
+
+    # Rows committed by a concurrent scan after our statement snapshot are
+    # neither inserted nor visible to the join above, so pick them up here.
+    missing = [record.pk for record in records if record.pk not in user_ids]
+    if missing:
+        user_ids.update(
+            InstagramUser.objects.filter(instagram_pk__in=missing).values_list("instagram_pk", "id")
+        )
+
+    if changed:
+        _update_changed_users(changed)
+
+    return user_ids, inserted, len(changed)
+
+
+def placeholder_users_exist() -> bool:
+    """Whether rows from before pks were stored are left to adopt"""
+    return InstagramUser.objects.filter(instagram_pk__isnull=True).exists()
+
+
+def upsert_user_records(
+    records: Iterable[UserRecord],
+    *,
+    has_placeholders: Optional[bool] = None
+) -> Tuple[Dict[int, int], int, int]:
+    """Upsert users by Instagram pk in batches and return (pk -> id, inserted count, batch count)
+
+    Scans check placeholder_users_exist() once and pass it as has_placeholders,
+    instead of checking again for every page.
+    """
+    batch_size = settings.SNAPSHOT_INGEST_BATCH_SIZE
+    unique = {record.pk: record for record in records}
+    ordered = [unique[pk] for pk in sorted(unique)]  # Stable lock order between concurrent scans
+    if has_placeholders is None:
+        has_placeholders = placeholder_users_exist()
+
+    user_ids: Dict[int, int] = {}
+    inserted = 0
+    changed = 0
+    batches = 0
+    for chunk in _chunks(ordered, batch_size):
+        if has_placeholders:
+            _adopt_placeholder_users(chunk)
+        chunk_ids, chunk_inserted, chunk_changed = _upsert_user_chunk(chunk)
+        user_ids.update(chunk_ids)
+        inserted += chunk_inserted
+        changed += chunk_changed
+        batches += 1
+
+    if changed:
+        logger.info(f"Updated {changed} users whose username or full name changed.")
+    return user_ids, inserted, batches
+
+
+def _profile_candidates(username: str) -> QuerySet:
+    return InstagramUser.objects.filter(username=username).order_by(F("instagram_pk").asc(nulls_last=True), "-id")
+
+
+def find_profile_user(username: str) -> Optional[InstagramUser]:
+    """The profile currently named username; a row with a real pk wins over a placeholder"""
+    return _profile_candidates(username).first()
+
+
+async def afind_profile_user(username: str) -> Optional[InstagramUser]:
+    return await _profile_candidates(username).afirst()
+
+
+def _lock_profile_username(username: str) -> None:
+    """Serialize profile row creation for username until the transaction ends; usernames aren't unique, so no constraint does"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"instagram_profile:{username}"])
+
+
+def get_or_create_profile_user(username: str) -> InstagramUser:
+    """The profile currently named username, or a new placeholder row for it; concurrent callers get the same row"""
+    profile = find_profile_user(username)
+    if profile is not None:
+        return profile
+    with transaction.atomic():
+        _lock_profile_username(username)
+        return find_profile_user(username) or InstagramUser.objects.create(username=username)
+
+
+async def aget_or_create_profile_user(username: str) -> InstagramUser:
+    return await afind_profile_user(username) or await sync_to_async(get_or_create_profile_user)(username)
+
+
+def resolve_profile_user(*, username: str, instagram_pk: Optional[int] = None) -> InstagramUser:
+    """The scanned profile's row, keyed by its pk when the session provides one"""
+    if instagram_pk is None:
+        return get_or_create_profile_user(username)
+
+    with transaction.atomic():
+        # Keeps a dashboard from adding a placeholder for username while we adopt or create the row.
+        _lock_profile_username(username)
+        profile = InstagramUser.objects.select_for_update().filter(instagram_pk=instagram_pk).first()
+        if profile is None:
+            profile = InstagramUser.objects.select_for_update().filter(username=username, instagram_pk__isnull=True).first()
+            if profile is None:
+                profile, _ = InstagramUser.objects.get_or_create(instagram_pk=instagram_pk, defaults={"username": username})
+                return profile
+            profile.instagram_pk = instagram_pk
+            profile.save(update_fields=["instagram_pk"])
+
+        if profile.username != username:
+            UsernameChange.objects.create(user=profile, old_username=profile.username, new_username=username)
+            profile.username = username
+            profile.save(update_fields=["username"])
+        return profile
+
+
+def _reconcile_intervals(*, profile_user: InstagramUser, relation: str, current_ids: Set[int], partial: bool, snapshot: FollowerSnapshot, previous_snapshot: Optional[FollowerSnapshot]) -> Tuple[int, int, int, Set[int]]:
+    """Open intervals for users who joined the list and close them for users who left; return (opened, closed, batches, members)
+
+    A partial list only covers its head, so users missing from it are assumed to still be there.
+    """
+    batch_size = settings.SNAPSHOT_INGEST_BATCH_SIZE
+    open_intervals = FollowMembership.objects.open().filter(profile=profile_user, relation=relation)
+    open_ids = set(open_intervals.values_list("user_id", flat=True))
+
+    to_close = [] if partial else sorted(open_ids - current_ids)
+    to_open = sorted(current_ids - open_ids)
+    batches = 0
+
+    for chunk in _chunks(to_close, batch_size):
+        # Only an earlier snapshot can have opened these, so previous_snapshot is set here.
+        open_intervals.filter(user_id__in=chunk).update(last_seen_snapshot=previous_snapshot)
+        batches += 1
+
+    for chunk in _chunks(to_open, batch_size):
+        FollowMembership.objects.bulk_create([
+            FollowMembership(
+                profile=profile_user,
+                user_id=user_id,
+                relation=relation,
+                first_seen_snapshot=snapshot
+            )
+            for user_id in chunk
+        ])
+        batches += 1
+
+    members = open_ids | current_ids if partial else current_ids
+    return len(to_open), len(to_close), batches, members
+
+
+def ingest_snapshot(*,
+    profile_user: InstagramUser,
+    follower_ids: Set[int],
+    following_ids: Set[int],
+    partial_relations: AbstractSet[str] = frozenset(),
+    reported_follower_count: Optional[int] = None,
+    reported_following_count: Optional[int] = None,
+    fencing_token: Optional[int] = None
+) -> Tuple[FollowerSnapshot, dict]:
+    """Persist a snapshot of already-stored users; DB time scales with batches and changes, not users"""
+    started_at = time.monotonic()
+
+    with transaction.atomic():
+        # Serialize ingestion per profile so interval reconciliation sees a stable set of open rows.
+        InstagramUser.objects.select_for_update().get(pk=profile_user.pk)
+        if fencing_token is not None:
+            newest_token = FollowerSnapshot.objects.filter(profile=profile_user).aggregate(
+                newest=Max("fencing_token")
+            )["newest"]
+            if newest_token is not None and newest_token >= fencing_token:
+                raise StaleFencingTokenError(
+                    f"Fencing token {fencing_token} is not newer than {newest_token} for {profile_user.username}."
+                )
+        previous_snapshot = FollowerSnapshot.objects.filter(profile=profile_user).order_by("-id").first()
+        snapshot = FollowerSnapshot.objects.create(
+            profile=profile_user,
+            scan_mode=FollowerSnapshot.INCREMENTAL if partial_relations else FollowerSnapshot.FULL,
+            reported_follower_count=reported_follower_count,
+            reported_following_count=reported_following_count,
+            fencing_token=fencing_token
+        )
+
+        batches = 0
+        intervals_opened = 0
+        intervals_closed = 0
+        packed: Dict[str, bytes] = {}
+        members_by_relation: Dict[str, Set[int]] = {}
+        changes_by_relation: Dict[str, Tuple[int, int]] = {}
+        for relation, members in ((FollowMembership.FOLLOWER, follower_ids), (FollowMembership.FOLLOWING, following_ids)):
+            opened, closed, relation_batches, snapshot_members = _reconcile_intervals(
+                profile_user=profile_user,
+                relation=relation,
+                current_ids=members,
+                partial=relation in partial_relations,
+                snapshot=snapshot,
+                previous_snapshot=previous_snapshot
+            )
+            intervals_opened += opened
+            intervals_closed += closed
+            batches += relation_batches
+            packed[relation] = pack_ids(snapshot_members)
+            members_by_relation[relation] = snapshot_members
+            changes_by_relation[relation] = (opened, closed)
+
+        snapshot.follower_ids_packed = packed[FollowMembership.FOLLOWER]
+        snapshot.following_ids_packed = packed[FollowMembership.FOLLOWING]
+        snapshot.save(update_fields=["follower_ids_packed", "following_ids_packed"])
+
+        # Opened and closed follower intervals are exactly the followers gained and lost since the previous snapshot.
+        followers = members_by_relation[FollowMembership.FOLLOWER]
+        following = members_by_relation[FollowMembership.FOLLOWING]
+        gained, lost = changes_by_relation[FollowMembership.FOLLOWER] if previous_snapshot else (0, 0)
+        store_snapshot_rollup(
+            snapshot=snapshot,
+            follower_count=len(followers),
+            following_count=len(following),
+            gained=gained,
+            lost=lost,
+            reciprocal_count=len(following & followers)
+        )
+
+    report = {
+        "intervals_opened": intervals_opened,
+        "intervals_closed": intervals_closed,
+        "batches": batches,
+        "duration_ms": round((time.monotonic() - started_at) * 1000, 1),
+    }
+    logger.info(
+        f"Ingested snapshot {snapshot.id}: {report['intervals_opened']} intervals opened, {report['intervals_closed']} closed "
+        f"in {report['batches']} batches ({report['duration_ms']} ms)"
+    )
+    return snapshot, report
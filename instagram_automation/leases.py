@@ -0,0 +1,150 @@
+import json
+import logging
+import time
+import uuid
+from typing import Optional
+
+import redis
+from django.conf import settings
+from django.db import connection
+from redis import asyncio as aioredis
+
+logger = logging.getLogger("instagram_automation")
+
+# Renew or delete the lease only while it still holds our owner token.
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# While we own the lease, its keep-alive entry can only be ours too.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('HDEL', KEYS[2], KEYS[1])
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+STOP_KEEP_ALIVE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('HDEL', KEYS[2], KEYS[1])
+end
+return 0
+"""
+
+FORGET_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# lease key -> {"token", "queued_at"} of the leases renew_kept_leases renews
+KEPT_LEASES_KEY = "scan_leases_kept_alive"
+
+
+class LeaseLost(Exception):
+    """The scan lease expired or now belongs to another worker; this run must not persist anything"""
+
+
+def lease_key(username: str) -> str:
+    return f"scan_lock_for_{username}"
+
+
+def next_fencing_token() -> int:
+    """Next value of the Postgres fencing sequence; unlike a Redis counter it survives a Redis restart and a rename"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval('instagram_automation_fencing_token_seq')")
+        return cursor.fetchone()[0]
+
+
+def lease_task_id(lease_value: Optional[bytes]) -> Optional[str]:
+    """Celery task id of the lease holder, from the `{task_id}:{nonce}` owner token"""
+    return lease_value.decode().split(":", 1)[0] if lease_value else None
+
+
+class ScanLease:
+    """Per-username scan lease with a unique owner token, kept alive by heartbeats.
+
+    Each acquisition also draws a fencing token from a Postgres sequence shared
+    by every profile; it is stored on the snapshot so a writer whose lease
+    lapsed can't overwrite the work of a newer holder.
+    """
+
+    def __init__(self, *, username: str, task_id: str):
+        self.username = username
+        self.key = lease_key(username)
+        self.token = f"{task_id}:{uuid.uuid4().hex}"
+        self.fencing_token: Optional[int] = None
+        self._renewed_at = 0.0
+
+    @classmethod
+    def resume(cls, *, username: str, token: str, fencing_token: int) -> "ScanLease":
+        """Rebuild a lease taken by an earlier pipeline stage; the next heartbeat renews it"""
+        lease = cls(username=username, task_id=token.split(":", 1)[0])
+        lease.token = token
+        lease.fencing_token = fencing_token
+        return lease
+
+    @property
+    def _ttl_ms(self) -> int:
+        return settings.SCAN_LEASE_TTL * 1000
+
+    def acquire(self, redis_client: redis.Redis) -> bool:
+        if not redis_client.set(self.key, self.token, px=self._ttl_ms, nx=True):
+            return False
+        try:
+            self.fencing_token = next_fencing_token()
+        except Exception:
+            self.release(redis_client)
+            raise
+        self._renewed_at = time.monotonic()
+        return True
+
+    def keep_alive(self, redis_client: redis.Redis) -> None:
+        """Have renew_kept_leases renew the lease while the scan waits in the next stage's queue"""
+        redis_client.hset(KEPT_LEASES_KEY, self.key, json.dumps({"token": self.token, "queued_at": time.time()}))
+
+    def stop_keep_alive(self, redis_client: redis.Redis) -> None:
+        """Called when a stage starts: from here its own renewals keep the lease, so it lapses if the worker dies"""
+        redis_client.register_script(STOP_KEEP_ALIVE_SCRIPT)(keys=[self.key, KEPT_LEASES_KEY], args=[self.token])
+
+    def renew(self, redis_client: redis.Redis) -> None:
+        if not redis_client.register_script(RENEW_SCRIPT)(keys=[self.key], args=[self.token, self._ttl_ms]):
+            raise LeaseLost(f"Scan lease for {self.username} was lost.")
+        self._renewed_at = time.monotonic()
+
+    async def heartbeat(self, redis_client: aioredis.Redis) -> None:
+        """Renew the lease if SCAN_LEASE_RENEW_INTERVAL has passed; called as pages arrive"""
+        if time.monotonic() - self._renewed_at < settings.SCAN_LEASE_RENEW_INTERVAL:
+            return
+        if not await redis_client.register_script(RENEW_SCRIPT)(keys=[self.key], args=[self.token, self._ttl_ms]):
+            raise LeaseLost(f"Scan lease for {self.username} was lost.")
+        self._renewed_at = time.monotonic()
+
+    def release(self, redis_client: redis.Redis) -> None:
+        if not redis_client.register_script(RELEASE_SCRIPT)(keys=[self.key, KEPT_LEASES_KEY], args=[self.token]):
+            logger.warning(f"Scan lease for {self.username} had already passed to another worker; left it alone.")
+
+
+def renew_kept_leases(redis_client: redis.Redis) -> int:
+    """Renew every lease whose scan waits in a stage queue; returns how many are still held.
+
+    Leases that were lost, or queued longer than SCAN_LEASE_MAX_QUEUE_WAIT (a
+    stage message that was never picked up), are forgotten and left to expire.
+    """
+    renew = redis_client.register_script(RENEW_SCRIPT)
+    forget = redis_client.register_script(FORGET_SCRIPT)
+    held = 0
+    for key, entry in redis_client.hgetall(KEPT_LEASES_KEY).items():
+        lease = json.loads(entry)
+        if time.time() - lease["queued_at"] > settings.SCAN_LEASE_MAX_QUEUE_WAIT:
+            logger.warning(f"Scan lease {key.decode()} waited longer than SCAN_LEASE_MAX_QUEUE_WAIT; leaving it to expire.")
+        elif renew(keys=[key], args=[lease["token"], settings.SCAN_LEASE_TTL * 1000]):
+            held += 1
+            continue
+        forget(keys=[KEPT_LEASES_KEY], args=[key, entry])
+    return held
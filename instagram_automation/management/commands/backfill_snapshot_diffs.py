@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from instagram_automation.diffs import build_snapshot_diff
+from instagram_automation.models import FollowerSnapshot
+
+
+class Command(BaseCommand):
+    help = "Compute SnapshotDiff rows for existing snapshots that don't have one yet, or whose list members aren't stored."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recompute diffs that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        snapshots = FollowerSnapshot.objects.order_by("id")
+        if not options["force"]:
+            snapshots = snapshots.filter(Q(diff__isnull=True) | Q(diff__members_stored=False))
+
+        built = 0
+        for snapshot in snapshots.iterator():
+            diff = build_snapshot_diff(snapshot=snapshot)
+            built += 1
+            self.stdout.write(
+                f"Snapshot {snapshot.id}: -{diff.lost_followers_count} / +{diff.new_followers_count} followers, "
+                f"{diff.not_following_back_count} not following back"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} snapshot diffs."))
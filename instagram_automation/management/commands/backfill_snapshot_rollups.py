@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from instagram_automation.models import FollowerSnapshot
+from instagram_automation.rollups import build_snapshot_rollup
+
+
+class Command(BaseCommand):
+    help = "Compute SnapshotRollup rows for existing snapshots that don't have one yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recompute rollups that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        snapshots = FollowerSnapshot.objects.order_by("id")
+        if not options["force"]:
+            snapshots = snapshots.filter(rollup__isnull=True)
+
+        built = 0
+        for snapshot in snapshots.iterator():
+            rollup = build_snapshot_rollup(snapshot=snapshot)
+            built += 1
+            self.stdout.write(
+                f"Snapshot {snapshot.id}: {rollup.follower_count} followers (+{rollup.gained} / -{rollup.lost}), "
+                f"{rollup.following_count} following, {rollup.reciprocal_count} mutual"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} snapshot rollups."))
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import resource
+import threading
+import time
+
+import redis
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory, override_settings
+
+from instagram_automation import views
+from instagram_automation.checkpoints import clear_checkpoints
+from instagram_automation.diffs import interval_difference, membership_difference
+from instagram_automation.mock_instagram import MOCK_RATE_SETTINGS, MockInstagramConfig, MockInstagramServer, mock_session_data
+from instagram_automation.models import FollowerSnapshot, FollowMembership
+from instagram_automation.redis_clients import get_redis
+from instagram_automation.tasks import _perform_concurrent_scraping, _persist_scan
+from instagram_automation.user_lists import USER_LISTS
+
+
+class _QueryTimer:
+    """execute_wrapper that adds up query time over every connection (the scraper writes from a worker thread)"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.seconds += time.monotonic() - started_at
+                self.queries += 1
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return self.seconds, self.queries
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Scan a synthetic account served by the local mock Instagram API into a throwaway "
+        "test database and report pages/sec, users/sec, peak RSS and DB time per phase."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--followers", type=int, default=10_000)
+        parser.add_argument("--following", type=int, default=2_000)
+        parser.add_argument("--mutual-ratio", type=float, default=0.8)
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Server-side delay per request.")
+        parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of list requests answered with 429.")
+        parser.add_argument("--server-error-rate", type=float, default=0.0, help="Share of list requests answered with 503.")
+        parser.add_argument("--page-size", type=int, default=200, help="Largest page the mock serves.")
+        parser.add_argument("--runs", type=int, default=1, help="Consecutive scans; later runs measure unchanged-list ingestion.")
+        parser.add_argument("--real-pacing", action="store_true", help="Keep the configured IG_RATE_* settings.")
+        parser.add_argument("--keepdb", action="store_true", help="Reuse and keep the test database.")
+        parser.add_argument("--json", action="store_true", help="Print one JSON report per run instead of text.")
+
+    def handle(self, *args, **options):
+        config = MockInstagramConfig(
+            user_id="900000",
+            username="benchmark_user",
+            follower_count=options["followers"],
+            following_count=options["following"],
+            mutual_ratio=options["mutual_ratio"],
+            latency_ms=options["latency_ms"],
+            throttle_rate=options["throttle_rate"],
+            server_error_rate=options["server_error_rate"],
+            max_page_size=options["page_size"],
+        )
+        redis_client = get_redis()
+        timer = _QueryTimer()
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        connections.close_all()
+        connection_created.connect(timer.install)
+        try:
+            server = MockInstagramServer(config)
+            with server.running_in_thread(), override_settings(
+                INSTAGRAM_BASE_URL=server.base_url,
+                INSTA_USER=config.username,
+                **({} if options["real_pacing"] else MOCK_RATE_SETTINGS)
+            ):
+                for run in range(1, options["runs"] + 1):
+                    report = self._run_once(config=config, server=server, timer=timer, redis_client=redis_client)
+                    report["run"] = run
+                    self._print_report(report, as_json=options["json"])
+        finally:
+            connection_created.disconnect(timer.install)
+            redis_client.delete(f"ig_rate_for_{config.user_id}")
+            clear_checkpoints(redis_client, config.username)
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+    def _run_once(self, *, config: MockInstagramConfig, server: MockInstagramServer, timer: _QueryTimer, redis_client: redis.Redis) -> dict:
+        clear_checkpoints(redis_client, config.username)
+        stats_before = dict(server.stats)
+        db_seconds, queries = timer.snapshot()
+
+        started_at = time.monotonic()
+        result = asyncio.run(_perform_concurrent_scraping(session_data=mock_session_data(config), username=config.username))
+        fetch_seconds = time.monotonic() - started_at
+        fetch_db_seconds, fetch_queries = timer.snapshot()
+        fetch_rss_mb = _peak_rss_mb()
+
+        started_at = time.monotonic()
+        snapshot = _persist_scan(username=config.username, result=result)
+        persist_seconds = time.monotonic() - started_at
+        persist_db_seconds, persist_queries = timer.snapshot()
+        diff_timings = self._time_diffs(snapshot)
+
+        started_at = time.monotonic()
+        response = async_to_sync(views.dashboard)(RequestFactory().get("/"))
+        list_pages = self._page_user_lists()
+        dashboard_seconds = time.monotonic() - started_at
+        dashboard_db_seconds, dashboard_queries = timer.snapshot()
+
+        served = {key: server.stats[key] - stats_before[key] for key in stats_before}
+        pages = served["pages"]
+        users = len(result.follower_ids) + len(result.following_ids)
+        return {
+            "users": users,
+            "pages": pages,
+            "requests": served["requests"],
+            "throttled": served["throttled"],
+            "server_errors": served["server_errors"],
+            "fetch": {
+                "seconds": round(fetch_seconds, 3),
+                "pages_per_sec": round(pages / fetch_seconds, 1),
+                "users_per_sec": round(users / fetch_seconds, 1),
+                "db_seconds": round(fetch_db_seconds - db_seconds, 3),
+                "queries": fetch_queries - queries,
+            },
+            "persist": {
+                "seconds": round(persist_seconds, 3),
+                "db_seconds": round(persist_db_seconds - fetch_db_seconds, 3),
+                "queries": persist_queries - fetch_queries,
+            },
+            "dashboard": {
+                "status": response.status_code,
+                "seconds": round(dashboard_seconds, 3),
+                "db_seconds": round(dashboard_db_seconds - persist_db_seconds, 3),
+                "queries": dashboard_queries - persist_queries,
+                **list_pages,
+            },
+            "diff_ms": diff_timings,
+            "peak_rss_mb": {"after_fetch": round(fetch_rss_mb, 1), "after_dashboard": round(_peak_rss_mb(), 1)},
+        }
+
+    def _page_user_lists(self) -> dict:
+        """Page through both dashboard lists like the browser does; per-page milliseconds should stay flat with depth"""
+        user_list = async_to_sync(views.user_list)
+        page_ms = []
+        for kind in USER_LISTS:
+            cursor = None
+            while True:
+                started_at = time.monotonic()
+                response = user_list(RequestFactory().get("/", {"after": cursor} if cursor else {}), kind)
+                page_ms.append((time.monotonic() - started_at) * 1000)
+                cursor = json.loads(response.content)["next_cursor"]
+                if cursor is None:
+                    break
+        return {
+            "list_pages": len(page_ms),
+            "first_page_ms": round(page_ms[0], 1),
+            "slowest_page_ms": round(max(page_ms), 1),
+        }
+
+    def _time_diffs(self, snapshot: FollowerSnapshot) -> dict:
+        """Milliseconds for the dashboard's set differences (not following back, lost followers) with each strategy"""
+        # A fresh instance, so the packed path pays for unpacking like a request would.
+        snapshot = FollowerSnapshot.objects.get(pk=snapshot.pk)
+        previous = FollowerSnapshot.objects.filter(profile_id=snapshot.profile_id, id__lt=snapshot.id).order_by("-id").first()
+        comparisons = [(snapshot, FollowMembership.FOLLOWING, snapshot, FollowMembership.FOLLOWER)]
+        if previous:
+            comparisons.append((previous, FollowMembership.FOLLOWER, snapshot, FollowMembership.FOLLOWER))
+
+        timings = {}
+        for name, difference in (("packed", membership_difference), ("intervals", interval_difference)):
+            started_at = time.monotonic()
+            for left, left_relation, right, right_relation in comparisons:
+                list(difference(left_snapshot=left, left_relation=left_relation, right_snapshot=right, right_relation=right_relation))
+            timings[name] = round((time.monotonic() - started_at) * 1000, 1)
+        return timings
+
+    def _print_report(self, report: dict, *, as_json: bool) -> None:
+        if as_json:
+            self.stdout.write(json.dumps(report))
+            return
+
+        fetch, persist, dashboard = report["fetch"], report["persist"], report["dashboard"]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Run {report['run']}: {report['users']} users in {report['pages']} pages "
+            f"({report['requests']} requests, {report['throttled']} throttled, {report['server_errors']} server errors)"
+        ))
+        self.stdout.write(
+            f"  fetch      {fetch['seconds']:>8.3f}s  {fetch['pages_per_sec']:>8.1f} pages/s  {fetch['users_per_sec']:>10.1f} users/s  "
+            f"db {fetch['db_seconds']:.3f}s / {fetch['queries']} queries"
+        )
+        self.stdout.write(f"  persist    {persist['seconds']:>8.3f}s  db {persist['db_seconds']:.3f}s / {persist['queries']} queries")
+        self.stdout.write(
+            f"  dashboard  {dashboard['seconds']:>8.3f}s  db {dashboard['db_seconds']:.3f}s / {dashboard['queries']} queries  "
+            f"{dashboard['list_pages']} list pages, first {dashboard['first_page_ms']:.1f} ms, slowest {dashboard['slowest_page_ms']:.1f} ms"
+        )
+        self.stdout.write(
+            f"  diffs      {report['diff_ms']['packed']:>8.1f} ms packed arrays, "
+            f"{report['diff_ms']['intervals']:.1f} ms interval anti-joins"
+        )
+        self.stdout.write(
+            f"  peak RSS   {report['peak_rss_mb']['after_fetch']:.1f} MB after fetch, "
+            f"{report['peak_rss_mb']['after_dashboard']:.1f} MB after dashboard"
+        )
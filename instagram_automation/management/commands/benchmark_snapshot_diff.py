@@ -0,0 +1,98 @@
+import json
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from instagram_automation.packed_ids import difference, pack_ids, unpack_ids
+
+
+def _measure(function, runs: int = 3) -> tuple:
+    """(result, best milliseconds, peak traced MB); memory is traced in a separate call since tracing slows numpy down"""
+    timings = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, round(min(timings) * 1000, 1), round(peak / 2**20, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Diff two synthetic snapshots of one profile with packed id arrays and with Python sets, "
+        "and report time, peak memory and packed size. Needs no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=1_000_000, help="Followers per snapshot.")
+        parser.add_argument("--following", type=int, default=5_000)
+        parser.add_argument("--churn", type=float, default=0.01, help="Share of followers replaced between snapshots.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        members, churn = options["members"], int(options["members"] * options["churn"])
+
+        # User ids are assigned in insertion order, so a profile's members are scattered over a wider id range.
+        previous = rng.sample(range(1, members * 4), members)
+        current = previous[churn:] + rng.sample(range(members * 4, members * 5), churn)
+        following = rng.sample(previous[: members // 2], options["following"] // 2) + list(range(1, options["following"] // 2 + 1))
+
+        packed = {name: pack_ids(ids) for name, ids in (("previous", previous), ("current", current), ("following", following))}
+
+        def packed_diff() -> dict:
+            previous_ids, current_ids = unpack_ids(packed["previous"]), unpack_ids(packed["current"])
+            following_ids = unpack_ids(packed["following"])
+            return {
+                "lost_followers": len(difference(previous_ids, current_ids)),
+                "new_followers": len(difference(current_ids, previous_ids)),
+                "not_following_back": len(difference(following_ids, current_ids)),
+            }
+
+        def set_diff() -> dict:
+            # Like the interval path, which has to materialize every member id before comparing.
+            previous_set, current_set, following_set = set(previous), set(current), set(following)
+            return {
+                "lost_followers": len(previous_set - current_set),
+                "new_followers": len(current_set - previous_set),
+                "not_following_back": len(following_set - current_set),
+            }
+
+        packed_counts, packed_ms, packed_mb = _measure(packed_diff)
+        set_counts, set_ms, set_mb = _measure(set_diff)
+        if packed_counts != set_counts:
+            raise AssertionError(f"Packed diff {packed_counts} disagrees with set diff {set_counts}")
+
+        report = {
+            "members": members,
+            "churn": churn,
+            "counts": packed_counts,
+            "packed": {
+                "ms": packed_ms,
+                "peak_mb": packed_mb,
+                "bytes_per_snapshot": len(packed["current"]),
+                "bytes_per_member": round(len(packed["current"]) / members, 2),
+            },
+            "python_sets": {"ms": set_ms, "peak_mb": set_mb},
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{members} followers, {churn} replaced: {packed_counts['lost_followers']} lost, "
+            f"{packed_counts['new_followers']} new, {packed_counts['not_following_back']} not following back"
+        ))
+        self.stdout.write(
+            f"  packed arrays  {packed_ms:>8.1f} ms  peak {packed_mb:.1f} MB  "
+            f"{report['packed']['bytes_per_snapshot'] / 2**20:.2f} MB stored per snapshot ({report['packed']['bytes_per_member']} B/member)"
+        )
+        self.stdout.write(f"  python sets    {set_ms:>8.1f} ms  peak {set_mb:.1f} MB")
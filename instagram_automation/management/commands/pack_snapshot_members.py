@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from instagram_automation.models import FollowerSnapshot, FollowMembership
+from instagram_automation.packed_ids import pack_ids
+
+
+class Command(BaseCommand):
+    help = "Fill the packed follower/following id columns of snapshots taken before they existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Repack snapshots that already have packed ids.",
+        )
+
+    def handle(self, *args, **options):
+        snapshots = FollowerSnapshot.objects.order_by("id")
+        if not options["force"]:
+            snapshots = snapshots.filter(follower_ids_packed__isnull=True)
+
+        packed = 0
+        for snapshot in snapshots.iterator():
+            # Rebuilt from the membership intervals, which stay the source of truth.
+            snapshot.follower_ids_packed = pack_ids(snapshot.member_ids(FollowMembership.FOLLOWER))
+            snapshot.following_ids_packed = pack_ids(snapshot.member_ids(FollowMembership.FOLLOWING))
+            snapshot.save(update_fields=["follower_ids_packed", "following_ids_packed"])
+            packed += 1
+            self.stdout.write(
+                f"Snapshot {snapshot.id}: {len(snapshot.follower_ids_packed) + len(snapshot.following_ids_packed)} bytes"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Packed {packed} snapshots."))
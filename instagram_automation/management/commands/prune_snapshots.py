@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from instagram_automation.models import FollowerSnapshot
+from instagram_automation.redis_clients import get_redis
+from instagram_automation.retention import collect_garbage, snapshots_to_prune
+
+
+class Command(BaseCommand):
+    help = "Apply the snapshot retention policy now and delete users no snapshot references anymore."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list how many snapshots each profile would lose.",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            total = 0
+            profile_ids = FollowerSnapshot.objects.values_list("profile_id", flat=True).distinct().order_by("profile_id")
+            for profile_id in profile_ids:
+                prune = snapshots_to_prune(profile_id=profile_id)
+                total += len(prune)
+                self.stdout.write(f"Profile {profile_id}: {len(prune)} snapshots past retention")
+            self.stdout.write(self.style.SUCCESS(f"{total} snapshots would be pruned."))
+            return
+
+        report = collect_garbage(redis_client=get_redis()).as_dict()
+        for model, rows in sorted(report["rows_deleted"].items()):
+            self.stdout.write(f"{model}: {rows} rows deleted")
+        for reason in report["skipped"]:
+            self.stdout.write(self.style.WARNING(f"Skipped {reason}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {report['total_rows_deleted']} rows ({report['bytes_reclaimed']} bytes) "
+            f"and rebuilt {report['snapshots_rebuilt']} snapshots."
+        ))
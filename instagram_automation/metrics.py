@@ -0,0 +1,173 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import redis
+from django.db import transaction
+from django.utils import timezone
+
+from instagram_automation.models import FollowerSnapshot, ScanRun
+
+logger = logging.getLogger("instagram_automation")
+
+# Upper bounds (seconds) of the per-request API latency histogram
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TOTALS_KEY = "scan_metrics_totals"
+
+
+def _bucket_label(seconds: float) -> str:
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+class ScanMetrics:
+    """Phase timings and API request stats collected by one pipeline stage"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.latency_histogram: Dict[str, int] = defaultdict(int)
+        self.latency_sum = 0.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.monotonic() - started_at)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] += seconds
+
+    def observe_request(self, *, seconds: float, status: int) -> None:
+        self.counters["requests"] += 1
+        self.latency_histogram[_bucket_label(seconds)] += 1
+        self.latency_sum += seconds
+        if status == 200:
+            self.counters["pages"] += 1
+        elif status == 429:
+            self.counters["throttled"] += 1
+        elif status >= 500:
+            self.counters["server_errors"] += 1
+
+    def record_retry(self) -> None:
+        self.counters["retries"] += 1
+
+
+def start_scan_run(*, scan_id: str, username: str) -> ScanRun:
+    return ScanRun.objects.create(scan_id=scan_id, username=username)
+
+
+def record_scan_stage(*,
+    redis_client: redis.Redis,
+    scan_id: str,
+    metrics: ScanMetrics,
+    status: Optional[str] = None,
+    snapshot: Optional[FollowerSnapshot] = None
+) -> Optional[ScanRun]:
+    """Add a stage's metrics to its ScanRun and to the cumulative counters behind /metrics"""
+    _add_to_totals(redis_client, metrics, status)
+
+    with transaction.atomic():
+        scan_run = ScanRun.objects.select_for_update().filter(scan_id=scan_id).first()
+        if scan_run is None:
+            logger.warning(f"No ScanRun for scan {scan_id}; stage metrics were only added to the totals.")
+            return None
+
+        for name, seconds in metrics.phases.items():
+            scan_run.phases[name] = round(scan_run.phases.get(name, 0.0) + seconds, 3)
+        for label, count in metrics.latency_histogram.items():
+            scan_run.latency_histogram[label] = scan_run.latency_histogram.get(label, 0) + count
+        for field in ("pages", "requests", "retries", "throttled", "server_errors"):
+            setattr(scan_run, field, getattr(scan_run, field) + metrics.counters[field])
+
+        if snapshot is not None:
+            scan_run.snapshot = snapshot
+        if status is not None:
+            scan_run.status = status
+            scan_run.finished_at = timezone.now()
+        scan_run.save()
+
+    return scan_run
+
+
+def scan_report(scan_run: ScanRun) -> dict:
+    """The structured report returned as the scan's task result"""
+    return {
+        "scan_id": scan_run.scan_id,
+        "username": scan_run.username,
+        "status": scan_run.status,
+        "snapshot_id": scan_run.snapshot_id,
+        "started_at": scan_run.started_at.isoformat(),
+        "finished_at": scan_run.finished_at.isoformat() if scan_run.finished_at else None,
+        "duration_seconds": (
+            round((scan_run.finished_at - scan_run.started_at).total_seconds(), 3) if scan_run.finished_at else None
+        ),
+        "phases": scan_run.phases,
+        "pages": scan_run.pages,
+        "requests": scan_run.requests,
+        "retries": scan_run.retries,
+        "throttled": scan_run.throttled,
+        "server_errors": scan_run.server_errors,
+        "latency_histogram": scan_run.latency_histogram,
+    }
+
+
+def _add_to_totals(redis_client: redis.Redis, metrics: ScanMetrics, status: Optional[str]) -> None:
+    with redis_client.pipeline(transaction=False) as pipe:
+        for name, seconds in metrics.phases.items():
+            pipe.hincrbyfloat(TOTALS_KEY, f"phase_seconds:{name}", seconds)
+        for name, count in metrics.counters.items():
+            pipe.hincrby(TOTALS_KEY, name, count)
+        for label, count in metrics.latency_histogram.items():
+            pipe.hincrby(TOTALS_KEY, f"latency_bucket:{label}", count)
+        pipe.hincrbyfloat(TOTALS_KEY, "latency_sum", metrics.latency_sum)
+        if status is not None:
+            pipe.hincrby(TOTALS_KEY, f"scans:{status}", 1)
+        pipe.execute()
+
+
+def render_prometheus(redis_client: redis.Redis) -> str:
+    """Cumulative scan metrics from every worker in the Prometheus text exposition format"""
+    totals = {key.decode(): float(value) for key, value in redis_client.hgetall(TOTALS_KEY).items()}
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    metric("ig_scans_total", "counter", "Finished scans by outcome.")
+    for status, _ in ScanRun.STATUS_CHOICES:
+        if status != ScanRun.RUNNING:
+            lines.append(f'ig_scans_total{{status="{status}"}} {totals.get(f"scans:{status}", 0):g}')
+
+    metric("ig_scan_phase_seconds_total", "counter", "Time spent in each scan phase.")
+    for key in sorted(totals):
+        if key.startswith("phase_seconds:"):
+            lines.append(f'ig_scan_phase_seconds_total{{phase="{key.split(":", 1)[1]}"}} {totals[key]:.3f}')
+
+    for name, help_text in (
+        ("pages", "List pages fetched."),
+        ("requests", "Instagram API requests sent."),
+        ("retries", "API requests retried after network or server errors."),
+        ("throttled", "API requests answered with 429."),
+        ("server_errors", "API requests answered with 5xx."),
+    ):
+        metric(f"ig_api_{name}_total", "counter", help_text)
+        lines.append(f"ig_api_{name}_total {totals.get(name, 0):g}")
+
+    metric("ig_api_request_duration_seconds", "histogram", "Instagram API request latency.")
+    cumulative = 0.0
+    for label in [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]:
+        cumulative += totals.get(f"latency_bucket:{label}", 0)
+        lines.append(f'ig_api_request_duration_seconds_bucket{{le="{label}"}} {cumulative:g}')
+    lines.append(f"ig_api_request_duration_seconds_sum {totals.get('latency_sum', 0):.3f}")
+    lines.append(f"ig_api_request_duration_seconds_count {cumulative:g}")
+
+    return "\n".join(lines) + "\n"
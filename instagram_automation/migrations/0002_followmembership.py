@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relation', models.CharField(choices=[('follower', 'Follower'), ('following', 'Following')], max_length=16)),
+                ('first_seen_snapshot', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='instagram_automation.followersnapshot')),
+                ('last_seen_snapshot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='instagram_automation.followersnapshot')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='instagram_automation.instagramuser')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='member_of', to='instagram_automation.instagramuser')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', 'relation', 'first_seen_snapshot'], name='membership_range_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='followmembership',
+            constraint=models.UniqueConstraint(condition=models.Q(('last_seen_snapshot__isnull', True)), fields=('profile', 'user', 'relation'), name='unique_open_membership'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def _relations(FollowerSnapshot):
+    return (
+        ('follower', FollowerSnapshot.followers.through),
+        ('following', FollowerSnapshot.following.through),
+    )
+
+
+def snapshots_to_intervals(apps, schema_editor):
+    FollowerSnapshot = apps.get_model('instagram_automation', 'FollowerSnapshot')
+    FollowMembership = apps.get_model('instagram_automation', 'FollowMembership')
+
+    profile_ids = FollowerSnapshot.objects.values_list('profile_id', flat=True).distinct()
+    for profile_id in profile_ids:
+        # user_id -> first_seen snapshot id, per relation
+        open_intervals = {relation: {} for relation, _ in _relations(FollowerSnapshot)}
+        previous_id = None
+
+        snapshot_ids = FollowerSnapshot.objects.filter(profile_id=profile_id).order_by('id').values_list('id', flat=True)
+        for snapshot_id in snapshot_ids:
+            for relation, through in _relations(FollowerSnapshot):
+                current = set(
+                    through.objects.filter(followersnapshot_id=snapshot_id).values_list('instagramuser_id', flat=True)
+                )
+                opened = open_intervals[relation]
+
+                closed = [
+                    FollowMembership(
+                        profile_id=profile_id,
+                        user_id=user_id,
+                        relation=relation,
+                        first_seen_snapshot_id=opened.pop(user_id),
+                        last_seen_snapshot_id=previous_id,
+                    )
+                    for user_id in set(opened) - current
+                ]
+                FollowMembership.objects.bulk_create(closed, batch_size=BATCH_SIZE)
+
+                for user_id in current - opened.keys():
+                    opened[user_id] = snapshot_id
+
+            previous_id = snapshot_id
+
+        for relation, opened in open_intervals.items():
+            FollowMembership.objects.bulk_create(
+                [
+                    FollowMembership(
+                        profile_id=profile_id,
+                        user_id=user_id,
+                        relation=relation,
+                        first_seen_snapshot_id=first_seen_id,
+                    )
+                    for user_id, first_seen_id in opened.items()
+                ],
+                batch_size=BATCH_SIZE,
+            )
+
+
+def intervals_to_snapshots(apps, schema_editor):
+    FollowerSnapshot = apps.get_model('instagram_automation', 'FollowerSnapshot')
+    FollowMembership = apps.get_model('instagram_automation', 'FollowMembership')
+
+    for snapshot in FollowerSnapshot.objects.order_by('id').iterator():
+        for relation, through in _relations(FollowerSnapshot):
+            user_ids = FollowMembership.objects.filter(
+                profile_id=snapshot.profile_id,
+                relation=relation,
+                first_seen_snapshot_id__lte=snapshot.id,
+            ).exclude(
+                last_seen_snapshot_id__lt=snapshot.id,
+            ).values_list('user_id', flat=True)
+            through.objects.bulk_create(
+                [through(followersnapshot_id=snapshot.id, instagramuser_id=user_id) for user_id in user_ids],
+                batch_size=BATCH_SIZE,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0002_followmembership'),
+    ]
+
+    operations = [
+        migrations.RunPython(snapshots_to_intervals, intervals_to_snapshots),
+    ]
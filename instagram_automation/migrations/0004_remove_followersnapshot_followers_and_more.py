@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0003_snapshot_memberships_to_intervals'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='followersnapshot',
+            name='followers',
+        ),
+        migrations.RemoveField(
+            model_name='followersnapshot',
+            name='following',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0004_remove_followersnapshot_followers_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotDiff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lost_followers', models.JSONField(default=list)),
+                ('new_followers', models.JSONField(default=list)),
+                ('newly_followed', models.JSONField(default=list)),
+                ('unfollowed_by_me', models.JSONField(default=list)),
+                ('not_following_back', models.JSONField(default=list)),
+                ('lost_followers_count', models.PositiveIntegerField(default=0)),
+                ('new_followers_count', models.PositiveIntegerField(default=0)),
+                ('newly_followed_count', models.PositiveIntegerField(default=0)),
+                ('unfollowed_by_me_count', models.PositiveIntegerField(default=0)),
+                ('not_following_back_count', models.PositiveIntegerField(default=0)),
+                ('previous_snapshot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='instagram_automation.followersnapshot')),
+                ('snapshot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='diff', to='instagram_automation.followersnapshot')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0005_snapshotdiff'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstagramAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=255, unique=True)),
+                ('password', models.CharField(max_length=255)),
+                ('is_active', models.BooleanField(default=True)),
+                ('max_concurrent_requests', models.PositiveSmallIntegerField(default=2)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0006_instagramaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followersnapshot',
+            name='reported_follower_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='followersnapshot',
+            name='reported_following_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='followersnapshot',
+            name='scan_mode',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='snapshotdiff',
+            name='is_partial',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0007_snapshot_scan_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followersnapshot',
+            name='fencing_token',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
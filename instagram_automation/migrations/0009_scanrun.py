@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0008_snapshot_fencing_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scan_id', models.CharField(max_length=64, unique=True)),
+                ('username', models.CharField(db_index=True, max_length=255)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='running', max_length=16)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('phases', models.JSONField(default=dict)),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('throttled', models.PositiveIntegerField(default=0)),
+                ('server_errors', models.PositiveIntegerField(default=0)),
+                ('latency_histogram', models.JSONField(default=dict)),
+                ('snapshot', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scan_run', to='instagram_automation.followersnapshot')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0009_scanrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followersnapshot',
+            name='follower_ids_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='followersnapshot',
+            name='following_ids_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
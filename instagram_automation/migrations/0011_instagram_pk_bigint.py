@@ -0,0 +1,56 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def placeholders_to_null(apps, schema_editor):
+    # Rows were keyed by "pk_<username>" placeholders; scans fill in the real pk the next time they see the user.
+    InstagramUser = apps.get_model('instagram_automation', 'InstagramUser')
+    InstagramUser.objects.exclude(instagram_pk__regex=r'^[0-9]+$').update(instagram_pk=None)
+
+
+def null_to_placeholders(apps, schema_editor):
+    InstagramUser = apps.get_model('instagram_automation', 'InstagramUser')
+    InstagramUser.objects.filter(instagram_pk__isnull=True).update(
+        instagram_pk=models.functions.Concat(models.Value('pk_'), 'username')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0010_snapshot_packed_members'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='instagramuser',
+            name='instagram_pk',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(placeholders_to_null, null_to_placeholders),
+        migrations.AlterField(
+            model_name='instagramuser',
+            name='instagram_pk',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='instagramuser',
+            name='username',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='UsernameChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_username', models.CharField(max_length=255)),
+                ('new_username', models.CharField(max_length=255)),
+                ('detected_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='username_changes', to='instagram_automation.instagramuser')),
+            ],
+            options={
+                'ordering': ['-detected_at'],
+            },
+        ),
+    ]
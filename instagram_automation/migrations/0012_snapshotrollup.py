@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0011_instagram_pk_bigint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('follower_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('gained', models.PositiveIntegerField(default=0)),
+                ('lost', models.PositiveIntegerField(default=0)),
+                ('reciprocal_count', models.PositiveIntegerField(default=0)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='instagram_automation.instagramuser')),
+                ('snapshot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rollup', to='instagram_automation.followersnapshot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', 'timestamp'], name='rollup_history_idx')],
+            },
+        ),
+    ]
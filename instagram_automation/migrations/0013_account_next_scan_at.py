@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0012_snapshotrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instagramaccount',
+            name='next_scan_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:12
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0013_account_next_scan_at'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='instagramuser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['username'], name='instagramuser_username_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
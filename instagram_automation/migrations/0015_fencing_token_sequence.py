@@ -0,0 +1,21 @@
+from django.db import migrations
+
+SEQUENCE = 'instagram_automation_fencing_token_seq'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0014_username_trigram_index'),
+    ]
+
+    operations = [
+        # Start past every token already stored; the per-username Redis counters it replaces are no longer read.
+        migrations.RunSQL(
+            sql=[
+                f'CREATE SEQUENCE {SEQUENCE}',
+                f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(fencing_token) FROM instagram_automation_followersnapshot), 0) + 1, false)",
+            ],
+            reverse_sql=f'DROP SEQUENCE {SEQUENCE}',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0015_fencing_token_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshotdiff',
+            name='members_stored',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='SnapshotDiffMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('list_name', models.CharField(choices=[('lost_followers', 'Lost followers'), ('not_following_back', 'Not following back')], max_length=32)),
+                ('diff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='instagram_automation.snapshotdiff')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='diff_memberships', to='instagram_automation.instagramuser')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotdiffmember',
+            constraint=models.UniqueConstraint(fields=('diff', 'list_name', 'user'), name='unique_diff_member'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instagram_automation', '0016_snapshot_diff_members'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshotdiffmember',
+            name='username',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE instagram_automation_snapshotdiffmember member
+                SET username = instagram_user.username
+                FROM instagram_automation_instagramuser instagram_user
+                WHERE instagram_user.id = member.user_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='snapshotdiffmember',
+            index=models.Index(fields=['diff', 'list_name', 'username', 'user'], name='diff_member_page_idx'),
+        ),
+    ]
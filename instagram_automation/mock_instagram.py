@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import random
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger("instagram_automation")
+
+FOLLOWER_PK_BASE = 10_000_000
+FOLLOWING_ONLY_PK_BASE = 50_000_000
+
+# Token bucket settings for runs against the mock: fast enough that the client and
+# the DB are what gets measured, while injected 429s still exercise the backoff.
+MOCK_RATE_SETTINGS = {
+    "IG_RATE_INITIAL": 500.0,
+    "IG_RATE_MIN": 100.0,
+    "IG_RATE_MAX": 1000.0,
+    "IG_RATE_INCREASE": 50.0,
+    "IG_RATE_BURST": 50.0,
+    "IG_RATE_COOLDOWN": 0.01,
+    "IG_PAGE_COUNT_INITIAL": 100,
+    "IG_PAGE_COUNT_MIN": 50,
+    "IG_PAGE_COUNT_MAX": 200,
+}
+
+
+class MockInstagramConfig(NamedTuple):
+    """One synthetic account served by the mock API"""
+    user_id: str = "1000"
+    username: str = "bench_user"
+    follower_count: int = 1_000
+    following_count: int = 1_000
+    mutual_ratio: float = 0.8  # Share of the following list that follows back
+    latency_ms: float = 0.0
+    throttle_rate: float = 0.0  # Share of list requests answered with 429
+    server_error_rate: float = 0.0  # Share of list requests answered with 503
+    max_page_size: int = 200
+    seed: int = 0
+
+
+def mock_session_data(config: MockInstagramConfig) -> dict:
+    """Session data the scrapers accept for the mock account"""
+    return {
+        'app_id': 'mock-app-id',
+        'cookies': {'sessionid': 'mock-session', 'csrftoken': 'mock-csrf', 'ds_user_id': config.user_id},
+        'user_id': config.user_id,
+        'csrf_token': 'mock-csrf',
+    }
+
+
+def _follower_pk(config: MockInstagramConfig, index: int) -> int:
+    return FOLLOWER_PK_BASE + index
+
+
+def _following_pk(config: MockInstagramConfig, index: int) -> int:
+    # The first mutual_ratio of the following list are followers too; the rest don't follow back.
+    mutual_count = min(config.follower_count, int(config.following_count * config.mutual_ratio))
+    return FOLLOWER_PK_BASE + index if index < mutual_count else FOLLOWING_ONLY_PK_BASE + index
+
+
+def _user_entry(pk: int) -> dict:
+    # Shaped like the real API entries, including the fields the scrapers throw away.
+    return {
+        'pk': pk,
+        'pk_id': str(pk),
+        'username': f'user_{pk}',
+        'full_name': f'User {pk}',
+        'is_private': pk % 3 == 0,
+        'is_verified': False,
+        'profile_pic_url': f'https://example.invalid/{pk}.jpg',
+    }
+
+
+class MockInstagramServer:
+    """Local stand-in for the friendships and web_profile_info endpoints of the private API.
+
+    Users are generated per page, so 1M-user accounts cost no server memory. Pages
+    use `next_max_id` offsets, and latency and 429/5xx answers can be injected.
+    """
+
+    def __init__(self, config: MockInstagramConfig, *, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.stats: Dict[str, int] = {"requests": 0, "pages": 0, "users": 0, "throttled": 0, "server_errors": 0}
+        self._random = random.Random(config.seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/v1/friendships/{user_id}/{list_name:followers|following}/", self._list_page)
+        app.router.add_get("/api/v1/users/web_profile_info/", self._profile_info)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"Mock Instagram API listening on {self.base_url}")
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @contextmanager
+    def running_in_thread(self) -> Iterator["MockInstagramServer"]:
+        """Serve from a separate event loop thread so the server doesn't compete with the client being measured"""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="mock-instagram", daemon=True)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+            yield self
+        finally:
+            asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def _check_auth(self, request: web.Request) -> None:
+        if not request.headers.get("X-CSRFToken") or not request.headers.get("x-ig-app-id"):
+            raise web.HTTPUnauthorized(text='{"message": "login_required", "status": "fail"}', content_type="application/json")
+
+    async def _delay(self) -> None:
+        if self.config.latency_ms:
+            await asyncio.sleep(self.config.latency_ms / 1000)
+
+    async def _profile_info(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        self._check_auth(request)
+        await self._delay()
+
+        if request.query.get("username") != self.config.username:
+            raise web.HTTPNotFound()
+
+        return web.json_response({
+            "data": {"user": {
+                "id": self.config.user_id,
+                "username": self.config.username,
+                "edge_followed_by": {"count": self.config.follower_count},
+                "edge_follow": {"count": self.config.following_count},
+            }},
+            "status": "ok",
+        })
+
+    async def _list_page(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        self._check_auth(request)
+        await self._delay()
+
+        if request.match_info["user_id"] != self.config.user_id:
+            raise web.HTTPNotFound()
+
+        roll = self._random.random()
+        if roll < self.config.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.json_response({"message": "Please wait a few minutes before you try again.", "status": "fail"}, status=429)
+        if roll < self.config.throttle_rate + self.config.server_error_rate:
+            self.stats["server_errors"] += 1
+            return web.json_response({"status": "fail"}, status=503)
+
+        is_followers = request.match_info["list_name"] == "followers"
+        total = self.config.follower_count if is_followers else self.config.following_count
+        pk_for = _follower_pk if is_followers else _following_pk
+
+        try:
+            offset = int(request.query.get("max_id", 0))
+            count = int(request.query.get("count", 12))
+        except ValueError:
+            raise web.HTTPBadRequest()
+
+        end = min(total, offset + max(1, min(count, self.config.max_page_size)))
+        users: List[dict] = [_user_entry(pk_for(self.config, index)) for index in range(offset, end)]
+
+        self.stats["pages"] += 1
+        self.stats["users"] += len(users)
+
+        payload = {"users": users, "big_list": end < total, "page_size": len(users), "status": "ok"}
+        if end < total:
+            payload["next_max_id"] = str(end)
+        return web.json_response(payload)
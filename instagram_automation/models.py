@@ -1,22 +1,266 @@
+from typing import Optional
+
+import numpy as np
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models import Q
+
+from instagram_automation.packed_ids import unpack_ids
 
 class InstagramUser(models.Model):
-    username = models.CharField(max_length=255, unique=True, db_index=True)
+    # Usernames can be changed and later taken by someone else, so identity is the numeric pk.
+    username = models.CharField(max_length=255, db_index=True)
     full_name = models.CharField(max_length=255, blank=True, null=True)
-    instagram_pk = models.CharField(max_length=255, unique=True, db_index=True)
+    # NULL only for rows created before pks were stored, until a scan sees them again
+    instagram_pk = models.BigIntegerField(unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Substring search over usernames in the dashboard lists (ILIKE '%q%')
+            GinIndex(fields=['username'], name='instagramuser_username_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return self.username
+
+
+class UsernameChange(models.Model):
+    """A rename, noticed when a scan saw a known pk under a new username"""
+    user = models.ForeignKey(InstagramUser, on_delete=models.CASCADE, related_name='username_changes')
+    old_username = models.CharField(max_length=255)
+    new_username = models.CharField(max_length=255)
+    detected_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-detected_at']
+
+    def __str__(self):
+        return f"{self.old_username} -> {self.new_username}"
+
+class InstagramAccount(models.Model):
+    """A tracked account and the credentials used to scan it"""
+    username = models.CharField(max_length=255, unique=True)
+    password = models.CharField(max_length=255)
+    is_active = models.BooleanField(default=True)
+    # In-flight API requests this account may have during a batch scan
+    max_concurrent_requests = models.PositiveSmallIntegerField(default=2)
+    # Set by the scan scheduler from the account's recent churn; empty means due now
+    next_scan_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.username
 
 class FollowerSnapshot(models.Model):
+    FULL = 'full'
+    INCREMENTAL = 'incremental'
+    SCAN_MODE_CHOICES = [
+        (FULL, 'Full'),
+        (INCREMENTAL, 'Incremental'),
+    ]
+
     profile = models.ForeignKey(InstagramUser, on_delete=models.CASCADE, related_name='snapshots')
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
-    
-    followers = models.ManyToManyField(InstagramUser, related_name='following_in_snapshots')
-    following = models.ManyToManyField(InstagramUser, related_name='followed_by_in_snapshots')
+    # Incremental scans stop at the overlap with the previous snapshot, so removals
+    # further down the lists only show up on the next full scan.
+    scan_mode = models.CharField(max_length=16, choices=SCAN_MODE_CHOICES, default=FULL)
+    reported_follower_count = models.PositiveIntegerField(null=True, blank=True)
+    reported_following_count = models.PositiveIntegerField(null=True, blank=True)
+    # Fencing sequence value drawn when the writing task took its lease; a
+    # snapshot is only written if no newer lease holder has written one already.
+    fencing_token = models.BigIntegerField(null=True, blank=True)
+    # Member user ids as written by packed_ids.pack_ids; NULL for snapshots taken before
+    # they were added (see the pack_snapshot_members command).
+    follower_ids_packed = models.BinaryField(null=True, blank=True, editable=False)
+    following_ids_packed = models.BinaryField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['-timestamp']
 
     def __str__(self):
-        return f"Snapshot for {self.profile.username} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"Snapshot for {self.profile.username} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+    def member_ids(self, relation: str) -> models.QuerySet:
+        """User ids in the follower/following set of this snapshot, rebuilt from membership intervals"""
+        return FollowMembership.objects.at_snapshot(self, relation).values_list('user_id', flat=True)
+
+    def members(self, relation: str) -> models.QuerySet:
+        return InstagramUser.objects.filter(id__in=self.member_ids(relation))
+
+    def member_id_array(self, relation: str) -> Optional[np.ndarray]:
+        """Sorted user ids of the follower/following set from the packed column, None if it isn't packed"""
+        cache = self.__dict__.setdefault('_member_id_arrays', {})
+        if relation not in cache:
+            packed = self.follower_ids_packed if relation == FollowMembership.FOLLOWER else self.following_ids_packed
+            cache[relation] = unpack_ids(packed) if packed is not None else None
+        return cache[relation]
+
+
+class FollowMembershipQuerySet(models.QuerySet):
+    def at_snapshot(self, snapshot: FollowerSnapshot, relation: str) -> 'FollowMembershipQuerySet':
+        # Snapshot ids grow with time, so an interval covers every snapshot id in [first_seen, last_seen].
+        return self.filter(
+            profile_id=snapshot.profile_id,
+            relation=relation,
+            first_seen_snapshot_id__lte=snapshot.id,
+        ).filter(
+            Q(last_seen_snapshot__isnull=True) | Q(last_seen_snapshot_id__gte=snapshot.id)
+        )
+
+    def open(self) -> 'FollowMembershipQuerySet':
+        return self.filter(last_seen_snapshot__isnull=True)
+
+
+class FollowMembership(models.Model):
+    """A continuous run of snapshots in which `user` was in the profile's follower or following list.
+
+    An interval is open (`last_seen_snapshot` is NULL) while the user is still in the list;
+    a scan only opens intervals for newcomers and closes them for users who left.
+    """
+    FOLLOWER = 'follower'
+    FOLLOWING = 'following'
+    RELATION_CHOICES = [
+        (FOLLOWER, 'Follower'),
+        (FOLLOWING, 'Following'),
+    ]
+
+    profile = models.ForeignKey(InstagramUser, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(InstagramUser, on_delete=models.CASCADE, related_name='member_of')
+    relation = models.CharField(max_length=16, choices=RELATION_CHOICES)
+    first_seen_snapshot = models.ForeignKey(FollowerSnapshot, on_delete=models.PROTECT, related_name='+')
+    last_seen_snapshot = models.ForeignKey(FollowerSnapshot, on_delete=models.PROTECT, related_name='+', null=True, blank=True)
+
+    objects = FollowMembershipQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['profile', 'user', 'relation'],
+                condition=Q(last_seen_snapshot__isnull=True),
+                name='unique_open_membership',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['profile', 'relation', 'first_seen_snapshot'], name='membership_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.relation} of {self.profile_id} from {self.first_seen_snapshot_id} to {self.last_seen_snapshot_id or 'now'}"
+
+
+class SnapshotDiff(models.Model):
+    """Changes between a snapshot and the profile's previous one, computed once when the scan finishes"""
+    snapshot = models.OneToOneField(FollowerSnapshot, on_delete=models.CASCADE, related_name='diff')
+    previous_snapshot = models.ForeignKey(FollowerSnapshot, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the snapshot was incremental: lost followers / unfollowed-by-me may be incomplete
+    is_partial = models.BooleanField(default=False)
+
+    # Usernames per list; lost_followers and not_following_back stay empty once members_stored,
+    # their users are SnapshotDiffMember rows instead.
+    lost_followers = models.JSONField(default=list)
+    new_followers = models.JSONField(default=list)
+    newly_followed = models.JSONField(default=list)
+    unfollowed_by_me = models.JSONField(default=list)
+    not_following_back = models.JSONField(default=list)
+
+    lost_followers_count = models.PositiveIntegerField(default=0)
+    new_followers_count = models.PositiveIntegerField(default=0)
+    newly_followed_count = models.PositiveIntegerField(default=0)
+    unfollowed_by_me_count = models.PositiveIntegerField(default=0)
+    not_following_back_count = models.PositiveIntegerField(default=0)
+    # False for diffs built before SnapshotDiffMember rows existed (see backfill_snapshot_diffs)
+    members_stored = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Diff for snapshot {self.snapshot_id} against {self.previous_snapshot_id}"
+
+
+class SnapshotDiffMember(models.Model):
+    """A user on one of a diff's dashboard lists, so the dashboard pages those lists without recomputing them"""
+    LOST_FOLLOWERS = 'lost_followers'
+    NOT_FOLLOWING_BACK = 'not_following_back'
+    LIST_CHOICES = [
+        (LOST_FOLLOWERS, 'Lost followers'),
+        (NOT_FOLLOWING_BACK, 'Not following back'),
+    ]
+
+    diff = models.ForeignKey(SnapshotDiff, on_delete=models.CASCADE, related_name='members')
+    list_name = models.CharField(max_length=32, choices=LIST_CHOICES)
+    user = models.ForeignKey(InstagramUser, on_delete=models.CASCADE, related_name='diff_memberships')
+    # The username when the diff was built; copied so a page is a seek on diff_member_page_idx, not a join and sort
+    username = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['diff', 'list_name', 'user'], name='unique_diff_member'),
+        ]
+        indexes = [
+            # Keyset order of the dashboard lists
+            models.Index(fields=['diff', 'list_name', 'username', 'user'], name='diff_member_page_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.list_name} of diff {self.diff_id}"
+
+
+class SnapshotRollup(models.Model):
+    """Counts of one snapshot for the history charts, written at ingest so charts never read membership rows"""
+    snapshot = models.OneToOneField(FollowerSnapshot, on_delete=models.CASCADE, related_name='rollup')
+    # Copied from the snapshot so history queries stay on this table's (profile, timestamp) index
+    profile = models.ForeignKey(InstagramUser, on_delete=models.CASCADE, related_name='+')
+    timestamp = models.DateTimeField()
+
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Followers who joined/left since the previous snapshot; 0 for a profile's first snapshot
+    gained = models.PositiveIntegerField(default=0)
+    lost = models.PositiveIntegerField(default=0)
+    # Users in both lists
+    reciprocal_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['profile', 'timestamp'], name='rollup_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"Rollup of snapshot {self.snapshot_id}: {self.follower_count} followers (+{self.gained} / -{self.lost})"
+
+
+class ScanRun(models.Model):
+    """Timings and request stats of one scan, merged in by each pipeline stage as it finishes"""
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    # Celery id of the task that started the scan
+    scan_id = models.CharField(max_length=64, unique=True)
+    username = models.CharField(max_length=255, db_index=True)
+    snapshot = models.OneToOneField(FollowerSnapshot, on_delete=models.SET_NULL, related_name='scan_run', null=True, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # Seconds per phase: driver_startup, login_cookie/login_manual, session_extraction, navigate_*, rate_limit_wait, fetch, db_ingest, diff
+    phases = models.JSONField(default=dict)
+    pages = models.PositiveIntegerField(default=0)
+    requests = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    throttled = models.PositiveIntegerField(default=0)
+    server_errors = models.PositiveIntegerField(default=0)
+    # Per-request API latency, counts per bucket upper bound in seconds ("+Inf" last)
+    latency_histogram = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Scan {self.scan_id} of {self.username} ({self.status})"
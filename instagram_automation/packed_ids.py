@@ -0,0 +1,31 @@
+import zlib
+from typing import Iterable
+
+import numpy as np
+
+# Little-endian int64 so packed payloads read the same on every host
+ID_DTYPE = np.dtype("<i8")
+
+
+def pack_ids(ids: Iterable[int]) -> bytes:
+    """Sorted, delta-encoded int64 ids, zlib-compressed; consecutive ids cost about a byte each"""
+    if isinstance(ids, np.ndarray):
+        array = ids.astype(ID_DTYPE, copy=False)
+    else:
+        array = np.fromiter(ids, dtype=ID_DTYPE)
+    array = np.unique(array)
+    return zlib.compress(np.diff(array, prepend=0).astype(ID_DTYPE, copy=False).tobytes())
+
+
+def unpack_ids(packed: bytes) -> np.ndarray:
+    """The sorted id array back from pack_ids"""
+    return np.cumsum(np.frombuffer(zlib.decompress(packed), dtype=ID_DTYPE), dtype=ID_DTYPE)
+
+
+def difference(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Sorted ids in left but not in right; both inputs are unique, which skips numpy's dedup pass"""
+    return np.setdiff1d(left, right, assume_unique=True)
+
+
+def intersection(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return np.intersect1d(left, right, assume_unique=True)
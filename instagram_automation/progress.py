@@ -0,0 +1,175 @@
+import json
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import redis
+from django.conf import settings
+from redis import asyncio as aioredis
+
+logger = logging.getLogger("instagram_automation")
+
+RUNNING = "running"
+
+
+def progress_channel(username: str) -> str:
+    return f"scan_progress:{username}"
+
+
+def last_progress_key(username: str) -> str:
+    return f"scan_progress_last_for_{username}"
+
+
+def last_progress(redis_client: redis.Redis, username: str) -> Optional[dict]:
+    """The most recent event published for username, so late subscribers can draw the current state"""
+    raw = redis_client.get(last_progress_key(username))
+    return json.loads(raw) if raw else None
+
+
+async def alast_progress(redis_client: aioredis.Redis, username: str) -> Optional[dict]:
+    raw = await redis_client.get(last_progress_key(username))
+    return json.loads(raw) if raw else None
+
+
+class ScanProgress:
+    """Publishes one scan's progress events to scan_progress:{username}.
+
+    Every pipeline stage builds its own instance; list counters carry over from the
+    last event of the same scan. Page events are throttled to one per
+    SCAN_PROGRESS_MIN_INTERVAL seconds, phase changes always go out. Code running
+    on an event loop uses the a-prefixed methods, which publish through the loop's
+    asyncio client instead of blocking it; on_event runs on that loop too.
+    """
+
+    def __init__(self, *,
+        redis_client: redis.Redis,
+        username: str,
+        scan_id: str,
+        on_event: Optional[Callable[[dict], None]] = None
+    ):
+        self.redis_client = redis_client
+        self.username = username
+        self.scan_id = scan_id
+        self.on_event = on_event
+        self.phase = "queued"
+        self.lists: Dict[str, dict] = {}
+        self._list_started: Dict[str, tuple] = {}
+        self._published_at = 0.0
+
+        previous = last_progress(redis_client, username)
+        if previous and previous.get("scan_id") == scan_id:
+            self.phase = previous["phase"]
+            self.lists = previous["lists"]
+
+    def set_phase(self, phase: str, *, state: str = RUNNING) -> None:
+        self.phase = phase
+        self._publish(state=state)
+
+    async def aset_phase(self, redis_client: aioredis.Redis, phase: str, *, state: str = RUNNING) -> None:
+        self.phase = phase
+        await self._apublish(redis_client, state=state)
+
+    def set_reported_counts(self, reported_counts: Dict[str, int]) -> None:
+        for list_type, total in reported_counts.items():
+            self.lists.setdefault(list_type, {"users": 0, "pages": 0})["total"] = total
+
+    def list_progress(self, list_type: str, *, users: int, pages: int) -> None:
+        if self._update_list(list_type, users=users, pages=pages):
+            self._publish(state=RUNNING)
+
+    async def alist_progress(self, redis_client: aioredis.Redis, list_type: str, *, users: int, pages: int) -> None:
+        if self._update_list(list_type, users=users, pages=pages):
+            await self._apublish(redis_client, state=RUNNING)
+
+    def _update_list(self, list_type: str, *, users: int, pages: int) -> bool:
+        """Record a list's counters; True if a page event is due"""
+        entry = self.lists.setdefault(list_type, {"users": 0, "pages": 0})
+        entry.update(users=users, pages=pages)
+        # Rates are measured from the first page this stage saw, so resumed pages don't skew the ETA.
+        self._list_started.setdefault(list_type, (time.monotonic(), users))
+        return time.monotonic() - self._published_at >= settings.SCAN_PROGRESS_MIN_INTERVAL
+
+    def eta_seconds(self) -> Optional[float]:
+        """Time until the slower list reaches its reported total at the rate seen so far"""
+        remaining = []
+        for list_type, entry in self.lists.items():
+            total = entry.get("total")
+            if total is None or list_type not in self._list_started:
+                continue
+            started_at, users_at_start = self._list_started[list_type]
+            elapsed = time.monotonic() - started_at
+            fetched = entry["users"] - users_at_start
+            if entry["users"] >= total:
+                remaining.append(0.0)
+            elif fetched > 0 and elapsed > 0:
+                remaining.append((total - entry["users"]) / (fetched / elapsed))
+        return round(max(remaining), 1) if remaining else None
+
+    def _event(self, *, state: str) -> dict:
+        return {
+            "scan_id": self.scan_id,
+            "username": self.username,
+            "state": state,
+            "phase": self.phase,
+            "lists": self.lists,
+            "eta_seconds": self.eta_seconds() if state == RUNNING else None,
+            "timestamp": time.time(),
+        }
+
+    def _publish(self, *, state: str) -> None:
+        event = self._event(state=state)
+        payload = json.dumps(event)
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(last_progress_key(self.username), payload, ex=settings.SCAN_PROGRESS_TTL)
+                pipe.publish(progress_channel(self.username), payload)
+                pipe.execute()
+        except redis.RedisError as e:
+            # Progress is cosmetic; never fail a scan over it.
+            logger.warning(f"Could not publish scan progress for {self.username}: {e}")
+        self._published(event)
+
+    async def _apublish(self, redis_client: aioredis.Redis, *, state: str) -> None:
+        event = self._event(state=state)
+        payload = json.dumps(event)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(last_progress_key(self.username), payload, ex=settings.SCAN_PROGRESS_TTL)
+                pipe.publish(progress_channel(self.username), payload)
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish scan progress for {self.username}: {e}")
+        self._published(event)
+
+    def _published(self, event: dict) -> None:
+        self._published_at = time.monotonic()
+        if self.on_event:
+            self.on_event(event)
+
+
+async def progress_event_stream(redis_client: aioredis.Redis, username: str) -> AsyncIterator[str]:
+    """Server-Sent Events for username's scan: the current state first, then every published event.
+
+    Ends once the scan reaches a final state; a comment line every
+    SCAN_PROGRESS_KEEPALIVE seconds keeps proxies from closing an idle stream.
+    """
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(progress_channel(username))
+    try:
+        current = await alast_progress(redis_client, username)
+        if current:
+            yield f"data: {json.dumps(current)}\n\n"
+            if current["state"] != RUNNING:
+                return
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=settings.SCAN_PROGRESS_KEEPALIVE)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+
+            yield f"data: {message['data'].decode()}\n\n"
+            if json.loads(message["data"])["state"] != RUNNING:
+                return
+    finally:
+        await pubsub.aclose()
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+logger = logging.getLogger("instagram_automation")
+
+# Both scripts keep the bucket in one hash so every worker sees the same
+# rate, tokens and page size. Redis TIME is used as the shared clock.
+_LOAD_STATE = """
+local now_t = redis.call('TIME')
+local now = tonumber(now_t[1]) + tonumber(now_t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'rate', 'tokens', 'ts', 'count')
+local rate = tonumber(state[1]) or tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local count = tonumber(state[4]) or tonumber(ARGV[3])
+local tokens = tonumber(state[2]) or burst
+local ts = tonumber(state[3]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+"""
+
+_SAVE_STATE = """
+redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', tokens, 'ts', now, 'count', count)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+"""
+
+ACQUIRE_SCRIPT = _LOAD_STATE + """
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+""" + _SAVE_STATE + """
+return {tostring(wait), count}
+"""
+
+FEEDBACK_SCRIPT = _LOAD_STATE + """
+if ARGV[5] == 'ok' then
+    rate = math.min(tonumber(ARGV[7]), rate + tonumber(ARGV[8]))
+    count = math.min(tonumber(ARGV[11]), count + tonumber(ARGV[12]))
+else
+    local factor = tonumber(ARGV[9])
+    rate = math.max(tonumber(ARGV[6]), rate * factor)
+    count = math.max(tonumber(ARGV[10]), math.floor(count * factor))
+    -- Go into debt so every worker sits out the cooldown before the next request
+    tokens = math.min(tokens, 0) - tonumber(ARGV[13]) * rate
+end
+""" + _SAVE_STATE + """
+return tostring(rate)
+"""
+
+
+class RateController:
+    """Token bucket shared by every coroutine and worker using one Instagram session.
+
+    The refill rate and page `count` grow additively while responses are healthy
+    and are cut multiplicatively on 429 or 5xx (AIMD).
+    """
+
+    def __init__(self, *, redis_client: aioredis.Redis, session_id: str):
+        self.key = f"ig_rate_for_{session_id}"
+        self._acquire_script = redis_client.register_script(ACQUIRE_SCRIPT)
+        self._feedback_script = redis_client.register_script(FEEDBACK_SCRIPT)
+
+    def _base_args(self) -> list:
+        return [
+            settings.IG_RATE_INITIAL,
+            settings.IG_RATE_BURST,
+            settings.IG_PAGE_COUNT_INITIAL,
+            settings.IG_RATE_STATE_TTL,
+        ]
+
+    async def acquire(self) -> int:
+        """Wait for a request slot and return the page `count` to ask for"""
+        while True:
+            wait, count = await self._acquire_script(keys=[self.key], args=self._base_args())
+            wait = float(wait)
+            if wait <= 0:
+                return int(count)
+            await asyncio.sleep(wait)
+
+    async def record_success(self) -> None:
+        await self._feedback("ok")
+
+    async def record_throttle(self, status: int) -> None:
+        rate = await self._feedback("throttle")
+        logger.warning(f"Status {status}: request rate cut to {rate:.2f}/s for every worker on this session.")
+
+    async def _feedback(self, outcome: str) -> float:
+        rate = await self._feedback_script(
+            keys=[self.key],
+            args=self._base_args() + [
+                outcome,
+                settings.IG_RATE_MIN,
+                settings.IG_RATE_MAX,
+                settings.IG_RATE_INCREASE,
+                settings.IG_RATE_DECREASE_FACTOR,
+                settings.IG_PAGE_COUNT_MIN,
+                settings.IG_PAGE_COUNT_MAX,
+                settings.IG_PAGE_COUNT_STEP,
+                settings.IG_RATE_COOLDOWN,
+            ]
+        )
+        return float(rate)
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Optional
+
+import redis
+from django.conf import settings
+from redis import asyncio as aioredis
+
+_client: Optional[redis.Redis] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+# asyncio connections belong to the loop that opened them, so each loop gets its own pool
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> redis.Redis:
+    """The Redis client shared by every thread of the current process, over one connection pool"""
+    global _client, _client_pid
+    with _client_lock:
+        # Celery forks worker processes; never share sockets with the parent.
+        if _client is None or _client_pid != os.getpid():
+            _client = redis.Redis(
+                connection_pool=redis.BlockingConnectionPool.from_url(
+                    settings.CELERY_BROKER_URL,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS
+                )
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """The asyncio Redis client of the running event loop, shared by every request the loop serves"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis(
+            connection_pool=aioredis.BlockingConnectionPool.from_url(
+                settings.CELERY_BROKER_URL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS
+            )
+        )
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,188 @@
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Set
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet, Sum
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from instagram_automation.diffs import build_snapshot_diff
+from instagram_automation.models import (
+    FollowerSnapshot,
+    FollowMembership,
+    InstagramAccount,
+    InstagramUser,
+    SnapshotDiff,
+    SnapshotDiffMember,
+    SnapshotRollup,
+)
+from instagram_automation.rollups import build_snapshot_rollup
+
+logger = logging.getLogger("instagram_automation")
+
+
+class RetentionTier(NamedTuple):
+    max_age: Optional[timedelta]  # None for the last, open-ended tier
+    bucket: Optional[str]  # None keeps every snapshot; "day"/"week" keeps the newest per bucket
+
+
+def retention_tiers() -> List[RetentionTier]:
+    return [
+        RetentionTier(max_age=timedelta(days=settings.SNAPSHOT_KEEP_ALL_DAYS), bucket=None),
+        RetentionTier(max_age=timedelta(days=settings.SNAPSHOT_KEEP_DAILY_DAYS), bucket="day"),
+        RetentionTier(max_age=None, bucket="week"),
+    ]
+
+
+def _bucket_key(timestamp: datetime, bucket: str) -> tuple:
+    local = timezone.localtime(timestamp)
+    return (bucket, local.date()) if bucket == "day" else (bucket, *local.isocalendar()[:2])
+
+
+def snapshots_to_prune(*, profile_id: int, now: Optional[datetime] = None) -> List[int]:
+    """Ids of the profile's snapshots the retention tiers drop; the newest snapshot is always kept"""
+    now = now or timezone.now()
+    tiers = retention_tiers()
+    snapshots = FollowerSnapshot.objects.filter(profile_id=profile_id).order_by("-timestamp", "-id").values_list("id", "timestamp")
+
+    kept_buckets: Set[tuple] = set()
+    prune: List[int] = []
+    for index, (snapshot_id, timestamp) in enumerate(snapshots):
+        tier = next(tier for tier in tiers if tier.max_age is None or now - timestamp < tier.max_age)
+        if index == 0 or tier.bucket is None:
+            continue
+        # Newest first, so the first snapshot seen in a bucket is the one that stays.
+        key = _bucket_key(timestamp, tier.bucket)
+        if key in kept_buckets:
+            prune.append(snapshot_id)
+        else:
+            kept_buckets.add(key)
+    return prune
+
+
+def _row_bytes(queryset: QuerySet) -> int:
+    """On-disk size of the rows in queryset, measured before they are deleted"""
+    table = queryset.model._meta.db_table
+    return queryset.aggregate(size=Sum(RawSQL(f'pg_column_size("{table}".*)', [])))["size"] or 0
+
+
+class GcReport:
+    """Rows and bytes removed by one garbage collection run"""
+
+    def __init__(self):
+        self.rows: Counter = Counter()
+        self.bytes = 0
+        self.snapshots_rebuilt = 0
+        self.skipped: List[str] = []
+
+    def deleted(self, queryset: QuerySet) -> None:
+        self.bytes += _row_bytes(queryset)
+        _, per_model = queryset.delete()
+        self.rows.update(per_model)
+
+    def as_dict(self) -> dict:
+        return {
+            "rows_deleted": dict(self.rows),
+            "total_rows_deleted": sum(self.rows.values()),
+            "bytes_reclaimed": self.bytes,
+            "snapshots_rebuilt": self.snapshots_rebuilt,
+            "skipped": self.skipped,
+        }
+
+
+def delete_snapshot(*, snapshot_id: int, report: GcReport) -> Optional[int]:
+    """Delete one snapshot, stitching the membership intervals around it; returns the next snapshot's id
+
+    Runs in its own short transaction under the same profile lock ingestion takes.
+    """
+    with transaction.atomic():
+        snapshot = FollowerSnapshot.objects.filter(pk=snapshot_id).only("id", "profile_id").first()
+        if snapshot is None:
+            return None
+        InstagramUser.objects.select_for_update().get(pk=snapshot.profile_id)
+
+        siblings = FollowerSnapshot.objects.filter(profile_id=snapshot.profile_id)
+        previous_id = siblings.filter(id__lt=snapshot_id).order_by("-id").values_list("id", flat=True).first()
+        next_id = siblings.filter(id__gt=snapshot_id).order_by("id").values_list("id", flat=True).first()
+        if next_id is None:
+            logger.warning(f"Snapshot {snapshot_id} is its profile's newest; not deleting it.")
+            return None
+
+        memberships = FollowMembership.objects.filter(profile_id=snapshot.profile_id)
+        # Users seen in this snapshot only were never there as far as the surviving snapshots know.
+        report.deleted(memberships.filter(first_seen_snapshot_id=snapshot_id, last_seen_snapshot_id=snapshot_id))
+        memberships.filter(first_seen_snapshot_id=snapshot_id).update(first_seen_snapshot_id=next_id)
+        # Only an earlier snapshot can have opened these, so previous_id is set here.
+        memberships.filter(last_seen_snapshot_id=snapshot_id).update(last_seen_snapshot_id=previous_id)
+
+        snapshot_rows = FollowerSnapshot.objects.filter(pk=snapshot_id)
+        report.bytes += _row_bytes(SnapshotDiff.objects.filter(snapshot_id=snapshot_id))
+        report.bytes += _row_bytes(SnapshotDiffMember.objects.filter(diff__snapshot_id=snapshot_id))
+        report.bytes += _row_bytes(SnapshotRollup.objects.filter(snapshot_id=snapshot_id))
+        report.deleted(snapshot_rows)
+
+    return next_id
+
+
+def _scans_in_flight(redis_client: redis.Redis) -> bool:
+    # Running scans and resumable checkpoints hold user ids that no snapshot references yet.
+    for pattern in ("scan_lock_for_*", "scan_checkpoint_for_*"):
+        if next(redis_client.scan_iter(match=pattern, count=1000), None) is not None:
+            return True
+    return False
+
+
+def delete_unreferenced_users(*, redis_client: redis.Redis, report: GcReport, batch_size: int) -> None:
+    """Delete users that no membership interval or snapshot points at, one bounded batch per transaction"""
+    tracked = set(InstagramAccount.objects.values_list("username", flat=True)) | {settings.INSTA_USER}
+    unreferenced = InstagramUser.objects.filter(
+        ~Exists(FollowMembership.objects.filter(user_id=OuterRef("pk"))),
+        ~Exists(FollowMembership.objects.filter(profile_id=OuterRef("pk"))),
+        ~Exists(FollowerSnapshot.objects.filter(profile_id=OuterRef("pk"))),
+    ).exclude(username__in=[username for username in tracked if username])
+
+    while True:
+        # Checked before every batch, since a scan may start while earlier batches are deleted.
+        if _scans_in_flight(redis_client):
+            report.skipped.append("user cleanup: a scan or resumable checkpoint is in flight")
+            return
+        user_ids = list(unreferenced.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not user_ids:
+            return
+        with transaction.atomic():
+            # Re-check inside the transaction; a concurrent ingest may have referenced some of them.
+            report.deleted(unreferenced.filter(id__in=user_ids))
+
+
+def collect_garbage(*, redis_client: redis.Redis, now: Optional[datetime] = None) -> GcReport:
+    """Thin out snapshots by the retention tiers, repair what pointed at them and drop orphaned users"""
+    report = GcReport()
+    budget = settings.SNAPSHOT_GC_MAX_SNAPSHOTS
+
+    profile_ids = FollowerSnapshot.objects.values_list("profile_id", flat=True).distinct().order_by("profile_id")
+    for profile_id in profile_ids:
+        if budget <= 0:
+            report.skipped.append("snapshot budget used up; the rest is pruned on the next run")
+            break
+
+        rebuild: Set[int] = set()
+        for snapshot_id in snapshots_to_prune(profile_id=profile_id, now=now)[:budget]:
+            next_id = delete_snapshot(snapshot_id=snapshot_id, report=report)
+            budget -= 1
+            if next_id is not None:
+                rebuild.add(next_id)
+            rebuild.discard(snapshot_id)
+
+        # The snapshot after each deleted one now diffs against an older snapshot.
+        for snapshot in FollowerSnapshot.objects.filter(id__in=rebuild).order_by("id"):
+            build_snapshot_diff(snapshot=snapshot)
+            build_snapshot_rollup(snapshot=snapshot)
+            report.snapshots_rebuilt += 1
+
+    delete_unreferenced_users(redis_client=redis_client, report=report, batch_size=settings.SNAPSHOT_GC_USER_BATCH_SIZE)
+
+    return report
@@ -0,0 +1,105 @@
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+
+from instagram_automation.models import FollowerSnapshot, FollowMembership, InstagramUser, SnapshotRollup
+from instagram_automation.packed_ids import difference, intersection
+
+BUCKETS = ("day", "week", "month")
+
+
+def store_snapshot_rollup(*,
+    snapshot: FollowerSnapshot,
+    follower_count: int,
+    following_count: int,
+    gained: int,
+    lost: int,
+    reciprocal_count: int
+) -> SnapshotRollup:
+    rollup, _ = SnapshotRollup.objects.update_or_create(
+        snapshot=snapshot,
+        defaults={
+            "profile_id": snapshot.profile_id,
+            "timestamp": snapshot.timestamp,
+            "follower_count": follower_count,
+            "following_count": following_count,
+            "gained": gained,
+            "lost": lost,
+            "reciprocal_count": reciprocal_count,
+        }
+    )
+    return rollup
+
+
+def _member_array(snapshot: FollowerSnapshot, relation: str) -> np.ndarray:
+    ids = snapshot.member_id_array(relation)
+    if ids is None:
+        ids = np.sort(np.fromiter(snapshot.member_ids(relation), dtype=np.int64))
+    return ids
+
+
+def build_snapshot_rollup(*, snapshot: FollowerSnapshot) -> SnapshotRollup:
+    """Compute and store the rollup of an existing snapshot against the profile's previous one"""
+    previous_snapshot = (
+        FollowerSnapshot.objects.filter(profile_id=snapshot.profile_id, id__lt=snapshot.id)
+        .order_by("-id")
+        .first()
+    )
+    followers = _member_array(snapshot, FollowMembership.FOLLOWER)
+    following = _member_array(snapshot, FollowMembership.FOLLOWING)
+
+    gained = lost = 0
+    if previous_snapshot:
+        previous_followers = _member_array(previous_snapshot, FollowMembership.FOLLOWER)
+        gained = len(difference(followers, previous_followers))
+        lost = len(difference(previous_followers, followers))
+
+    return store_snapshot_rollup(
+        snapshot=snapshot,
+        follower_count=len(followers),
+        following_count=len(following),
+        gained=gained,
+        lost=lost,
+        reciprocal_count=len(intersection(followers, following))
+    )
+
+
+def follower_history(*, profile: InstagramUser, bucket: str, since: Optional[datetime] = None) -> List[dict]:
+    """Follower counts, gains, losses and churn per day/week/month, aggregated in one query over the rollups"""
+    rollups = SnapshotRollup.objects.filter(profile=profile)
+    if since is not None:
+        rollups = rollups.filter(timestamp__gte=since)
+
+    rows = (
+        rollups.annotate(bucket=Trunc("timestamp", bucket))
+        .values("bucket")
+        .annotate(
+            snapshots=Count("id"),
+            gained=Sum("gained"),
+            lost=Sum("lost"),
+            follower_counts=ArrayAgg("follower_count", ordering="timestamp"),
+            following_counts=ArrayAgg("following_count", ordering="timestamp"),
+            reciprocal_counts=ArrayAgg("reciprocal_count", ordering="timestamp"),
+        )
+        .order_by("bucket")
+    )
+
+    series = []
+    for row in rows:
+        opening_followers = row["follower_counts"][0]
+        series.append({
+            "bucket": row["bucket"].isoformat(),
+            "snapshots": row["snapshots"],
+            "follower_count": row["follower_counts"][-1],
+            "following_count": row["following_counts"][-1],
+            "reciprocal_count": row["reciprocal_counts"][-1],
+            "gained": row["gained"],
+            "lost": row["lost"],
+            # Share of the bucket's opening followers that left during it
+            "churn_rate": round(row["lost"] / opening_followers, 4) if opening_followers else 0.0,
+        })
+    return series
@@ -0,0 +1,53 @@
+import json
+from typing import Dict, NamedTuple, Optional, Set
+
+import redis
+from django.conf import settings
+
+from instagram_automation.packed_ids import pack_ids, unpack_ids
+
+
+class ScrapeResult(NamedTuple):
+    follower_ids: Set[int]
+    following_ids: Set[int]
+    users_inserted: int
+    partial_lists: Set[str]  # List types that stopped early in incremental mode
+    reported_counts: Dict[str, int]
+    profile_pk: Optional[int] = None  # Instagram pk of the scanned account, from the session
+
+
+def store_scrape_result(redis_client: redis.Redis, scan_id: str, result: ScrapeResult) -> str:
+    """Park a fetched result in Redis and return the key handed to the persist stage"""
+    key = f"scan_result_for_{scan_id}"
+    redis_client.hset(key, mapping={
+        "followers": pack_ids(result.follower_ids),
+        "following": pack_ids(result.following_ids),
+        "meta": json.dumps({
+            "users_inserted": result.users_inserted,
+            "partial_lists": sorted(result.partial_lists),
+            "reported_counts": result.reported_counts,
+            "profile_pk": result.profile_pk,
+        }),
+    })
+    redis_client.expire(key, settings.SCAN_RESULT_TTL)
+    return key
+
+
+def load_scrape_result(redis_client: redis.Redis, key: str) -> ScrapeResult:
+    fields = redis_client.hgetall(key)
+    if not fields:
+        raise LookupError(f"Scan result {key} expired before it was persisted.")
+
+    meta = json.loads(fields[b"meta"])
+    return ScrapeResult(
+        follower_ids=set(unpack_ids(fields[b"followers"]).tolist()),
+        following_ids=set(unpack_ids(fields[b"following"]).tolist()),
+        users_inserted=meta["users_inserted"],
+        partial_lists=set(meta["partial_lists"]),
+        reported_counts=meta["reported_counts"],
+        profile_pk=meta.get("profile_pk"),
+    )
+
+
+def delete_scrape_result(redis_client: redis.Redis, key: str) -> None:
+    redis_client.delete(key)
@@ -0,0 +1,87 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from instagram_automation.models import InstagramUser, SnapshotRollup
+
+logger = logging.getLogger("instagram_automation")
+
+DISPATCHES_KEY = "scan_dispatches"
+BUDGET_WINDOW = 60 * 60
+
+
+def churn_per_hour(*, profile: Optional[InstagramUser]) -> Optional[float]:
+    """Follower changes per hour over the profile's last SCAN_CHURN_WINDOW snapshots; None without enough history"""
+    if profile is None:
+        return None
+    rollups = list(
+        SnapshotRollup.objects.filter(profile=profile)
+        .order_by("-timestamp")
+        .values_list("timestamp", "gained", "lost")[:settings.SCAN_CHURN_WINDOW]
+    )
+    if len(rollups) < 2:
+        return None
+
+    # The oldest rollup's changes happened before the window opened.
+    changes = sum(gained + lost for _, gained, lost in rollups[:-1])
+    hours = (rollups[0][0] - rollups[-1][0]).total_seconds() / 3600
+    return changes / hours if hours > 0 else None
+
+
+def scan_interval(changes_per_hour: Optional[float]) -> timedelta:
+    """Time until the next scan is expected to see SCAN_TARGET_CHANGES changes, clamped to the configured range"""
+    min_hours = settings.SCAN_INTERVAL_MIN_HOURS
+    max_hours = settings.SCAN_INTERVAL_MAX_HOURS
+    if changes_per_hour is None:
+        hours = min_hours  # Learn a new account's churn quickly
+    elif changes_per_hour <= 0:
+        hours = max_hours
+    else:
+        hours = min(max(settings.SCAN_TARGET_CHANGES / changes_per_hour, min_hours), max_hours)
+    return timedelta(hours=hours)
+
+
+def in_quiet_hours(when: datetime) -> bool:
+    start, end = settings.SCAN_QUIET_HOURS_START, settings.SCAN_QUIET_HOURS_END
+    hour = timezone.localtime(when).hour
+    if start == end:
+        return False
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+def past_quiet_hours(when: datetime) -> datetime:
+    """when, or the end of the quiet hours it falls into"""
+    if not in_quiet_hours(when):
+        return when
+    local = timezone.localtime(when)
+    end = local.replace(hour=settings.SCAN_QUIET_HOURS_END, minute=0, second=0, microsecond=0)
+    return end if end > local else end + timedelta(days=1)
+
+
+def next_scan_time(*, now: datetime, interval: timedelta) -> datetime:
+    """now + interval with ±SCAN_SCHEDULE_JITTER so scans of similar accounts drift apart, outside quiet hours"""
+    jitter = settings.SCAN_SCHEDULE_JITTER
+    return past_quiet_hours(now + interval * random.uniform(1 - jitter, 1 + jitter))
+
+
+def remaining_scan_budget(redis_client: redis.Redis) -> int:
+    """Scans that may still be dispatched this hour under SCAN_HOURLY_BUDGET"""
+    with redis_client.pipeline() as pipe:
+        pipe.zremrangebyscore(DISPATCHES_KEY, "-inf", time.time() - BUDGET_WINDOW)
+        pipe.zcard(DISPATCHES_KEY)
+        _, dispatched = pipe.execute()
+    return max(settings.SCAN_HOURLY_BUDGET - dispatched, 0)
+
+
+def record_scan_dispatch(redis_client: redis.Redis, scan_id: str) -> None:
+    """Count a scan against the hourly budget; manual scans count too but are never refused"""
+    with redis_client.pipeline() as pipe:
+        pipe.zadd(DISPATCHES_KEY, {scan_id: time.time()})
+        pipe.expire(DISPATCHES_KEY, BUDGET_WINDOW)
+        pipe.execute()
@@ -0,0 +1,62 @@
+import json
+import logging
+from typing import List, Optional
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger("instagram_automation")
+
+STATS_KEY = "ig_session_cache_stats"
+
+
+class SessionExpiredError(Exception):
+    """Instagram rejected the session (401/403); it has to be bootstrapped again in the browser"""
+
+
+def _session_key(username: str) -> str:
+    return f"ig_session_for_{username}"
+
+
+def _cookies_key(username: str) -> str:
+    return f"ig_cookies_for_{username}"
+
+
+def get_cached_session(redis_client: redis.Redis, username: str, *, count_lookup: bool = True) -> Optional[dict]:
+    """Session data (app_id, cookies, user_id, csrf_token) shared by every worker, or None on a miss
+
+    Pass count_lookup=False when re-reading a session a previous lookup already counted.
+    """
+    raw = redis_client.get(_session_key(username))
+    if count_lookup:
+        redis_client.hincrby(STATS_KEY, "hits" if raw else "misses", 1)
+    return json.loads(raw) if raw else None
+
+
+def store_session(redis_client: redis.Redis, username: str, session_data: dict) -> None:
+    redis_client.set(_session_key(username), json.dumps(session_data), ex=settings.IG_SESSION_CACHE_TTL)
+
+
+def invalidate_session(redis_client: redis.Redis, username: str) -> None:
+    redis_client.delete(_session_key(username))
+    redis_client.hincrby(STATS_KEY, "rejected", 1)
+
+
+def record_browser_bootstrap(redis_client: redis.Redis, seconds: float) -> None:
+    redis_client.hincrbyfloat(STATS_KEY, "browser_seconds", seconds)
+
+
+def load_browser_cookies(redis_client: redis.Redis, username: str) -> Optional[List[dict]]:
+    raw = redis_client.get(_cookies_key(username))
+    return json.loads(raw) if raw else None
+
+
+def store_browser_cookies(redis_client: redis.Redis, username: str, cookies: List[dict]) -> None:
+    redis_client.set(_cookies_key(username), json.dumps(cookies), ex=settings.IG_COOKIE_TTL)
+
+
+def cache_stats(redis_client: redis.Redis) -> dict:
+    stats = {key.decode(): float(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else 0.0
+    return stats
@@ -1,36 +1,101 @@
 import asyncio
 import logging
 import os
-import pickle
 import random
 import time
-from typing import Set, Tuple
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 import aiohttp
 import redis
-from celery import shared_task
+from asgiref.sync import sync_to_async
+from celery import chain, shared_task
+from celery.exceptions import Ignore
 from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+from redis import asyncio as aioredis
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from yarl import URL
 
-from instagram_automation.models import FollowerSnapshot, InstagramUser
+from instagram_automation.cancellation import CancelToken, ScanCancelled
+from instagram_automation.checkpoints import Checkpoint, ListCheckpointer, clear_checkpoints
+from instagram_automation.diffs import build_snapshot_diff
+from instagram_automation.driver_pool import get_driver_pool
+from instagram_automation.ingestion import (
+    StaleFencingTokenError,
+    UserRecord,
+    find_profile_user,
+    ingest_snapshot,
+    placeholder_users_exist,
+    resolve_profile_user,
+    upsert_user_records,
+)
+from instagram_automation.leases import LeaseLost, ScanLease, renew_kept_leases
+from instagram_automation.metrics import ScanMetrics, record_scan_stage, scan_report, start_scan_run
+from instagram_automation.models import FollowerSnapshot, FollowMembership, InstagramAccount, ScanRun
+from instagram_automation.progress import ScanProgress
+from instagram_automation.rate_control import RateController
+from instagram_automation.redis_clients import get_redis
+from instagram_automation.retention import collect_garbage
+from instagram_automation.scheduling import (
+    churn_per_hour,
+    in_quiet_hours,
+    next_scan_time,
+    record_scan_dispatch,
+    remaining_scan_budget,
+    scan_interval,
+)
+from instagram_automation.scan_results import ScrapeResult, delete_scrape_result, load_scrape_result, store_scrape_result
+from instagram_automation.session_cache import (
+    SessionExpiredError,
+    get_cached_session,
+    invalidate_session,
+    load_browser_cookies,
+    record_browser_bootstrap,
+    store_browser_cookies,
+    store_session,
+)
 
 logger = logging.getLogger("instagram_automation")
 
 
 
-CHROME_DRIVER_PATH = '/app/drivers/chromedriver'
-COOKIE_FILE_PATH = '/app/cookies/instagram_cookies.pkl'
 DEBUG_DIR = '/app/debug'
-COOKIE_DIR = '/app/cookies'
 
-os.makedirs(COOKIE_DIR, exist_ok=True)
+LIST_RELATIONS = {
+    "Followers": FollowMembership.FOLLOWER,
+    "Following": FollowMembership.FOLLOWING,
+}
+
+
+class ListBaseline(NamedTuple):
+    """What the previous snapshot says about one list, used to stop incremental scans early"""
+    known_ids: Set[int]
+    reported_count: Optional[int]
+
+
+class ListPage(NamedTuple):
+    users: List[UserRecord]
+    next_max_id: Optional[str]  # None on the last page
+
+
+class AccountScrape(NamedTuple):
+    username: str
+    session_data: dict
+    max_concurrent_requests: int
+    known_ids: Optional[Dict[str, Set[int]]] = None
+    cancel_token: Optional[CancelToken] = None
+    lease: Optional[ScanLease] = None
+    metrics: Optional[ScanMetrics] = None
+    progress: Optional[ScanProgress] = None
+
+
 os.makedirs(DEBUG_DIR, exist_ok=True)
 
 def _create_debug_files(driver: webdriver.Chrome, file_name: str) -> None:
@@ -89,21 +154,12 @@ def _extract_session_data(driver: webdriver.Chrome) -> dict:
     }
 
 
-async def _scrape_follower_list_async(*,
-    session: aiohttp.ClientSession,
-    session_data: dict,
-    list_type: str,
-    username: str
-) -> Set[str]:
-    
-    api_path = "followers" if list_type == "Followers" else "following"
-    api_url = f"https://www.instagram.com/api/v1/friendships/{session_data['user_id']}/{api_path}/"
-    
-    headers = {
+def _api_headers(*, session_data: dict, referer: str) -> dict:
+    return {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
         'x-ig-app-id': str(session_data['app_id']),
         'X-CSRFToken': session_data['csrf_token'],
-        'Referer': f'https://www.instagram.com/{username}/{api_path}/',
+        'Referer': referer,
         'X-Requested-With': 'XMLHttpRequest',
         'Accept': '*/*',
         'Accept-Language': 'en-US,en;q=0.9',
@@ -113,35 +169,105 @@ async def _scrape_follower_list_async(*,
         'Sec-Fetch-Mode': 'cors',
         'Sec-Fetch-Site': 'same-origin',
     }
+
+
+async def _fetch_reported_counts(*,
+    session: aiohttp.ClientSession,
+    session_data: dict,
+    username: str,
+    rate_controller: RateController,
+    request_slots: asyncio.Semaphore
+) -> Dict[str, int]:
+    """Follower/following totals from the profile, keyed by list type; empty if unavailable"""
+    api_url = f"{settings.INSTAGRAM_BASE_URL}/api/v1/users/web_profile_info/"
+    headers = _api_headers(session_data=session_data, referer=f'{settings.INSTAGRAM_BASE_URL}/{username}/')
+    
+    try:
+        await rate_controller.acquire()
+        async with request_slots, session.get(api_url, headers=headers, params={"username": username}) as response:
+            if response.status in [401, 403]:
+                raise SessionExpiredError(f"Instagram rejected the session with status {response.status}")
+            if response.status != 200:
+                logger.warning(f"Profile info request failed with status {response.status}")
+                return {}
+            data = await response.json()
+        
+        user = data["data"]["user"]
+        return {
+            "Followers": user["edge_followed_by"]["count"],
+            "Following": user["edge_follow"]["count"],
+        }
+    
+    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, TypeError) as e:
+        logger.warning(f"Could not read reported follower counts: {e}")
+        return {}
+
+
+async def _scrape_follower_list_async(*,
+    session: aiohttp.ClientSession,
+    session_data: dict,
+    list_type: str,
+    username: str,
+    rate_controller: RateController,
+    request_slots: asyncio.Semaphore,
+    start_max_id: Optional[str] = None,
+    cancel_token: Optional[CancelToken] = None,
+    lease: Optional[ScanLease] = None,
+    redis_client: Optional[aioredis.Redis] = None,
+    metrics: Optional[ScanMetrics] = None
+) -> AsyncIterator[ListPage]:
+    """Yield each page of the list as compact records as soon as it arrives, starting at `start_max_id` when resuming"""
     
-    all_user_list = []
-    max_id = None
+    api_path = "followers" if list_type == "Followers" else "following"
+    api_url = f"{settings.INSTAGRAM_BASE_URL}/api/v1/friendships/{session_data['user_id']}/{api_path}/"
+    headers = _api_headers(session_data=session_data, referer=f'{settings.INSTAGRAM_BASE_URL}/{username}/{api_path}/')
+    
+    fetched_count = 0
+    max_id = start_max_id
     retry_count = 0
     max_retries = 3
     
     logger.info(f"Starting async fetch of {api_path} for {username}...")
     
     while True:
-        params = {"count": 25}
+        if redis_client:
+            if cancel_token:
+                await cancel_token.araise_if_cancelled(redis_client)
+            if lease:
+                await lease.heartbeat(redis_client)
+        
+        # Pacing and page size come from the rate controller shared by every worker on this session.
+        wait_started_at = time.monotonic()
+        params = {"count": await rate_controller.acquire()}
+        request_started_at = time.monotonic()
+        if metrics:
+            metrics.add_phase("rate_limit_wait", request_started_at - wait_started_at)
         if max_id: 
             params["max_id"] = max_id
         
         try:
-            async with session.get(api_url, headers=headers, params=params) as response:
+            async with request_slots, session.get(api_url, headers=headers, params=params) as response:
                 
                 if response.status != 200:
+                    if metrics:
+                        metrics.observe_request(seconds=time.monotonic() - request_started_at, status=response.status)
                     logger.error(f"API request failed with status {response.status}")
                     
-                    if response.status == 429:
-                        logger.warning("Rate limited - waiting before retry...")
-                        await asyncio.sleep(random.uniform(5, 10))
+                    if response.status in [401, 403]:
+                        raise SessionExpiredError(f"Instagram rejected the session with status {response.status}")
+                    
+                    elif response.status == 429:
+                        logger.warning("Rate limited - backing off before retry...")
+                        await rate_controller.record_throttle(response.status)
                         continue
                     
                     elif response.status in [500, 502, 503, 504]:
+                        await rate_controller.record_throttle(response.status)
                         if retry_count < max_retries:
                             retry_count += 1
+                            if metrics:
+                                metrics.record_retry()
                             logger.warning(f"Server error {response.status}, retry {retry_count}/{max_retries}")
-                            await asyncio.sleep(random.uniform(2, 5))
                             continue
                         else:
                             logger.error(f"Max retries exceeded for server error {response.status}")
@@ -153,21 +279,15 @@ async def _scrape_follower_list_async(*,
                 retry_count = 0
                 
                 data = await response.json()
-                page_user_list = data.get("users", [])
-                all_user_list.extend(page_user_list)
-                
-                logger.info(f"[{list_type}] Fetched {len(page_user_list)} users. Total: {len(all_user_list)}")
-                
-                if data.get("next_max_id"):
-                    max_id = data["next_max_id"]
-                    await asyncio.sleep(random.uniform(1, 2))
-                else:
-                    logger.info(f"[{list_type}] Reached end of list. Total: {len(all_user_list)}")
-                    break
+                if metrics:
+                    metrics.observe_request(seconds=time.monotonic() - request_started_at, status=response.status)
+                await rate_controller.record_success()
                     
         except aiohttp.ClientError as e:
             if retry_count < max_retries:
                 retry_count += 1
+                if metrics:
+                    metrics.record_retry()
                 logger.warning(f"Network error: {e}, retry {retry_count}/{max_retries}")
                 await asyncio.sleep(random.uniform(2, 5))
                 continue
@@ -178,6 +298,8 @@ async def _scrape_follower_list_async(*,
         except asyncio.TimeoutError:
             if retry_count < max_retries:
                 retry_count += 1
+                if metrics:
+                    metrics.record_retry()
                 logger.warning(f"Request timeout, retry {retry_count}/{max_retries}")
                 await asyncio.sleep(random.uniform(2, 5))
                 continue
@@ -188,132 +310,466 @@ async def _scrape_follower_list_async(*,
         except Exception as e:
             logger.error(f"Unexpected error during API request: {e}")
             raise
+        
+        # Drop the raw user dicts (pics, flags, ...) right away; only these fields are persisted.
+        page = [
+            UserRecord(pk=int(user['pk']), username=user['username'], full_name=user.get('full_name') or '')
+            for user in data.get("users", [])
+        ]
+        next_max_id = data.get("next_max_id")
+        del data
+        
+        fetched_count += len(page)
+        logger.info(f"[{list_type}] Fetched {len(page)} users. Total: {fetched_count}")
+        
+        yield ListPage(users=page, next_max_id=next_max_id)
+        
+        if next_max_id:
+            max_id = next_max_id
+        else:
+            logger.info(f"[{list_type}] Reached end of list. Total: {fetched_count}")
+            break
+
+
+
+async def _stream_list_to_db(*,
+    pages: AsyncIterator[ListPage],
+    list_type: str,
+    redis_client: aioredis.Redis,
+    has_placeholders: bool = True,
+    baseline: Optional[ListBaseline] = None,
+    checkpointer: Optional[ListCheckpointer] = None,
+    resume_from: Optional[Checkpoint] = None,
+    progress: Optional[ScanProgress] = None
+) -> Tuple[Set[int], int, bool]:
+    """Store pages while later ones are fetched; at most SCRAPE_PAGES_IN_FLIGHT pages wait in memory.
+    
+    With a baseline, paging stops early once enough consecutive pages contain only
+    users already in the previous snapshot. Stored pages are checkpointed so a retry
+    can pass the checkpoint back as `resume_from`. Returns (user_ids, users_inserted, complete).
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SCRAPE_PAGES_IN_FLIGHT)
+    
+    async def produce() -> None:
+        try:
+            async with aclosing(pages):
+                async for page in pages:
+                    await queue.put(page)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
     
-    follower_usernames = [user['username'] for user in all_user_list]
-    return set(follower_usernames)
+    store_page = sync_to_async(upsert_user_records, thread_sensitive=True)
+    producer = asyncio.create_task(produce())
+    user_ids: Set[int] = set(resume_from.user_ids) if resume_from else set()
+    users_inserted = resume_from.users_inserted if resume_from else 0
+    pages_stored = resume_from.pages if resume_from else 0
+    new_ids: Set[int] = user_ids - baseline.known_ids if baseline else set()
+    matching_pages = 0
+    complete = True
+    
+    try:
+        while (item := await queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            
+            page_ids, page_inserted, _ = await store_page(item.users, has_placeholders=has_placeholders)
+            user_ids.update(page_ids.values())
+            users_inserted += page_inserted
+            pages_stored += 1
+            
+            if checkpointer:
+                await checkpointer.page_stored(
+                    page_ids=set(page_ids.values()),
+                    next_max_id=item.next_max_id,
+                    pages=pages_stored,
+                    users_inserted=users_inserted
+                )
+            
+            if progress:
+                await progress.alist_progress(redis_client, list_type, users=len(user_ids), pages=pages_stored)
+            
+            if baseline is None:
+                continue
+            
+            page_new_ids = set(page_ids.values()) - baseline.known_ids
+            new_ids |= page_new_ids
+            matching_pages = 0 if page_new_ids else matching_pages + 1
+            
+            if matching_pages >= settings.SCAN_INCREMENTAL_STOP_PAGES:
+                expected_count = len(baseline.known_ids) + len(new_ids)
+                if baseline.reported_count == expected_count:
+                    logger.info(f"[{list_type}] {matching_pages} pages match the previous snapshot. Stopping early.")
+                    complete = False
+                    break
+                
+                # Someone left (or joined further down), so only a full pass gives the right set.
+                logger.info(
+                    f"[{list_type}] Reported count {baseline.reported_count} != expected {expected_count}. "
+                    f"Continuing to a full reconciliation of this list."
+                )
+                baseline = None
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+    
+    return user_ids, users_inserted, complete
 
 
 
-async def _perform_concurrent_scraping(*, session_data: dict, username: str) -> Tuple[Set[str], Set[str]]:
+async def _scrape_account(*,
+    session_data: dict,
+    username: str,
+    connector: aiohttp.BaseConnector,
+    redis_client: aioredis.Redis,
+    request_slots: asyncio.Semaphore,
+    has_placeholders: bool = True,
+    known_ids: Optional[Dict[str, Set[int]]] = None,
+    cancel_token: Optional[CancelToken] = None,
+    lease: Optional[ScanLease] = None,
+    metrics: Optional[ScanMetrics] = None,
+    progress: Optional[ScanProgress] = None
+) -> ScrapeResult:
+    """Fetch both lists of one account; `known_ids` (previous members per list type) enables incremental mode"""
     cookie_jar = aiohttp.CookieJar()
     for name, value in session_data['cookies'].items():
-        cookie_jar.update_cookies({name: value}, response_url=URL("https://www.instagram.com"))
+        cookie_jar.update_cookies({name: value}, response_url=URL(settings.INSTAGRAM_BASE_URL))
     
-    connector = aiohttp.TCPConnector(
-        limit=2,
-        limit_per_host=2,
-        ssl=True
-    )
+    rate_controller = RateController(redis_client=redis_client, session_id=session_data['user_id'])
     
     async with aiohttp.ClientSession(
         cookie_jar=cookie_jar,
         connector=connector,
+        connector_owner=False,
         timeout=aiohttp.ClientTimeout(total=60)
     ) as session:
         
-        followers_task = _scrape_follower_list_async(
+        reported_counts = await _fetch_reported_counts(
             session=session,
             session_data=session_data,
-            list_type="Followers",
-            username=username
+            username=username,
+            rate_controller=rate_controller,
+            request_slots=request_slots
         )
+        if progress:
+            progress.set_reported_counts(reported_counts)
+            await progress.aset_phase(redis_client, "fetching_lists")
         
-        following_task = _scrape_follower_list_async(
-            session=session,
-            session_data=session_data,
-            list_type="Following",
-            username=username
-        )
+        async def list_task(list_type: str) -> Tuple[Set[int], int, bool]:
+            baseline = None
+            if known_ids is not None and list_type in reported_counts:
+                baseline = ListBaseline(known_ids=known_ids[list_type], reported_count=reported_counts[list_type])
+            
+            checkpointer = ListCheckpointer(redis_client=redis_client, username=username, list_type=list_type)
+            resume_from = await checkpointer.load()
+            if resume_from and resume_from.done:
+                logger.info(f"[{list_type}] Already fetched by a previous attempt ({len(resume_from.user_ids)} users).")
+                if progress:
+                    await progress.alist_progress(redis_client, list_type, users=len(resume_from.user_ids), pages=resume_from.pages)
+                return resume_from.user_ids, resume_from.users_inserted, True
+            if resume_from:
+                logger.info(f"[{list_type}] Resuming after page {resume_from.pages} ({len(resume_from.user_ids)} users).")
+            
+            return await _stream_list_to_db(
+                pages=_scrape_follower_list_async(
+                    session=session,
+                    session_data=session_data,
+                    list_type=list_type,
+                    username=username,
+                    rate_controller=rate_controller,
+                    request_slots=request_slots,
+                    start_max_id=resume_from.max_id if resume_from else None,
+                    cancel_token=cancel_token,
+                    lease=lease,
+                    redis_client=redis_client,
+                    metrics=metrics
+                ),
+                list_type=list_type,
+                redis_client=redis_client,
+                has_placeholders=has_placeholders,
+                baseline=baseline,
+                checkpointer=checkpointer,
+                resume_from=resume_from,
+                progress=progress
+            )
         
-        followers_set, following_set = await asyncio.gather(
-            followers_task, 
-            following_task,
-            return_exceptions=True
-        )
+        list_tasks = {
+            list_type: asyncio.create_task(list_task(list_type))
+            for list_type in ("Followers", "Following")
+        }
+        try:
+            # A failed or cancelled list stops its sibling right away instead of letting it page on.
+            done, _ = await asyncio.wait(list_tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for list_type, task in list_tasks.items():
+                if task in done and task.exception() is not None:
+                    logger.error(f"[{username}] {list_type} fetch failed: {task.exception()}")
+                    raise task.exception()
+        finally:
+            for task in list_tasks.values():
+                task.cancel()
+            await asyncio.gather(*list_tasks.values(), return_exceptions=True)
         
-        if isinstance(followers_set, Exception) or isinstance(followers_set, BaseException):
-            logger.error(f"Followers fetch failed: {followers_set}")
-            raise followers_set
-        if isinstance(following_set, Exception) or isinstance(following_set, BaseException):
-            logger.error(f"Following fetch failed: {following_set}")
-            raise following_set
-            
-        return followers_set, following_set
+        follower_ids, followers_inserted, followers_complete = list_tasks["Followers"].result()
+        following_ids, following_inserted, following_complete = list_tasks["Following"].result()
+        return ScrapeResult(
+            follower_ids=follower_ids,
+            following_ids=following_ids,
+            users_inserted=followers_inserted + following_inserted,
+            partial_lists={
+                list_type
+                for list_type, complete in (("Followers", followers_complete), ("Following", following_complete))
+                if not complete
+            },
+            reported_counts=reported_counts,
+            profile_pk=int(session_data['user_id'])
+        )
 
 
 
-def _perform_follower_scrape(*, driver: webdriver.Chrome, username: str, password: str, request_id: str) -> None:
+async def _scrape_accounts_concurrently(*,
+    accounts: List[AccountScrape],
+    connection_limit: int
+) -> List[Union[ScrapeResult, BaseException]]:
+    """Scrape many accounts in one event loop over one connection pool"""
+    connector = aiohttp.TCPConnector(
+        limit=connection_limit,
+        limit_per_host=connection_limit,
+        ssl=True
+    )
+    # Lives and dies with this asyncio.run() loop, so it can't come from the shared per-loop clients.
+    async_redis = aioredis.from_url(settings.CELERY_BROKER_URL)
     
     try:
-        logger.info("Establishing browser context...")
-        driver.get(f"https://www.instagram.com/{username}/")
-        time.sleep(random.uniform(2, 4))
-        
-        session_data = _extract_session_data(driver)
-        logger.info("Session data extracted successfully")
-        
-        driver.get(f"https://www.instagram.com/{username}/followers/")
-        time.sleep(random.uniform(1, 2))
-        
-        driver.get(f"https://www.instagram.com/{username}/following/")
-        time.sleep(random.uniform(1, 2))
-        
-        logger.info("Starting concurrent API scraping...")
-        followers_set, following_set = asyncio.run(
-            _perform_concurrent_scraping(
+        # One check per run instead of one per page.
+        has_placeholders = await sync_to_async(placeholder_users_exist, thread_sensitive=True)()
+        return await asyncio.gather(
+            *[
+                _scrape_account(
+                    session_data=account.session_data,
+                    username=account.username,
+                    connector=connector,
+                    redis_client=async_redis,
+                    request_slots=asyncio.Semaphore(account.max_concurrent_requests),
+                    has_placeholders=has_placeholders,
+                    known_ids=account.known_ids,
+                    cancel_token=account.cancel_token,
+                    lease=account.lease,
+                    metrics=account.metrics,
+                    progress=account.progress
+                )
+                for account in accounts
+            ],
+            return_exceptions=True
+        )
+    finally:
+        await connector.close()
+        await async_redis.aclose()
+        # Page writes ran on the sync_to_async worker thread; don't leave its connection idle.
+        await sync_to_async(connections.close_all, thread_sensitive=True)()
+
+
+
+async def _perform_concurrent_scraping(*,
+    session_data: dict,
+    username: str,
+    known_ids: Optional[Dict[str, Set[int]]] = None,
+    cancel_token: Optional[CancelToken] = None,
+    lease: Optional[ScanLease] = None,
+    metrics: Optional[ScanMetrics] = None,
+    progress: Optional[ScanProgress] = None
+) -> ScrapeResult:
+    [result] = await _scrape_accounts_concurrently(
+        accounts=[
+            AccountScrape(
+                username=username,
                 session_data=session_data,
-                username=username
+                max_concurrent_requests=2,
+                known_ids=known_ids,
+                cancel_token=cancel_token,
+                lease=lease,
+                metrics=metrics,
+                progress=progress
             )
+        ],
+        connection_limit=2
+    )
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+
+def _incremental_known_ids(*, username: str) -> Optional[Dict[str, Set[int]]]:
+    """Previous members per list type if this run may be incremental, None when a full scan is due"""
+    full_every = settings.SCAN_FULL_RECONCILE_EVERY
+    profile = find_profile_user(username)
+    if full_every <= 1 or profile is None:
+        return None
+    
+    recent_modes = FollowerSnapshot.objects.filter(
+        profile=profile
+    ).order_by("-id").values_list("scan_mode", flat=True)[:full_every - 1]
+    if FollowerSnapshot.FULL not in recent_modes:
+        logger.info(f"[{username}] Full reconciliation scan is due.")
+        return None
+    
+    return {
+        list_type: set(
+            FollowMembership.objects.open().filter(profile=profile, relation=relation).values_list("user_id", flat=True)
         )
+        for list_type, relation in LIST_RELATIONS.items()
+    }
+
+
+
+def _bootstrap_session_via_browser(*,
+    redis_client: redis.Redis,
+    username: str,
+    password: str,
+    request_id: str,
+    cancel_token: Optional[CancelToken] = None,
+    metrics: Optional[ScanMetrics] = None
+) -> dict:
+    """Borrow a logged-in browser, extract fresh session data and share it through Redis"""
+    started_at = time.monotonic()
+    metrics = metrics or ScanMetrics()
+    
+    def check_cancelled() -> None:
+        if cancel_token:
+            cancel_token.raise_if_cancelled(redis_client)
+    
+    check_cancelled()
+    # Raising inside the checkout hands the browser straight back to the pool.
+    with get_driver_pool().checkout(
+        username=username,
+        login=_login_callback(username=username, password=password, request_id=request_id, metrics=metrics),
+        metrics=metrics
+    ) as driver:
+        logger.info("Establishing browser context...")
+        with metrics.phase("navigate_profile"):
+            driver.get(f"https://www.instagram.com/{username}/")
+            time.sleep(random.uniform(2, 4))
+        
+        with metrics.phase("session_extraction"):
+            session_data = _extract_session_data(driver)
+        logger.info("Session data extracted successfully")
+        check_cancelled()
         
-        logger.info("Concurrent scraping complete. Saving to database...")
+        with metrics.phase("navigate_followers"):
+            driver.get(f"https://www.instagram.com/{username}/followers/")
+            time.sleep(random.uniform(1, 2))
+        check_cancelled()
         
-    except Exception as e:
-        logger.error(f"Unexpected error while scraping follower/following: {str(e)}")
-        raise
+        with metrics.phase("navigate_following"):
+            driver.get(f"https://www.instagram.com/{username}/following/")
+            time.sleep(random.uniform(1, 2))
     
-    profile_user, _ = InstagramUser.objects.get_or_create(
+    store_session(redis_client, username, session_data)
+    record_browser_bootstrap(redis_client, time.monotonic() - started_at)
+    return session_data
+
+
+
+def _get_session_data(*,
+    redis_client: redis.Redis,
+    username: str,
+    password: str,
+    request_id: str,
+    cancel_token: Optional[CancelToken] = None,
+    metrics: Optional[ScanMetrics] = None
+) -> Tuple[dict, bool]:
+    """Return (session_data, from_cache); the browser is only used on a cache miss"""
+    session_data = get_cached_session(redis_client, username)
+    
+    if session_data is not None:
+        logger.info(f"[{username}] Using cached session data; skipping the browser.")
+        return session_data, True
+    
+    return _bootstrap_session_via_browser(
+        redis_client=redis_client,
         username=username,
-        defaults={"instagram_pk": f"pk_{username}"} #Placeholder pk
-    )
-    snapshot = FollowerSnapshot.objects.create(profile=profile_user)
-    
-    all_users_set = followers_set.union(following_set)
-    user_map = {}
-    for uname in all_users_set:
-        user_obj, _ = InstagramUser.objects.get_or_create(
-            username=uname,
-            defaults={"instagram_pk": f"pk_{uname}"}
+        password=password,
+        request_id=request_id,
+        cancel_token=cancel_token,
+        metrics=metrics
+    ), False
+
+
+
+def _persist_scan(*,
+    username: str,
+    result: ScrapeResult,
+    lease: Optional[ScanLease] = None,
+    metrics: Optional[ScanMetrics] = None
+) -> FollowerSnapshot:
+    if lease:
+        # Make sure we still own the scan right before writing; the fencing token covers a lapse after this.
+        lease.renew(get_redis())
+    
+    profile_user = resolve_profile_user(username=username, instagram_pk=result.profile_pk)
+    metrics = metrics or ScanMetrics()
+    with metrics.phase("db_ingest"):
+        snapshot, _ = ingest_snapshot(
+            profile_user=profile_user,
+            follower_ids=result.follower_ids,
+            following_ids=result.following_ids,
+            partial_relations={LIST_RELATIONS[list_type] for list_type in result.partial_lists},
+            reported_follower_count=result.reported_counts.get("Followers"),
+            reported_following_count=result.reported_counts.get("Following"),
+            fencing_token=lease.fencing_token if lease else None
         )
-        
-        user_map[uname] = user_obj
-        
-    snapshot.followers.add(*[user_map[u] for u in followers_set])
-    snapshot.following.add(*[user_map[u] for u in following_set])
     
-    logger.info(f"Snapshot created with {len(followers_set)} followers and {len(following_set)} following.")
+    logger.info(
+        f"{snapshot.scan_mode.capitalize()} snapshot created with {len(result.follower_ids)} followers "
+        f"and {len(result.following_ids)} following scanned."
+    )
+    
+    with metrics.phase("diff"):
+        diff = build_snapshot_diff(snapshot=snapshot)
+    logger.info(
+        f"Diff stored: {diff.lost_followers_count} lost / {diff.new_followers_count} new followers, "
+        f"{diff.not_following_back_count} not following back."
+    )
     
+    clear_checkpoints(get_redis(), username)
+    return snapshot
 
 
-def _perform_ig_login(*, driver: webdriver.Chrome, username: str, password: str, request_id: str) -> None:
+
+def _perform_ig_login(*,
+    driver: webdriver.Chrome,
+    username: str,
+    password: str,
+    request_id: str,
+    metrics: Optional[ScanMetrics] = None
+) -> None:
+    metrics = metrics or ScanMetrics()
+    started_at = time.monotonic()
     try:
         logger.info("Attempting to log in with cookies...")
         driver.get("https://www.instagram.com/")
         time.sleep(random.uniform(2, 4))
         
-        with open(COOKIE_FILE_PATH, 'rb') as file:
-            cookies = pickle.load(file)
-            for cookie in cookies:
-                driver.add_cookie(cookie)
+        cookies = load_browser_cookies(get_redis(), username)
+        if not cookies:
+            raise ValueError("No saved cookies")
+        for cookie in cookies:
+            driver.add_cookie(cookie)
         
         driver.refresh()
         time.sleep(random.uniform(3, 5))
 
         WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, f"a[href*='/{username}/']")))
         logger.info("Successfully logged in using cookies.")
+        metrics.add_phase("login_cookie", time.monotonic() - started_at)
         
     except Exception as e:
         logger.warning(f"Cookie login failed: {e}. Performing manual login.")
+        metrics.add_phase("login_cookie", time.monotonic() - started_at)
+        started_at = time.monotonic()
         
         try:
         
@@ -335,90 +791,494 @@ def _perform_ig_login(*, driver: webdriver.Chrome, username: str, password: str,
             wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, f"a[href*='/{username}/']")))
             logger.info("Manual login successful! Saving cookies...")
             
-            with open(COOKIE_FILE_PATH, 'wb') as file:
-                pickle.dump(driver.get_cookies(), file)
-            logger.info(f"Cookies saved to {COOKIE_FILE_PATH}")
+            store_browser_cookies(get_redis(), username, driver.get_cookies())
+            logger.info("Cookies saved to Redis")
             
         except TimeoutException:
+            metrics.add_phase("login_manual", time.monotonic() - started_at)
             logger.error("!!! Login failed after submitting credentials. Saving debug info. !!!")
             _create_debug_files(driver, f"{request_id}_failure")
             raise
+        
+        metrics.add_phase("login_manual", time.monotonic() - started_at)
+
+
+def _login_callback(*,
+    username: str,
+    password: str,
+    request_id: str,
+    metrics: Optional[ScanMetrics] = None
+) -> Callable[[webdriver.Chrome], None]:
+    def login(driver: webdriver.Chrome) -> None:
+        _perform_ig_login(
+            driver=driver,
+            username=username,
+            password=password,
+            request_id=request_id,
+            metrics=metrics
+        )
+    return login
+
+
+def _scan_stage_context(scan: dict) -> Tuple[redis.Redis, ScanLease, CancelToken]:
+    """Rebuild the lease and cancel token a pipeline stage works under"""
+    redis_client = get_redis()
+    lease = ScanLease.resume(username=scan["username"], token=scan["lease_token"], fencing_token=scan["fencing_token"])
+    cancel_token = CancelToken(username=scan["username"], task_id=scan["scan_id"])
+    return redis_client, lease, cancel_token
+
+
+def _scan_progress(*, redis_client: redis.Redis, scan: dict) -> ScanProgress:
+    return ScanProgress(redis_client=redis_client, username=scan["username"], scan_id=scan["scan_id"])
+
+
+def _end_scan(*, redis_client: redis.Redis, scan: dict, lease: ScanLease, cancel_token: CancelToken) -> None:
+    cancel_token.clear(redis_client)
+    lease.release(redis_client)
+    if scan.get("result_key"):
+        delete_scrape_result(redis_client, scan["result_key"])
+
+
+def _scan_pipeline(*, scan: dict, password: str) -> chain:
+    """browser (session bootstrap) -> io (pagination and page upserts) -> db (snapshot and diff)"""
+    return chain(
+        bootstrap_scan_session.s(scan, password),
+        fetch_scan_lists.s(password=password),
+        persist_scan_snapshot.s(),
+    ).on_error(release_scan_lease.si(scan))
 
 
 @shared_task(bind=True)
-def scrape_followers_and_following(self, username: str, password: str) -> None:
-    redis_client = redis.from_url(settings.CELERY_BROKER_URL)
-    lock_key = f"scan_lock_for_{username}"
+def scrape_followers_and_following(self, username: str, password: str) -> Optional[str]:
+    """Take the scan lease and start the staged scan pipeline; returns the pipeline's last task id"""
+    redis_client = get_redis()
     
-    is_lock_acquired = redis_client.set(lock_key, "running", ex=3600, nx=True)
+    # The lease's owner token starts with this task id, which identifies the scan in every stage.
+    lease = ScanLease(username=username, task_id=self.request.id)
     
-    if not is_lock_acquired:
+    if not lease.acquire(redis_client):
         message = f"A scan is already in progress for {username}. Aborting this task."
         logger.warning(message)
-        return
-    
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
-    
-    service = Service(executable_path=CHROME_DRIVER_PATH)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+        return None
     
+    scan = {
+        "scan_id": self.request.id,
+        "username": username,
+        "lease_token": lease.token,
+        "fencing_token": lease.fencing_token,
+    }
     try:
+        # Stages renew the lease while they run; this covers the wait in the browser queue.
+        lease.keep_alive(redis_client)
+        start_scan_run(scan_id=scan["scan_id"], username=username)
+        _scan_progress(redis_client=redis_client, scan=scan).set_phase("queued")
+        return _scan_pipeline(scan=scan, password=password).apply_async().id
+    except Exception:
+        lease.release(redis_client)
+        raise
 
-        _perform_ig_login(
-            driver=driver,
-            username=username,
+
+def _bootstrap_stage(*, scan: dict, password: str) -> bool:
+    """Make sure fresh session data is cached for the scan; False if the scan was ended instead"""
+    redis_client, lease, cancel_token = _scan_stage_context(scan)
+    progress = _scan_progress(redis_client=redis_client, scan=scan)
+    metrics = ScanMetrics()
+    status = None
+    
+    try:
+        lease.renew(redis_client)
+        lease.stop_keep_alive(redis_client)
+        progress.set_phase("browser_session")
+        _get_session_data(
+            redis_client=redis_client,
+            username=scan["username"],
             password=password,
-            request_id=self.request.id
+            request_id=scan["scan_id"],
+            cancel_token=cancel_token,
+            metrics=metrics
         )
-                
-        _perform_follower_scrape(
-            driver=driver,
-            username=username,
-            password=password,
-            request_id=self.request.id
+    except (ScanCancelled, LeaseLost) as e:
+        logger.info(f"Scan for {scan['username']} stopped before fetching: {e}")
+        status = ScanRun.CANCELLED if isinstance(e, ScanCancelled) else ScanRun.FAILED
+        _end_scan(redis_client=redis_client, scan=scan, lease=lease, cancel_token=cancel_token)
+    finally:
+        if status is None:
+            # The scan waits in the next stage's queue from here on.
+            lease.keep_alive(redis_client)
+        record_scan_stage(redis_client=redis_client, scan_id=scan["scan_id"], metrics=metrics, status=status)
+        if status:
+            progress.set_phase("finished", state=status)
+    
+    return status is None
+
+
+@shared_task(bind=True)
+def bootstrap_scan_session(self, scan: dict, password: str) -> dict:
+    """Browser stage: make sure fresh session data is cached; the browser is only used on a miss"""
+    if not _bootstrap_stage(scan=scan, password=password):
+        raise Ignore()
+    return scan
+
+
+# A retry resumes each list from its last checkpoint instead of paging from the start.
+@shared_task(
+    bind=True,
+    autoretry_for=(aiohttp.ClientError, asyncio.TimeoutError),
+    retry_backoff=30,
+    retry_backoff_max=120,
+    max_retries=3
+)
+def fetch_scan_lists(self, scan: dict, password: str) -> dict:
+    """IO stage: page both lists into the users table and park the id sets in Redis for the db stage"""
+    redis_client, lease, cancel_token = _scan_stage_context(scan)
+    username = scan["username"]
+    progress = _scan_progress(redis_client=redis_client, scan=scan)
+    metrics = ScanMetrics()
+    status = None
+    
+    try:
+        lease.renew(redis_client)
+        lease.stop_keep_alive(redis_client)
+        # The browser stage's lookup already counted towards the cache hit rate.
+        session_data = get_cached_session(redis_client, username, count_lookup=False)
+        if session_data is None:
+            raise SessionExpiredError("Session data expired from the cache before the fetch stage ran.")
+        
+        known_ids = _incremental_known_ids(username=username)
+        logger.info(f"Starting concurrent API scraping ({'incremental' if known_ids is not None else 'full'})...")
+        result = asyncio.run(
+            _perform_concurrent_scraping(
+                session_data=session_data,
+                username=username,
+                known_ids=known_ids,
+                cancel_token=cancel_token,
+                lease=lease,
+                metrics=metrics,
+                progress=progress
+            )
         )
+    
+    except SessionExpiredError:
+        if scan.get("session_refreshed"):
+            raise
+        # Send the scan back through the browser stage once; checkpoints keep the pages already stored.
+        # The rest of the pipeline (the db stage and the error callback) carries over to the replacement.
+        invalidate_session(redis_client, username)
+        logger.warning(f"[{username}] Session was rejected. Re-queuing the scan through the browser stage...")
+        refreshed_scan = {**scan, "session_refreshed": True}
+        raise self.replace(chain(
+            bootstrap_scan_session.s(refreshed_scan, password),
+            fetch_scan_lists.s(password=password),
+        ))
+    
+    except ScanCancelled:
+        logger.info(f"Scan for {username} cancelled. Nothing was persisted.")
+        status = ScanRun.CANCELLED
+        clear_checkpoints(redis_client, username)
+        _end_scan(redis_client=redis_client, scan=scan, lease=lease, cancel_token=cancel_token)
+        raise Ignore()
+    
+    except LeaseLost as e:
+        logger.warning(f"{e} Another worker owns this scan now; discarding this run.")
+        status = ScanRun.FAILED
+        raise Ignore()
+    
+    finally:
+        if status is None:
+            # The scan waits in a queue again: the db stage's, a retry's or the browser stage's after a rejected session.
+            lease.keep_alive(redis_client)
+        # Also runs for attempts that end in an autoretry, so retried pages are counted too.
+        record_scan_stage(redis_client=redis_client, scan_id=scan["scan_id"], metrics=metrics, status=status)
+        if status:
+            progress.set_phase("finished", state=status)
+    
+    logger.info(f"Concurrent scraping complete ({result.users_inserted} new users stored). Handing off to the db stage...")
+    return {**scan, "result_key": store_scrape_result(redis_client, scan["scan_id"], result)}
+
 
+@shared_task(bind=True)
+def persist_scan_snapshot(self, scan: dict) -> Optional[dict]:
+    """DB stage: write the snapshot and its diff, end the scan and return its ScanRun report"""
+    redis_client, lease, cancel_token = _scan_stage_context(scan)
+    username = scan["username"]
+    progress = _scan_progress(redis_client=redis_client, scan=scan)
+    metrics = ScanMetrics()
+    status, snapshot = ScanRun.FAILED, None
+    
+    try:
+        lease.stop_keep_alive(redis_client)
+        cancel_token.raise_if_cancelled(redis_client)
+        progress.set_phase("saving_snapshot")
+        result = load_scrape_result(redis_client, scan["result_key"])
+        snapshot = _persist_scan(username=username, result=result, lease=lease, metrics=metrics)
+        status = ScanRun.SUCCEEDED
+    
+    except ScanCancelled:
+        logger.info(f"Scan for {username} cancelled. Nothing was persisted.")
+        status = ScanRun.CANCELLED
+        clear_checkpoints(redis_client, username)
+    
+    except (LeaseLost, StaleFencingTokenError) as e:
+        logger.warning(f"{e} Another worker owns this scan now; discarding this run.")
+    
     finally:
-        logger.info("Releasing lock.")
-        redis_client.delete(lock_key)
-        if driver:
-            logger.info("Closing driver")
-            driver.quit()
+        logger.info("Releasing lease.")
+        _end_scan(redis_client=redis_client, scan=scan, lease=lease, cancel_token=cancel_token)
+        scan_run = record_scan_stage(
+            redis_client=redis_client,
+            scan_id=scan["scan_id"],
+            metrics=metrics,
+            status=status,
+            snapshot=snapshot
+        )
+        progress.set_phase("finished", state=status)
+    
+    return scan_report(scan_run) if scan_run else None
+
+
+def _fail_scan(scan: dict) -> None:
+    """Free what a failed scan holds and record it as failed, unless its stage already recorded how it finished"""
+    if ScanRun.objects.filter(scan_id=scan["scan_id"], finished_at__isnull=False).exists():
+        return
+    redis_client, lease, cancel_token = _scan_stage_context(scan)
+    logger.info(f"Scan for {scan['username']} failed. Releasing lease.")
+    _end_scan(redis_client=redis_client, scan=scan, lease=lease, cancel_token=cancel_token)
+    record_scan_stage(redis_client=redis_client, scan_id=scan["scan_id"], metrics=ScanMetrics(), status=ScanRun.FAILED)
+    _scan_progress(redis_client=redis_client, scan=scan).set_phase("finished", state=ScanRun.FAILED)
+
+
+@shared_task
+def release_scan_lease(scan: dict) -> None:
+    """Error callback of the scan pipeline: free the lease as soon as any stage fails"""
+    _fail_scan(scan)
+
+
+@shared_task
+def renew_scan_leases() -> int:
+    """Periodic: renew the leases of scans in flight, including those waiting for their next stage"""
+    return renew_kept_leases(get_redis())
+
 
+@shared_task
+def collect_snapshot_garbage() -> dict:
+    """Periodic: prune snapshots past their retention tier and users nothing references anymore"""
+    report = collect_garbage(redis_client=get_redis()).as_dict()
+    logger.info(
+        f"Snapshot GC deleted {report['total_rows_deleted']} rows ({report['bytes_reclaimed']} bytes), "
+        f"rebuilt {report['snapshots_rebuilt']} snapshots: {report['rows_deleted']}"
+    )
+    for reason in report["skipped"]:
+        logger.info(f"Snapshot GC skipped {reason}")
+    return report
+
+
+@shared_task
+def schedule_due_scans() -> Dict[str, str]:
+    """Periodic: start the scans that are due, busiest-churn accounts coming due most often, within the hourly budget"""
+    redis_client = get_redis()
+    now = timezone.now()
+    if in_quiet_hours(now):
+        return {}
+    
+    due = (
+        InstagramAccount.objects.filter(is_active=True)
+        .filter(Q(next_scan_at__isnull=True) | Q(next_scan_at__lte=now))
+        .order_by(F("next_scan_at").asc(nulls_first=True), "id")
+    )
+    budget = remaining_scan_budget(redis_client)
+    scheduled: Dict[str, str] = {}
+    for account in due:
+        if len(scheduled) >= budget:
+            logger.info(f"Hourly scan budget used up; {due.count() - len(scheduled)} due accounts wait for the next run.")
+            break
+        if redis_client.exists(f"scan_lock_for_{account.username}"):
+            continue  # Still due next run, once the running scan is done
+        
+        changes_per_hour = churn_per_hour(profile=find_profile_user(account.username))
+        account.next_scan_at = next_scan_time(now=now, interval=scan_interval(changes_per_hour))
+        account.save(update_fields=["next_scan_at"])
+        
+        task = scrape_followers_and_following.delay(account.username, account.password)
+        redis_client.set(f"scan_queued_for_{account.username}", task.id, ex=3600)
+        record_scan_dispatch(redis_client, task.id)
+        churn = "unknown" if changes_per_hour is None else f"{changes_per_hour:.2f}"
+        scheduled[account.username] = f"queued {task.id}; churn {churn}/h, next scan at {account.next_scan_at.isoformat()}"
+        logger.info(f"Scheduled scan of {account.username}: {scheduled[account.username]}")
     
+    return scheduled
+
+
+def _batch_pipeline(*, scans: List[dict]) -> chain:
+    """browser (one session bootstrap task per account) -> io (every account over one connection pool) -> db (a persist per account)"""
+    return chain(
+        bootstrap_batch_session.s(scans, 0),
+        *[bootstrap_batch_session.s(index) for index in range(1, len(scans))],
+        fetch_batch_lists.s(),
+    ).on_error(release_batch_leases.si(scans))
+
 
 @shared_task(bind=True)
-def perform_instagram_login(self, username, password):
-    print(f"Starting Instagram login task for user: {username}")
+def scan_accounts_batch(self, account_ids: Optional[List[int]] = None) -> Dict[str, str]:
+    """Take the leases of many registered accounts and start one staged batch scan over them"""
+    redis_client = get_redis()
+    
+    accounts = InstagramAccount.objects.filter(is_active=True).order_by("id")
+    if account_ids:
+        accounts = accounts.filter(id__in=account_ids)
+    
+    results: Dict[str, str] = {}
+    scans: List[dict] = []
+    try:
+        for account in accounts:
+            # Each account is a scan of its own, with its own ScanRun, progress and cancel token.
+            scan_id = f"{self.request.id}-{account.id}"
+            lease = ScanLease(username=account.username, task_id=scan_id)
+            if not lease.acquire(redis_client):
+                logger.warning(f"A scan is already in progress for {account.username}. Skipping it in this batch.")
+                results[account.username] = "skipped: scan in progress"
+                continue
+            
+            scan = {
+                "scan_id": scan_id,
+                "username": account.username,
+                "account_id": account.id,
+                "lease_token": lease.token,
+                "fencing_token": lease.fencing_token,
+            }
+            scans.append(scan)
+            lease.keep_alive(redis_client)
+            start_scan_run(scan_id=scan_id, username=account.username)
+            _scan_progress(redis_client=redis_client, scan=scan).set_phase("queued")
+            results[account.username] = f"queued {scan_id}"
+        
+        if scans:
+            _batch_pipeline(scans=scans).apply_async()
+    except Exception:
+        for scan in scans:
+            _fail_scan(scan)
+        raise
+    
+    return results
+
 
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
+@shared_task
+def bootstrap_batch_session(scans: List[dict], index: int) -> List[dict]:
+    """Browser stage of a batch scan for its index-th account; one task per account lets other scans use the browser in between"""
+    scan = scans[index]
+    try:
+        password = InstagramAccount.objects.values_list("password", flat=True).get(id=scan["account_id"])
+        ready = _bootstrap_stage(scan=scan, password=password)
+    except Exception as e:
+        logger.error(f"[{scan['username']}] Could not get session data: {e}")
+        _fail_scan(scan)
+        ready = False
     
-    service = Service(executable_path=CHROME_DRIVER_PATH)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    return [*scans[:index], {**scan, "ended": not ready}, *scans[index + 1:]]
 
-    _perform_ig_login(
-        driver=driver,
-        username=username,
-        password=password,
-        request_id=self.request.id
+
+@shared_task
+def fetch_batch_lists(scans: List[dict]) -> Dict[str, str]:
+    """IO stage of a batch scan: page every account's lists concurrently over one connection pool, then queue a persist per account"""
+    redis_client = get_redis()
+    scans = [scan for scan in scans if not scan["ended"]]
+    max_requests = dict(
+        InstagramAccount.objects.filter(id__in=[scan["account_id"] for scan in scans]).values_list("id", "max_concurrent_requests")
     )
-            
     
-    logger.info("Taking a screenshot to prove it worked...")
-    driver.get(f"https://www.instagram.com/{username}/")
-    time.sleep(5)
-    debug_success_screenshot_path = os.path.join(DEBUG_DIR, f'{self.request.id}_success.png')
-    driver.save_screenshot(debug_success_screenshot_path)
+    results: Dict[str, str] = {}
+    scrapes: Dict[str, AccountScrape] = {}
+    outcomes: Dict[str, Union[ScrapeResult, BaseException]] = {}
+    for scan in scans:
+        _, lease, cancel_token = _scan_stage_context(scan)
+        # The browser stage's lookup already counted towards the cache hit rate.
+        session_data = get_cached_session(redis_client, scan["username"], count_lookup=False)
+        if session_data is None:
+            outcomes[scan["scan_id"]] = SessionExpiredError("Session data expired from the cache before the fetch stage ran.")
+            continue
+        scrapes[scan["scan_id"]] = AccountScrape(
+            username=scan["username"],
+            session_data=session_data,
+            max_concurrent_requests=max_requests.get(scan["account_id"], 1),
+            known_ids=_incremental_known_ids(username=scan["username"]),
+            cancel_token=cancel_token,
+            lease=lease,
+            metrics=ScanMetrics(),
+            progress=_scan_progress(redis_client=redis_client, scan=scan)
+        )
+    
+    for scrape in scrapes.values():
+        scrape.lease.stop_keep_alive(redis_client)
+    logger.info(f"Scraping {len(scrapes)} accounts concurrently...")
+    outcomes.update(zip(
+        scrapes,
+        asyncio.run(_scrape_accounts_concurrently(accounts=list(scrapes.values()), connection_limit=settings.SCAN_GLOBAL_CONNECTION_LIMIT))
+    ))
+    
+    expired: List[dict] = []
+    for scan in scans:
+        username, outcome = scan["username"], outcomes[scan["scan_id"]]
+        metrics = scrapes[scan["scan_id"]].metrics if scan["scan_id"] in scrapes else ScanMetrics()
+        _, lease, cancel_token = _scan_stage_context(scan)
+        status, handoff = None, None
+        try:
+            if isinstance(outcome, SessionExpiredError) and not scan.get("session_refreshed"):
+                invalidate_session(redis_client, username)
+                lease.keep_alive(redis_client)
+                expired.append({**scan, "session_refreshed": True})
+                results[username] = "session rejected; back through the browser stage"
+            elif isinstance(outcome, LeaseLost):
+                logger.warning(f"{outcome} Another worker owns this scan now; discarding this run.")
+                status = ScanRun.FAILED
+                results[username] = f"discarded: {outcome}"
+            elif isinstance(outcome, BaseException):
+                status = ScanRun.CANCELLED if isinstance(outcome, ScanCancelled) else ScanRun.FAILED
+                if status == ScanRun.CANCELLED:
+                    clear_checkpoints(redis_client, username)
+                _end_scan(redis_client=redis_client, scan=scan, lease=lease, cancel_token=cancel_token)
+                results[username] = "cancelled" if status == ScanRun.CANCELLED else f"failed: {outcome}"
+            else:
+                handoff = {**scan, "result_key": store_scrape_result(redis_client, scan["scan_id"], outcome)}
+            record_scan_stage(redis_client=redis_client, scan_id=scan["scan_id"], metrics=metrics, status=status)
+            if status:
+                _scan_progress(redis_client=redis_client, scan=scan).set_phase("finished", state=status)
+            if handoff:
+                lease.keep_alive(redis_client)
+                persist_scan_snapshot.delay(handoff)
+                results[username] = (
+                    f"persisting: {len(outcome.follower_ids)} followers, {len(outcome.following_ids)} following scanned"
+                )
+        except Exception as e:
+            logger.error(f"[{username}] Could not hand the scan to the db stage: {e}")
+            _fail_scan(scan)
+            results[username] = f"failed: {e}"
+    
+    if expired:
+        # A fresh pipeline for just these accounts; checkpoints keep the pages already stored.
+        logger.warning(f"Sessions of {len(expired)} accounts were rejected. Re-queuing them through the browser stage...")
+        _batch_pipeline(scans=expired).apply_async()
+    return results
+
+
+@shared_task
+def release_batch_leases(scans: List[dict]) -> None:
+    """Error callback of a batch scan: fail every account the batch hasn't ended or persisted yet"""
+    for scan in scans:
+        _fail_scan(scan)
+
+
+@shared_task(bind=True)
+def perform_instagram_login(self, username, password):
+    print(f"Starting Instagram login task for user: {username}")
+
+    with get_driver_pool().checkout(
+        username=username,
+        login=_login_callback(username=username, password=password, request_id=self.request.id)
+    ) as driver:
+        
+        logger.info("Taking a screenshot to prove it worked...")
+        driver.get(f"https://www.instagram.com/{username}/")
+        time.sleep(5)
+        debug_success_screenshot_path = os.path.join(DEBUG_DIR, f'{self.request.id}_success.png')
+        driver.save_screenshot(debug_success_screenshot_path)
 
-    driver.quit()
-    return f"Login process for {username} completed. Screenshot saved."
\ No newline at end of file
+    return f"Login process for {username} completed. Screenshot saved."
@@ -1,3 +1,498 @@
-from django.test import TestCase
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Optional, Set
 
-# Create your tests here.
+import aiohttp
+import numpy as np
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from instagram_automation import views
+from instagram_automation.admin import InstagramAccountForm
+from instagram_automation.cancellation import CancelToken, ScanCancelled, is_cancel_requested, request_cancel
+from instagram_automation.checkpoints import clear_checkpoints
+from instagram_automation.metrics import ScanMetrics
+from instagram_automation.mock_instagram import MOCK_RATE_SETTINGS, MockInstagramConfig, MockInstagramServer, mock_session_data
+from instagram_automation.ingestion import UserRecord, get_or_create_profile_user, ingest_snapshot, upsert_user_records
+from instagram_automation.leases import KEPT_LEASES_KEY, LeaseLost, ScanLease, renew_kept_leases
+from instagram_automation.models import (
+    FollowerSnapshot,
+    FollowMembership,
+    InstagramAccount,
+    InstagramUser,
+    SnapshotDiff,
+    SnapshotDiffMember,
+    SnapshotRollup,
+    UsernameChange,
+)
+from instagram_automation.packed_ids import difference, intersection, pack_ids, unpack_ids
+from instagram_automation.progress import ScanProgress, last_progress, last_progress_key
+from instagram_automation.retention import collect_garbage, snapshots_to_prune
+from instagram_automation.scheduling import in_quiet_hours, next_scan_time, scan_interval
+from instagram_automation.tasks import _api_headers, _incremental_known_ids, _perform_concurrent_scraping, _persist_scan
+from instagram_automation.user_lists import NOT_FOLLOWING_BACK, encode_cursor, matching_users, stored_user_list, user_list_page
+
+
+class MockInstagramServerTests(SimpleTestCase):
+
+    async def _fetch_all(self, server: MockInstagramServer, list_name: str) -> list:
+        config = server.config
+        headers = _api_headers(session_data=mock_session_data(config), referer=server.base_url)
+        url = f"{server.base_url}/api/v1/friendships/{config.user_id}/{list_name}/"
+        users, params = [], {"count": 100}
+        async with aiohttp.ClientSession() as session:
+            while True:
+                async with session.get(url, headers=headers, params=params) as response:
+                    if response.status != 200:
+                        continue
+                    data = await response.json()
+                users.extend(data["users"])
+                if "next_max_id" not in data:
+                    return users
+                params["max_id"] = data["next_max_id"]
+
+    async def test_pagination_serves_every_user_once(self):
+        server = MockInstagramServer(MockInstagramConfig(follower_count=1_050, following_count=300, max_page_size=100))
+        await server.start()
+        try:
+            followers = await self._fetch_all(server, "followers")
+            following = await self._fetch_all(server, "following")
+        finally:
+            await server.stop()
+
+        self.assertEqual(len({user["pk"] for user in followers}), 1_050)
+        self.assertEqual(len(followers), 1_050)
+        self.assertEqual(len(following), 300)
+        self.assertEqual(server.stats["pages"], 11 + 3)
+
+    async def test_injects_throttling_and_server_errors(self):
+        server = MockInstagramServer(MockInstagramConfig(follower_count=2_000, throttle_rate=0.2, server_error_rate=0.1, max_page_size=50))
+        await server.start()
+        try:
+            followers = await self._fetch_all(server, "followers")
+        finally:
+            await server.stop()
+
+        self.assertEqual(len(followers), 2_000)
+        self.assertGreater(server.stats["throttled"], 0)
+        self.assertGreater(server.stats["server_errors"], 0)
+
+    async def test_rejects_requests_without_session_headers(self):
+        server = MockInstagramServer(MockInstagramConfig())
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{server.base_url}/api/v1/friendships/1000/followers/") as response:
+                    status = response.status
+        finally:
+            await server.stop()
+
+        self.assertEqual(status, 401)
+
+
+class PackedIdsTests(SimpleTestCase):
+
+    def test_round_trip_sorts_and_deduplicates(self):
+        ids = [9_000_000_000, 5, 17, 5, 2**40, 1]
+        self.assertEqual(unpack_ids(pack_ids(ids)).tolist(), [1, 5, 17, 9_000_000_000, 2**40])
+        self.assertEqual(unpack_ids(pack_ids(set())).tolist(), [])
+
+    def test_set_algebra_matches_python_sets(self):
+        rng = np.random.default_rng(0)
+        left = set(rng.integers(1, 50_000, 20_000).tolist())
+        right = set(rng.integers(1, 50_000, 20_000).tolist())
+        left_ids, right_ids = unpack_ids(pack_ids(left)), unpack_ids(pack_ids(right))
+
+        self.assertEqual(difference(left_ids, right_ids).tolist(), sorted(left - right))
+        self.assertEqual(intersection(left_ids, right_ids).tolist(), sorted(left & right))
+        self.assertEqual(difference(left_ids, unpack_ids(pack_ids([]))).tolist(), sorted(left))
+
+
+class UserListQueryTests(SimpleTestCase):
+
+    def test_stored_list_pages_read_member_rows_in_index_order(self):
+        users = stored_user_list(kind=NOT_FOLLOWING_BACK, diff=SnapshotDiff(id=1))
+        sql, _ = user_list_page(users=users, after=encode_cursor("user_5", 5)).query.sql_with_params()
+
+        self.assertNotIn("instagramuser", sql)
+        self.assertIn('ORDER BY "instagram_automation_snapshotdiffmember"."username" ASC, "instagram_automation_snapshotdiffmember"."user_id" ASC', sql)
+
+    def test_search_is_an_ilike_the_trigram_index_can_serve(self):
+        sql, params = matching_users(InstagramUser.objects.all(), "a_b%").query.sql_with_params()
+
+        self.assertIn('"username" ILIKE', sql)
+        self.assertNotIn("UPPER", sql)
+        self.assertEqual(params, ("%a\\_b\\%%",))
+
+
+@override_settings(
+    TIME_ZONE="UTC", SCAN_TARGET_CHANGES=20.0, SCAN_INTERVAL_MIN_HOURS=1.0, SCAN_INTERVAL_MAX_HOURS=72.0,
+    SCAN_SCHEDULE_JITTER=0.1, SCAN_QUIET_HOURS_START=23, SCAN_QUIET_HOURS_END=6
+)
+class ScanSchedulingTests(SimpleTestCase):
+
+    def test_interval_shrinks_with_churn_within_bounds(self):
+        self.assertEqual(scan_interval(None), timedelta(hours=1))
+        self.assertEqual(scan_interval(0.0), timedelta(hours=72))
+        self.assertEqual(scan_interval(2.0), timedelta(hours=10))
+        self.assertEqual(scan_interval(500.0), timedelta(hours=1))
+        self.assertEqual(scan_interval(0.01), timedelta(hours=72))
+
+    def test_next_scan_is_jittered_and_skips_quiet_hours(self):
+        noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        for _ in range(50):
+            when = next_scan_time(now=noon, interval=timedelta(hours=4))
+            self.assertLessEqual(abs(when - noon - timedelta(hours=4)), timedelta(minutes=24))
+
+        self.assertTrue(in_quiet_hours(noon.replace(hour=2)))
+        late = next_scan_time(now=noon, interval=timedelta(hours=14))
+        self.assertEqual(late, (noon + timedelta(days=1)).replace(hour=6))
+
+
+class UserUpsertTests(TransactionTestCase):
+    """Needs the Postgres service"""
+
+    def test_rename_keeps_the_row_and_records_the_change(self):
+        first_ids, inserted, _ = upsert_user_records([UserRecord(pk=9_000_000_001, username="old_name", full_name="Someone")])
+        second_ids, inserted_again, _ = upsert_user_records([UserRecord(pk=9_000_000_001, username="new_name", full_name="Someone")])
+
+        self.assertEqual((inserted, inserted_again), (1, 0))
+        self.assertEqual(first_ids, second_ids)
+        user = InstagramUser.objects.get(instagram_pk=9_000_000_001)
+        self.assertEqual(user.username, "new_name")
+        self.assertEqual(
+            list(UsernameChange.objects.filter(user=user).values_list("old_username", "new_username")),
+            [("old_name", "new_name")]
+        )
+
+    def test_placeholder_rows_are_adopted_by_username(self):
+        placeholder = InstagramUser.objects.create(username="legacy_user")
+        user_ids, inserted, _ = upsert_user_records([UserRecord(pk=42, username="legacy_user", full_name="")])
+
+        self.assertEqual(inserted, 0)
+        self.assertEqual(user_ids, {42: placeholder.id})
+
+    def test_scans_that_found_no_placeholders_skip_adoption(self):
+        placeholder = InstagramUser.objects.create(username="late_placeholder")
+        user_ids, inserted, _ = upsert_user_records(
+            [UserRecord(pk=43, username="late_placeholder", full_name="")], has_placeholders=False
+        )
+
+        self.assertEqual(inserted, 1)
+        self.assertNotEqual(user_ids[43], placeholder.id)
+
+    def test_concurrent_first_visits_create_one_profile_row(self):
+        def get_or_create(username: str) -> InstagramUser:
+            try:
+                return get_or_create_profile_user(username)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            profiles = list(pool.map(get_or_create, ["racing_user"] * 8))
+
+        self.assertEqual({profile.id for profile in profiles}, {InstagramUser.objects.get(username="racing_user").id})
+
+
+class AccountAdminTests(TransactionTestCase):
+
+    def test_password_is_never_rendered_and_kept_when_left_blank(self):
+        account = InstagramAccount.objects.create(username="tracked", password="hunter2")
+        data = {"username": "tracked", "password": "", "is_active": "on", "max_concurrent_requests": 2}
+
+        form = InstagramAccountForm(data, instance=account)
+        self.assertNotIn("hunter2", InstagramAccountForm(instance=account).as_p())
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().password, "hunter2")
+        self.assertFalse(InstagramAccountForm({**data, "username": "new"}).is_valid())
+
+
+class RetentionTests(TransactionTestCase):
+    """Needs the Postgres and Redis services"""
+
+    def test_pruning_a_snapshot_stitches_intervals_and_drops_orphans(self):
+        profile = InstagramUser.objects.create(username="gc_profile", instagram_pk=7_000)
+        ids, _, _ = upsert_user_records([UserRecord(pk=pk, username=f"gc_{pk}", full_name="") for pk in (7_001, 7_002, 7_003, 7_004)])
+        a, b, c, d = (ids[pk] for pk in (7_001, 7_002, 7_003, 7_004))
+
+        snapshots = []
+        for followers in ({a, b}, {a, b, c}, {a}, {a, d}):
+            snapshot, _ = ingest_snapshot(profile_user=profile, follower_ids=followers, following_ids=set())
+            snapshots.append(snapshot)
+        # Two snapshots on the same day in the weekly tier, one older, one current
+        same_day = timezone.localtime(timezone.now() - timedelta(days=100)).replace(hour=10)
+        for snapshot, timestamp in zip(snapshots, (same_day - timedelta(days=200), same_day, same_day + timedelta(hours=1), timezone.now())):
+            FollowerSnapshot.objects.filter(pk=snapshot.pk).update(timestamp=timestamp)
+        first, pruned, stitched, _ = snapshots
+
+        self.assertEqual(snapshots_to_prune(profile_id=profile.id), [pruned.id])
+        cached = views.snapshot_diff(RequestFactory().get("/"), pruned.id, stitched.id)
+        report = collect_garbage(redis_client=redis.from_url(settings.CELERY_BROKER_URL)).as_dict()
+
+        self.assertFalse(FollowerSnapshot.objects.filter(pk=pruned.pk).exists())
+        self.assertEqual(report["snapshots_rebuilt"], 1)
+        self.assertGreater(report["bytes_reclaimed"], 0)
+        intervals = dict(FollowMembership.objects.filter(profile=profile).values_list("user_id", "last_seen_snapshot_id"))
+        self.assertEqual(intervals, {a: None, b: first.id, d: None})
+        self.assertFalse(InstagramUser.objects.filter(pk=c).exists())
+        # The pair cached before the GC isn't served once one of its snapshots is gone.
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(views.snapshot_diff(RequestFactory().get("/"), pruned.id, stitched.id).status_code, 404)
+
+        diff = SnapshotDiff.objects.get(snapshot=stitched)
+        self.assertEqual((diff.previous_snapshot_id, diff.lost_followers_count), (first.id, 1))
+        self.assertEqual((stitched.rollup.gained, stitched.rollup.lost), (0, 1))
+
+
+@override_settings(**MOCK_RATE_SETTINGS)
+class MockScanPipelineTests(TransactionTestCase):
+    """End to end against the mock API; needs the Postgres and Redis services"""
+
+    def setUp(self):
+        self.redis_client = redis.from_url(settings.CELERY_BROKER_URL)
+
+    def _scan(self,
+        config: MockInstagramConfig,
+        metrics: Optional[ScanMetrics] = None,
+        progress: Optional[ScanProgress] = None,
+        lease: Optional[ScanLease] = None,
+        known_ids: Optional[Dict[str, Set[int]]] = None,
+        cancel_token: Optional[CancelToken] = None
+    ) -> MockInstagramServer:
+        server = MockInstagramServer(config)
+        self.addCleanup(self.redis_client.delete, f"ig_rate_for_{config.user_id}")
+        self.addCleanup(clear_checkpoints, self.redis_client, config.username)
+
+        with server.running_in_thread(), override_settings(INSTAGRAM_BASE_URL=server.base_url):
+            result = asyncio.run(_perform_concurrent_scraping(
+                session_data=mock_session_data(config),
+                username=config.username,
+                known_ids=known_ids,
+                cancel_token=cancel_token,
+                lease=lease,
+                metrics=metrics,
+                progress=progress
+            ))
+        _persist_scan(username=config.username, result=result, lease=lease, metrics=metrics)
+        return server
+
+    def test_scan_persists_snapshot_and_dashboard_lists_non_followers(self):
+        config = MockInstagramConfig(user_id="2001", username="mock_small", follower_count=1_500, following_count=400, mutual_ratio=0.75)
+        self._scan(config)
+
+        snapshot = FollowerSnapshot.objects.get(profile__username=config.username)
+        self.assertEqual(snapshot.member_ids(FollowMembership.FOLLOWER).count(), 1_500)
+        self.assertEqual(snapshot.member_ids(FollowMembership.FOLLOWING).count(), 400)
+        self.assertEqual(snapshot.reported_follower_count, 1_500)
+        self.assertEqual(snapshot.diff.not_following_back_count, 100)
+        self.assertEqual(snapshot.diff.not_following_back, [])
+        self.assertEqual(
+            snapshot.member_id_array(FollowMembership.FOLLOWING).tolist(),
+            sorted(snapshot.member_ids(FollowMembership.FOLLOWING))
+        )
+
+        user_list = async_to_sync(views.user_list)
+        usernames, cursor = [], None
+        with override_settings(INSTA_USER=config.username):
+            response = async_to_sync(views.dashboard)(RequestFactory().get("/"))
+            while True:
+                params = {"limit": 30, "after": cursor} if cursor else {"limit": 30}
+                page = json.loads(user_list(RequestFactory().get("/", params), "not_following_back").content)
+                usernames += page["users"]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            found = json.loads(user_list(RequestFactory().get("/", {"q": "0399"}), "not_following_back").content)
+            # A diff without stored members (built before they existed) is computed on request instead.
+            SnapshotDiff.objects.update(members_stored=False)
+            computed = json.loads(user_list(RequestFactory().get("/", {"limit": 30}), "not_following_back").content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(snapshot.diff.members.filter(list_name=SnapshotDiffMember.NOT_FOLLOWING_BACK).count(), 100)
+        self.assertTrue(snapshot.diff.members.filter(username=f"user_{50_000_000 + 399}").exists())
+        self.assertEqual((computed["users"], computed["total"]), (usernames[:30], 100))
+        self.assertEqual(len(usernames), 100)
+        self.assertEqual(usernames, sorted(usernames))
+        self.assertIn(f"user_{50_000_000 + 399}", usernames)
+        self.assertEqual((found["users"], found["total"]), ([f"user_{50_000_000 + 399}"], 1))
+
+    def test_rollups_feed_the_history_endpoint(self):
+        config = MockInstagramConfig(user_id="2005", username="mock_history", follower_count=300, following_count=100, mutual_ratio=0.5)
+        self._scan(config)
+        self._scan(config._replace(follower_count=250))
+
+        rollups = list(SnapshotRollup.objects.filter(profile__username=config.username).order_by("timestamp"))
+        self.assertEqual([(rollup.follower_count, rollup.gained, rollup.lost) for rollup in rollups], [(300, 0, 0), (250, 0, 50)])
+        self.assertEqual(rollups[-1].reciprocal_count, 50)
+
+        with override_settings(INSTA_USER=config.username):
+            response = views.history(RequestFactory().get("/", {"bucket": "month"}))
+        [point] = json.loads(response.content)["series"]
+        self.assertEqual((point["follower_count"], point["lost"], point["churn_rate"]), (250, 50, round(50 / 300, 4)))
+
+    def test_fencing_tokens_survive_a_redis_reset(self):
+        config = MockInstagramConfig(user_id="2006", username="mock_fencing", follower_count=200, following_count=50)
+        for _ in range(2):
+            lease = ScanLease(username=config.username, task_id="fencing-test")
+            self.assertTrue(lease.acquire(self.redis_client))
+            self._scan(config, lease=lease)
+            lease.release(self.redis_client)
+            # A Redis restart without persistence forgets every key of the account.
+            for key in self.redis_client.scan_iter(match=f"*{config.username}*"):
+                self.redis_client.delete(key)
+
+        tokens = list(FollowerSnapshot.objects.filter(profile__username=config.username).order_by("id").values_list("fencing_token", flat=True))
+        self.assertEqual(len(tokens), 2)
+        self.assertLess(tokens[0], tokens[1])
+
+    @override_settings(SCAN_INCREMENTAL_STOP_PAGES=2)
+    def test_incremental_scan_stops_at_the_overlap(self):
+        config = MockInstagramConfig(user_id="2007", username="mock_incremental", follower_count=1_000, following_count=100, max_page_size=50)
+        self._scan(config)
+        server = self._scan(config, known_ids=_incremental_known_ids(username=config.username))
+
+        latest = FollowerSnapshot.objects.filter(profile__username=config.username).order_by("-id").first()
+        self.assertEqual(latest.scan_mode, FollowerSnapshot.INCREMENTAL)
+        # Per list: the two matching pages plus those already prefetched, instead of all 22 pages.
+        self.assertLessEqual(server.stats["pages"], 2 * (2 + settings.SCRAPE_PAGES_IN_FLIGHT + 1))
+        self.assertEqual(latest.member_ids(FollowMembership.FOLLOWER).count(), 1_000)
+        self.assertEqual(latest.member_ids(FollowMembership.FOLLOWING).count(), 100)
+        self.assertEqual(latest.diff.lost_followers_count, 0)
+
+    @override_settings(SCAN_INCREMENTAL_STOP_PAGES=2)
+    def test_incremental_scan_falls_back_to_a_full_pass_when_counts_disagree(self):
+        config = MockInstagramConfig(user_id="2008", username="mock_reconcile", follower_count=300, following_count=50, max_page_size=50)
+        self._scan(config)
+        # The 50 who left were at the end of the list, where an early stop would never look.
+        server = self._scan(config._replace(follower_count=250), known_ids=_incremental_known_ids(username=config.username))
+
+        latest = FollowerSnapshot.objects.filter(profile__username=config.username).order_by("-id").first()
+        self.assertEqual(latest.scan_mode, FollowerSnapshot.FULL)
+        self.assertEqual(server.stats["pages"], 5 + 1)
+        self.assertEqual(latest.member_ids(FollowMembership.FOLLOWER).count(), 250)
+        self.assertEqual(latest.diff.lost_followers_count, 50)
+
+    @override_settings(SCAN_PROGRESS_MIN_INTERVAL=0)
+    def test_retried_scan_resumes_from_the_checkpoint(self):
+        config = MockInstagramConfig(user_id="2009", username="mock_resume", follower_count=1_000, following_count=50, max_page_size=50)
+        cancel_token = CancelToken(username=config.username, task_id="resume-test")
+        self.addCleanup(cancel_token.clear, self.redis_client)
+        self.addCleanup(self.redis_client.delete, last_progress_key(config.username))
+
+        def interrupt_halfway(event: dict) -> None:
+            if event["lists"].get("Followers", {}).get("pages", 0) >= 10:
+                request_cancel(self.redis_client, config.username, cancel_token.task_id)
+
+        progress = ScanProgress(redis_client=self.redis_client, username=config.username, scan_id="resume-test", on_event=interrupt_halfway)
+        with self.assertRaises(ScanCancelled):
+            self._scan(config, progress=progress, cancel_token=cancel_token)
+        self.assertFalse(FollowerSnapshot.objects.filter(profile__username=config.username).exists())
+
+        cancel_token.clear(self.redis_client)
+        server = self._scan(config)
+
+        snapshot = FollowerSnapshot.objects.get(profile__username=config.username)
+        self.assertEqual(snapshot.member_ids(FollowMembership.FOLLOWER).count(), 1_000)
+        self.assertEqual(snapshot.member_ids(FollowMembership.FOLLOWING).count(), 50)
+        # Checkpoints were saved at least 10 pages in, so at most the last 10 follower pages and the following page are fetched again.
+        self.assertLessEqual(server.stats["pages"], 10 + 1)
+
+    def test_only_a_cancel_aimed_at_the_scan_stops_it(self):
+        config = MockInstagramConfig(user_id="2010", username="mock_cancel", follower_count=200, following_count=50, max_page_size=50)
+        cancel_token = CancelToken(username=config.username, task_id="cancel-test")
+        self.addCleanup(cancel_token.clear, self.redis_client)
+
+        # A cancel left behind for an earlier task of the account is ignored.
+        request_cancel(self.redis_client, config.username, "earlier-task")
+        self._scan(config, cancel_token=cancel_token)
+
+        request_cancel(self.redis_client, config.username, cancel_token.task_id)
+        with self.assertRaises(ScanCancelled):
+            self._scan(config, cancel_token=cancel_token)
+        self.assertEqual(FollowerSnapshot.objects.filter(profile__username=config.username).count(), 1)
+
+        cancel_token.clear(self.redis_client)
+        self.assertFalse(is_cancel_requested(self.redis_client, config.username))
+
+    @override_settings(SCAN_LEASE_RENEW_INTERVAL=0)
+    def test_a_lost_lease_stops_the_scan_before_it_writes(self):
+        config = MockInstagramConfig(user_id="2011", username="mock_lease", follower_count=200, following_count=50, max_page_size=50)
+        lease = ScanLease(username=config.username, task_id="lease-test")
+        self.assertTrue(lease.acquire(self.redis_client))
+        self.addCleanup(self.redis_client.delete, lease.key)
+
+        # The lease lapsed and another worker took it over.
+        self.redis_client.set(lease.key, "other-task:nonce")
+        with self.assertRaises(LeaseLost):
+            self._scan(config, lease=lease)
+        self.assertFalse(FollowerSnapshot.objects.filter(profile__username=config.username).exists())
+
+    def test_queued_leases_are_renewed_until_a_stage_starts_or_they_are_lost(self):
+        lease = ScanLease(username="mock_kept_lease", task_id="kept-test")
+        self.assertTrue(lease.acquire(self.redis_client))
+        self.addCleanup(self.redis_client.delete, lease.key)
+        self.addCleanup(self.redis_client.hdel, KEPT_LEASES_KEY, lease.key)
+        lease.keep_alive(self.redis_client)
+
+        self.redis_client.pexpire(lease.key, 1_000)
+        self.assertGreaterEqual(renew_kept_leases(self.redis_client), 1)
+        self.assertGreater(self.redis_client.pttl(lease.key), 1_000)
+
+        # A running stage renews the lease itself, so a dead worker's lease lapses after SCAN_LEASE_TTL.
+        lease.stop_keep_alive(self.redis_client)
+        self.assertFalse(self.redis_client.hexists(KEPT_LEASES_KEY, lease.key))
+
+        lease.keep_alive(self.redis_client)
+        with override_settings(SCAN_LEASE_MAX_QUEUE_WAIT=-1):
+            renew_kept_leases(self.redis_client)
+        self.assertFalse(self.redis_client.hexists(KEPT_LEASES_KEY, lease.key))
+
+        lease.keep_alive(self.redis_client)
+        self.redis_client.set(lease.key, "other-task:nonce")
+        renew_kept_leases(self.redis_client)
+        self.assertFalse(self.redis_client.hexists(KEPT_LEASES_KEY, lease.key))
+
+    def test_throttled_scan_still_collects_every_user(self):
+        config = MockInstagramConfig(
+            user_id="2002", username="mock_throttled", follower_count=800, following_count=200,
+            throttle_rate=0.1, server_error_rate=0.05, max_page_size=50
+        )
+        self._scan(config)
+
+        snapshot = FollowerSnapshot.objects.get(profile__username=config.username)
+        self.assertEqual(snapshot.member_ids(FollowMembership.FOLLOWER).count(), 800)
+        self.assertEqual(snapshot.member_ids(FollowMembership.FOLLOWING).count(), 200)
+
+    def test_scan_metrics_match_what_the_server_answered(self):
+        config = MockInstagramConfig(
+            user_id="2003", username="mock_metrics", follower_count=600, following_count=150,
+            throttle_rate=0.1, server_error_rate=0.05, max_page_size=50
+        )
+        metrics = ScanMetrics()
+        server = self._scan(config, metrics)
+
+        self.assertEqual(metrics.counters["pages"], server.stats["pages"])
+        self.assertEqual(metrics.counters["throttled"], server.stats["throttled"])
+        self.assertEqual(metrics.counters["server_errors"], server.stats["server_errors"])
+        self.assertEqual(sum(metrics.latency_histogram.values()), metrics.counters["requests"])
+        self.assertIn("db_ingest", metrics.phases)
+        self.assertIn("diff", metrics.phases)
+
+    @override_settings(SCAN_PROGRESS_MIN_INTERVAL=0)
+    def test_scan_publishes_progress_for_both_lists(self):
+        config = MockInstagramConfig(user_id="2004", username="mock_progress", follower_count=500, following_count=120, max_page_size=50)
+        self.addCleanup(self.redis_client.delete, last_progress_key(config.username))
+        progress = ScanProgress(redis_client=self.redis_client, username=config.username, scan_id="progress-test")
+        self._scan(config, progress=progress)
+
+        event = last_progress(self.redis_client, config.username)
+        self.assertEqual(event["phase"], "fetching_lists")
+        self.assertEqual(event["lists"]["Followers"], {"users": 500, "pages": 10, "total": 500})
+        self.assertEqual(event["lists"]["Following"]["users"], 120)
+        self.assertEqual(event["eta_seconds"], 0.0)
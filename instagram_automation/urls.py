@@ -5,5 +5,12 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('trigger-scan/', views.trigger_scan, name='trigger_scan'),
     path('cancel-scan/', views.cancel_scan, name='cancel_scan'),
+    path('scan-status/', views.scan_status, name='scan_status'),
+    path('scan-progress/', views.scan_progress, name='scan_progress'),
     path('start-login/', views.trigger_login, name='start_login'),
+    path('snapshots/<int:from_id>/diff/<int:to_id>/', views.snapshot_diff, name='snapshot_diff'),
+    path('history/', views.history, name='follower_history'),
+    path('lists/<str:kind>/', views.user_list, name='user_list'),
+    path('scans/<str:scan_id>/', views.scan_run_report, name='scan_run_report'),
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
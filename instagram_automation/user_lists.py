@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+from typing import List, Optional, Tuple
+
+from django.db.models import F, Lookup, Q, QuerySet
+
+from instagram_automation.diffs import not_following_back_users, unfollower_users
+from instagram_automation.models import FollowerSnapshot, InstagramUser, SnapshotDiff, SnapshotDiffMember
+
+UNFOLLOWERS = "unfollowers"
+NOT_FOLLOWING_BACK = "not_following_back"
+USER_LISTS = (UNFOLLOWERS, NOT_FOLLOWING_BACK)
+# Dashboard list -> the SnapshotDiffMember list (and SnapshotDiff count field prefix) it's stored as
+DIFF_LISTS = {UNFOLLOWERS: SnapshotDiffMember.LOST_FOLLOWERS, NOT_FOLLOWING_BACK: SnapshotDiffMember.NOT_FOLLOWING_BACK}
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class ILikeContains(Lookup):
+    """`lhs ILIKE '%rhs%'`. Django's icontains compiles to UPPER(lhs) LIKE UPPER(...), which a
+    gin_trgm_ops index on the plain column can't serve; ILIKE can."""
+    lookup_name = "ilike_contains"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        rhs_params = [f"%{connection.ops.prep_for_like_query(param)}%" for param in rhs_params]
+        return f"{lhs} ILIKE {rhs}", [*lhs_params, *rhs_params]
+
+
+class InvalidCursor(ValueError):
+    """The `after` cursor wasn't produced by user_list_page"""
+
+
+def encode_cursor(username: str, user_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([username, user_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        username, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if not isinstance(username, str) or not isinstance(user_id, int):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return username, user_id
+
+
+def stored_user_list(*, kind: str, diff: SnapshotDiff) -> QuerySet:
+    """The dashboard list `kind` as stored with the diff: its member rows, which carry username and user_id themselves"""
+    return SnapshotDiffMember.objects.filter(diff=diff, list_name=DIFF_LISTS[kind])
+
+
+def stored_list_count(*, kind: str, diff: SnapshotDiff) -> int:
+    return getattr(diff, f"{DIFF_LISTS[kind]}_count")
+
+
+def computed_user_list(*, kind: str, profile: InstagramUser) -> Optional[QuerySet]:
+    """Users in the dashboard list `kind`, computed from the profile's newest snapshots; None if it can't be built yet
+
+    Only for a newest snapshot whose diff isn't stored yet. It loads the packed
+    member arrays and diffs them in memory, so keep it off the event loop. Users
+    get a user_id annotation so they page like stored member rows.
+    """
+    snapshots: List[FollowerSnapshot] = list(FollowerSnapshot.objects.filter(profile=profile).order_by("-timestamp")[:2])
+    if kind == UNFOLLOWERS and len(snapshots) >= 2:
+        users = unfollower_users(previous_snapshot=snapshots[1], latest_snapshot=snapshots[0])
+    elif kind == NOT_FOLLOWING_BACK and snapshots:
+        users = not_following_back_users(snapshot=snapshots[0])
+    else:
+        return None
+    return users.annotate(user_id=F("id"))
+
+
+def matching_users(users: QuerySet, search: str) -> QuerySet:
+    """Rows whose username contains search, as an ILIKE a trigram index such as instagramuser_username_trgm can serve"""
+    return users.filter(ILikeContains(F("username"), search)) if search else users
+
+
+def user_list_page(*, users: QuerySet, after: Optional[str] = None, limit: int = PAGE_SIZE) -> QuerySet:
+    """(username, user_id) rows of one page ordered by both, starting after the cursor.
+
+    Keyset pagination: on stored member rows the page is a seek and a short scan
+    of diff_member_page_idx, so a deep page costs no more than the first one.
+    """
+    if after:
+        username, user_id = decode_cursor(after)
+        # The plain lower bound gives the index scan its start key; the OR alone doesn't.
+        users = users.filter(username__gte=username).filter(Q(username__gt=username) | Q(username=username, user_id__gt=user_id))
+    return users.order_by("username", "user_id").values_list("username", "user_id")[:limit]
@@ -1,13 +1,36 @@
 import os
+from datetime import timedelta
 from django.conf import settings
-from django.http import HttpRequest, HttpResponse, HttpResponsePermanentRedirect, HttpResponseRedirect, JsonResponse
+from django.http import HttpRequest, HttpResponse, HttpResponsePermanentRedirect, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
-import redis
+from django.utils import timezone
+from asgiref.sync import sync_to_async
 
-from instagram_automation.models import FollowerSnapshot, InstagramUser
+from instagram_automation.cancellation import ais_cancel_requested, arequest_cancel
+from instagram_automation.diffs import compare_snapshots, snapshot_pair_cache
+from instagram_automation.ingestion import afind_profile_user, aget_or_create_profile_user, find_profile_user
+from instagram_automation.leases import lease_task_id
+from instagram_automation.metrics import render_prometheus, scan_report
+from instagram_automation.models import FollowerSnapshot, ScanRun, SnapshotDiff
+from instagram_automation.progress import alast_progress, progress_event_stream
+from instagram_automation.redis_clients import get_async_redis, get_redis
+from instagram_automation.rollups import BUCKETS, follower_history
+from instagram_automation.scheduling import record_scan_dispatch
+from instagram_automation.user_lists import (
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    USER_LISTS,
+    InvalidCursor,
+    computed_user_list,
+    encode_cursor,
+    matching_users,
+    stored_list_count,
+    stored_user_list,
+    user_list_page,
+)
 from .tasks import perform_instagram_login, scrape_followers_and_following
 
-def dashboard(request: HttpRequest) -> HttpResponse:
+async def dashboard(request: HttpRequest) -> HttpResponse:
     main_username = settings.INSTA_USER
     
     if not main_username:
@@ -17,42 +40,27 @@ def dashboard(request: HttpRequest) -> HttpResponse:
             {"error": "INSTA_USER not set." }
         )
         
-    profile, _ = InstagramUser.objects.get_or_create(
-        username=main_username,
-        defaults={"instagram_pk": f"pk_{main_username}"}
-    )
+    profile = await aget_or_create_profile_user(main_username)
     
-    redis_client = redis.from_url(settings.CELERY_BROKER_URL)
-    is_scanning = redis_client.exists(f"scan_lock_for_{main_username}")
+    redis_client = get_async_redis()
+    is_scanning = bool(await redis_client.exists(f"scan_lock_for_{main_username}"))
+    is_cancelling = is_scanning and await ais_cancel_requested(redis_client, main_username)
     
-    snapshots = FollowerSnapshot.objects.filter(
+    # Only the header fields and list counts; the lists are paged in by the browser from user_list.
+    latest_snapshot = await FollowerSnapshot.objects.filter(
         profile=profile
-    ).order_by("-timestamp")[:2]
-    
-    unfollowers = []
-    not_following_back = []
-    
-    if len(snapshots) >= 2:
-        latest_snapshot = snapshots[0]
-        previous_snapshot = snapshots[1]
-        latest_followers = set(latest_snapshot.followers.all())
-        previous_followers = set(previous_snapshot.followers.all())
-        unfollower_users = previous_followers - latest_followers
-        unfollowers = [user.username for user in unfollower_users]
-        
-    if len(snapshots) >= 1:
-        latest_snapshot = snapshots[0]
-        followers = set(latest_snapshot.followers.all())
-        following = set(latest_snapshot.following.all())
-        not_following_back_users = following - followers
-        not_following_back = [user.username for user in not_following_back_users]
-        
+    ).only("timestamp", "scan_mode").order_by("-timestamp").afirst()
+    latest_diff = latest_snapshot and await SnapshotDiff.objects.filter(
+        snapshot=latest_snapshot
+    ).only("lost_followers_count", "not_following_back_count").afirst()
+    
     context = {
         "profile": profile,
-        "unfollowers": unfollowers,
-        "not_following_back": not_following_back,
-        "latest_snapshot_time": snapshots[0].timestamp if snapshots else "N/A",
-        "is_scanning": is_scanning
+        "latest_diff": latest_diff,
+        "latest_snapshot_time": latest_snapshot.timestamp if latest_snapshot else "N/A",
+        "is_partial_scan": bool(latest_snapshot) and latest_snapshot.scan_mode == FollowerSnapshot.INCREMENTAL,
+        "is_scanning": is_scanning,
+        "is_cancelling": is_cancelling
     }
     
     return render(
@@ -69,20 +77,27 @@ def trigger_scan(request: HttpRequest) -> Union[HttpResponseRedirect, HttpRespon
     password = settings.INSTA_PASSWORD
     
     if username and password:
-        scrape_followers_and_following.delay(username, password)
+        task = scrape_followers_and_following.delay(username, password)
+        get_redis().set(f"scan_queued_for_{username}", task.id, ex=3600)
+        record_scan_dispatch(get_redis(), task.id)
 
     return redirect("dashboard")
 
-def cancel_scan(request):
+async def cancel_scan(request):
     
     username = settings.INSTA_USER
-    redis_client = redis.from_url(settings.CELERY_BROKER_URL)
-    lock_key = f"scan_lock_for_{username}"
+    redis_client = get_async_redis()
     
-    is_scanning = redis_client.exists(f"scan_lock_for_{username}")
+    # Queued scans are revoked before they start; the running one (its task id leads
+    # the lease token) stops at its next page and keeps the lease until it has exited.
+    queued_task_id = await redis_client.getdel(f"scan_queued_for_{username}")
+    if queued_task_id:
+        # Revoking broadcasts through Celery's synchronous broker connection.
+        await sync_to_async(scrape_followers_and_following.AsyncResult(queued_task_id.decode()).revoke)()
     
-    if is_scanning:
-        redis_client.delete(lock_key)
+    running_task_id = lease_task_id(await redis_client.get(f"scan_lock_for_{username}"))
+    if running_task_id:
+        await arequest_cancel(redis_client, username, running_task_id)
         
     return redirect("dashboard")
     
@@ -107,4 +122,143 @@ def trigger_login(request):
     return JsonResponse({
         "message": "Instagram login process has been started in the background.",
         "task_id": task.id  # You can use this ID to check the task's status later
-    })
\ No newline at end of file
+    })
+
+
+def snapshot_diff(request: HttpRequest, from_id: int, to_id: int) -> JsonResponse:
+    """Changes between any two snapshots of the same profile, memoized per snapshot pair"""
+    cache_key = (from_id, to_id)
+    payload = snapshot_pair_cache.get(cache_key)
+    # The GC runs in another process and may have deleted either snapshot since the pair was cached.
+    if payload is not None and FollowerSnapshot.objects.filter(id__in=cache_key).count() < len(set(cache_key)):
+        snapshot_pair_cache.evict(cache_key)
+        payload = None
+    
+    if payload is None:
+        snapshots = FollowerSnapshot.objects.in_bulk([from_id, to_id])
+        from_snapshot = snapshots.get(from_id)
+        to_snapshot = snapshots.get(to_id)
+        
+        if not from_snapshot or not to_snapshot:
+            return JsonResponse({"error": "Snapshot not found."}, status=404)
+        
+        if from_snapshot.profile_id != to_snapshot.profile_id:
+            return JsonResponse({"error": "Snapshots belong to different profiles."}, status=400)
+        
+        changes = compare_snapshots(from_snapshot=from_snapshot, to_snapshot=to_snapshot)
+        payload = {
+            "profile_id": from_snapshot.profile_id,
+            "from_snapshot": {
+                "id": from_snapshot.id,
+                "timestamp": from_snapshot.timestamp.isoformat(),
+                "scan_mode": from_snapshot.scan_mode,
+            },
+            "to_snapshot": {
+                "id": to_snapshot.id,
+                "timestamp": to_snapshot.timestamp.isoformat(),
+                "scan_mode": to_snapshot.scan_mode,
+            },
+            **changes,
+            **{f"{name}_count": len(usernames) for name, usernames in changes.items()},
+        }
+        snapshot_pair_cache.put(cache_key, payload)
+    
+    return JsonResponse({**payload, "cache": snapshot_pair_cache.stats()})
+
+
+
+async def scan_status(request: HttpRequest) -> JsonResponse:
+    """Whether a scan is running and its latest progress event; only touches Redis"""
+    username = settings.INSTA_USER
+    redis_client = get_async_redis()
+    is_scanning = bool(await redis_client.exists(f"scan_lock_for_{username}"))
+    return JsonResponse({
+        "is_scanning": is_scanning,
+        "is_cancelling": is_scanning and await ais_cancel_requested(redis_client, username),
+        "progress": await alast_progress(redis_client, username),
+    })
+
+
+async def scan_progress(request: HttpRequest) -> StreamingHttpResponse:
+    """Server-Sent Events stream of the running scan's progress; holds no worker thread while idle"""
+    response = StreamingHttpResponse(
+        progress_event_stream(get_async_redis(), settings.INSTA_USER),
+        content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def history(request: HttpRequest) -> JsonResponse:
+    """Follower time series of the dashboard profile from the snapshot rollups: ?bucket=day|week|month&days=365"""
+    bucket = request.GET.get("bucket", "day")
+    if bucket not in BUCKETS:
+        return JsonResponse({"error": f"bucket must be one of {', '.join(BUCKETS)}."}, status=400)
+    try:
+        days = int(request.GET.get("days", 365))
+    except ValueError:
+        return JsonResponse({"error": "days must be an integer."}, status=400)
+    
+    profile = find_profile_user(settings.INSTA_USER)
+    series = []
+    if profile is not None:
+        series = follower_history(profile=profile, bucket=bucket, since=timezone.now() - timedelta(days=days))
+    return JsonResponse({"bucket": bucket, "days": days, "series": series})
+
+
+async def user_list(request: HttpRequest, kind: str) -> JsonResponse:
+    """One page of the dashboard's unfollowers or not_following_back list: ?q=<substring>&after=<cursor>&limit=50"""
+    if kind not in USER_LISTS:
+        return JsonResponse({"error": f"list must be one of {', '.join(USER_LISTS)}."}, status=404)
+    try:
+        limit = min(max(int(request.GET.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer."}, status=400)
+    search = request.GET.get("q", "").strip()
+    after = request.GET.get("after") or None
+    
+    profile = await afind_profile_user(settings.INSTA_USER)
+    latest_snapshot = profile and await FollowerSnapshot.objects.filter(profile=profile).only("id").order_by("-timestamp").afirst()
+    diff = latest_snapshot and await SnapshotDiff.objects.filter(snapshot=latest_snapshot, members_stored=True).only(
+        "lost_followers_count", "not_following_back_count"
+    ).afirst()
+    if diff:
+        users, total = stored_user_list(kind=kind, diff=diff), stored_list_count(kind=kind, diff=diff)
+    elif latest_snapshot:
+        # The diff isn't stored yet (scan still finishing, or not backfilled): compute the list off the event loop.
+        users, total = await sync_to_async(computed_user_list)(kind=kind, profile=profile), None
+    else:
+        users = None
+    if users is None:
+        return JsonResponse({"list": kind, "users": [], "next_cursor": None, "total": 0})
+    
+    if search:
+        users, total = matching_users(users, search), None
+    try:
+        # One extra row tells whether another page follows.
+        rows = [row async for row in user_list_page(users=users, after=after, limit=limit + 1)]
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    payload = {
+        "list": kind,
+        "users": [username for username, _ in rows[:limit]],
+        "next_cursor": encode_cursor(*rows[limit - 1]) if len(rows) > limit else None,
+    }
+    if after is None:
+        payload["total"] = total if total is not None else await users.acount()
+    return JsonResponse(payload)
+
+
+def scan_run_report(request: HttpRequest, scan_id: str) -> JsonResponse:
+    """Per-phase timings and API stats of one scan"""
+    scan_run = ScanRun.objects.filter(scan_id=scan_id).first()
+    if scan_run is None:
+        return JsonResponse({"error": "Scan not found."}, status=404)
+    return JsonResponse(scan_report(scan_run))
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Cumulative scan metrics for a Prometheus scrape"""
+    return HttpResponse(render_prometheus(get_redis()), content_type="text/plain; version=0.0.4; charset=utf-8")
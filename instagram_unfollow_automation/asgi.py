@@ -9,6 +9,8 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault(
@@ -16,3 +18,7 @@ os.environ.setdefault(
 )
 
 application = get_asgi_application()
+
+# runserver used to serve static files in development; uvicorn doesn't
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+from celery.schedules import crontab
 import environ 
 
 env = environ.Env() # Initialize environment variable manager
@@ -26,6 +27,84 @@ SECRET_KEY = env('SECRET_KEY', default='')  # type: ignore # Load secret key fro
 INSTA_USER = env('INSTA_USER', default='')  # type: ignore # Load secret key from environment variable
 INSTA_PASSWORD = env('INSTA_PASSWORD', default='')  # type: ignore # Load secret key from environment variable
 
+# Private API host used by the scrapers; point it at `instagram_automation.mock_instagram` for offline runs
+INSTAGRAM_BASE_URL = env('INSTAGRAM_BASE_URL', default='https://www.instagram.com')  # type: ignore
+
+# Rows per INSERT ... ON CONFLICT / bulk_create statement when persisting a snapshot
+SNAPSHOT_INGEST_BATCH_SIZE = env.int('SNAPSHOT_INGEST_BATCH_SIZE', default=5000)  # type: ignore
+# Fetched pages allowed to wait for the DB writer per list; bounds scraper memory
+SCRAPE_PAGES_IN_FLIGHT = env.int('SCRAPE_PAGES_IN_FLIGHT', default=4)  # type: ignore
+# Snapshot pair diffs kept in memory per web process
+SNAPSHOT_DIFF_CACHE_SIZE = env.int('SNAPSHOT_DIFF_CACHE_SIZE', default=256)  # type: ignore
+# Warm, logged-in headless browsers kept per Celery worker process
+CHROME_POOL_SIZE = env.int('CHROME_POOL_SIZE', default=1)  # type: ignore
+CHROME_POOL_MAX_USES = env.int('CHROME_POOL_MAX_USES', default=20)  # type: ignore
+CHROME_POOL_MAX_RSS_MB = env.int('CHROME_POOL_MAX_RSS_MB', default=1500)  # type: ignore
+# Extracted API session data and browser cookies are shared through Redis
+IG_SESSION_CACHE_TTL = env.int('IG_SESSION_CACHE_TTL', default=6 * 60 * 60)  # type: ignore
+IG_COOKIE_TTL = env.int('IG_COOKIE_TTL', default=30 * 24 * 60 * 60)  # type: ignore
+
+# Shared AIMD token bucket per Instagram session (requests/second and page `count`)
+IG_RATE_INITIAL = env.float('IG_RATE_INITIAL', default=1.0)  # type: ignore
+IG_RATE_MIN = env.float('IG_RATE_MIN', default=0.1)  # type: ignore
+IG_RATE_MAX = env.float('IG_RATE_MAX', default=3.0)  # type: ignore
+IG_RATE_BURST = env.float('IG_RATE_BURST', default=2.0)  # type: ignore
+IG_RATE_INCREASE = env.float('IG_RATE_INCREASE', default=0.02)  # type: ignore
+IG_RATE_DECREASE_FACTOR = env.float('IG_RATE_DECREASE_FACTOR', default=0.5)  # type: ignore
+IG_RATE_COOLDOWN = env.float('IG_RATE_COOLDOWN', default=7.5)  # type: ignore
+IG_RATE_STATE_TTL = env.int('IG_RATE_STATE_TTL', default=24 * 60 * 60)  # type: ignore
+IG_PAGE_COUNT_INITIAL = env.int('IG_PAGE_COUNT_INITIAL', default=25)  # type: ignore
+IG_PAGE_COUNT_MIN = env.int('IG_PAGE_COUNT_MIN', default=12)  # type: ignore
+IG_PAGE_COUNT_MAX = env.int('IG_PAGE_COUNT_MAX', default=50)  # type: ignore
+IG_PAGE_COUNT_STEP = env.int('IG_PAGE_COUNT_STEP', default=1)  # type: ignore
+
+# Open connections to Instagram shared by all accounts in one batch scan
+SCAN_GLOBAL_CONNECTION_LIMIT = env.int('SCAN_GLOBAL_CONNECTION_LIMIT', default=16)  # type: ignore
+
+# Incremental scans stop after this many consecutive pages already in the previous snapshot...
+SCAN_INCREMENTAL_STOP_PAGES = env.int('SCAN_INCREMENTAL_STOP_PAGES', default=2)  # type: ignore
+# ...and every Nth scan is a full reconciliation (1 disables incremental scans)
+SCAN_FULL_RECONCILE_EVERY = env.int('SCAN_FULL_RECONCILE_EVERY', default=10)  # type: ignore
+
+# Pages stored between scan checkpoints, and how long a checkpoint (and its cursor) may be resumed
+SCAN_CHECKPOINT_EVERY_PAGES = env.int('SCAN_CHECKPOINT_EVERY_PAGES', default=5)  # type: ignore
+SCAN_CHECKPOINT_TTL = env.int('SCAN_CHECKPOINT_TTL', default=30 * 60)  # type: ignore
+# Scan leases expire unless renewed; running stages renew them as pages arrive, and the renew_scan_leases
+# beat task renews those of scans waiting in a stage queue every interval, for at most SCAN_LEASE_MAX_QUEUE_WAIT seconds per wait
+SCAN_LEASE_TTL = env.int('SCAN_LEASE_TTL', default=5 * 60)  # type: ignore
+SCAN_LEASE_RENEW_INTERVAL = env.int('SCAN_LEASE_RENEW_INTERVAL', default=60)  # type: ignore
+SCAN_LEASE_MAX_QUEUE_WAIT = env.int('SCAN_LEASE_MAX_QUEUE_WAIT', default=60 * 60)  # type: ignore
+# Fetched id sets wait in Redis this long for the db stage of the scan pipeline
+SCAN_RESULT_TTL = env.int('SCAN_RESULT_TTL', default=24 * 60 * 60)  # type: ignore
+# Live progress events: at most one page event per interval, last event kept this long, SSE keepalive period
+SCAN_PROGRESS_MIN_INTERVAL = env.float('SCAN_PROGRESS_MIN_INTERVAL', default=0.5)  # type: ignore
+SCAN_PROGRESS_TTL = env.int('SCAN_PROGRESS_TTL', default=60 * 60)  # type: ignore
+SCAN_PROGRESS_KEEPALIVE = env.int('SCAN_PROGRESS_KEEPALIVE', default=15)  # type: ignore
+
+# Scheduled scans aim to see about SCAN_TARGET_CHANGES follower changes each, measured over the last
+# SCAN_CHURN_WINDOW snapshots, spaced between the min and max interval with ± jitter (a fraction of it)
+SCAN_TARGET_CHANGES = env.float('SCAN_TARGET_CHANGES', default=20.0)  # type: ignore
+SCAN_CHURN_WINDOW = env.int('SCAN_CHURN_WINDOW', default=10)  # type: ignore
+SCAN_INTERVAL_MIN_HOURS = env.float('SCAN_INTERVAL_MIN_HOURS', default=1.0)  # type: ignore
+SCAN_INTERVAL_MAX_HOURS = env.float('SCAN_INTERVAL_MAX_HOURS', default=72.0)  # type: ignore
+SCAN_SCHEDULE_JITTER = env.float('SCAN_SCHEDULE_JITTER', default=0.15)  # type: ignore
+# No scheduled scan starts between these local hours (equal values disable quiet hours)
+SCAN_QUIET_HOURS_START = env.int('SCAN_QUIET_HOURS_START', default=1)  # type: ignore
+SCAN_QUIET_HOURS_END = env.int('SCAN_QUIET_HOURS_END', default=7)  # type: ignore
+# Scans started per hour across all accounts, manual ones included, and seconds between scheduler runs
+SCAN_HOURLY_BUDGET = env.int('SCAN_HOURLY_BUDGET', default=12)  # type: ignore
+SCAN_SCHEDULER_INTERVAL = env.int('SCAN_SCHEDULER_INTERVAL', default=5 * 60)  # type: ignore
+
+# Connections per process in the shared Redis pools (each open progress stream holds one); callers wait beyond that
+REDIS_MAX_CONNECTIONS = env.int('REDIS_MAX_CONNECTIONS', default=200)  # type: ignore
+
+# Snapshot retention: every snapshot for N days, the newest per day until M days, the newest per week after that
+SNAPSHOT_KEEP_ALL_DAYS = env.int('SNAPSHOT_KEEP_ALL_DAYS', default=7)  # type: ignore
+SNAPSHOT_KEEP_DAILY_DAYS = env.int('SNAPSHOT_KEEP_DAILY_DAYS', default=90)  # type: ignore
+# Snapshots deleted per garbage collection run (one short transaction each) and users deleted per statement
+SNAPSHOT_GC_MAX_SNAPSHOTS = env.int('SNAPSHOT_GC_MAX_SNAPSHOTS', default=200)  # type: ignore
+SNAPSHOT_GC_USER_BATCH_SIZE = env.int('SNAPSHOT_GC_USER_BATCH_SIZE', default=5000)  # type: ignore
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env('DJANGO_DEBUG', default=False) # type: ignore
 
@@ -46,6 +125,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "instagram_automation"
 ]
 
@@ -167,4 +247,37 @@ CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
\ No newline at end of file
+CELERY_RESULT_SERIALIZER = 'json'
+# Scan pipeline stages run on their own queues so each worker pool can be sized
+# to its bottleneck: Chrome memory (browser), sockets (io) and DB connections (db).
+# Lease renewals get a queue of their own so they never wait behind a busy stage.
+CELERY_TASK_ROUTES = {
+    'instagram_automation.tasks.bootstrap_scan_session': {'queue': 'browser'},
+    'instagram_automation.tasks.perform_instagram_login': {'queue': 'browser'},
+    'instagram_automation.tasks.bootstrap_batch_session': {'queue': 'browser'},
+    'instagram_automation.tasks.fetch_scan_lists': {'queue': 'io'},
+    'instagram_automation.tasks.fetch_batch_lists': {'queue': 'io'},
+    'instagram_automation.tasks.persist_scan_snapshot': {'queue': 'db'},
+    'instagram_automation.tasks.release_scan_lease': {'queue': 'db'},
+    'instagram_automation.tasks.release_batch_leases': {'queue': 'db'},
+    'instagram_automation.tasks.scan_accounts_batch': {'queue': 'db'},
+    'instagram_automation.tasks.collect_snapshot_garbage': {'queue': 'db'},
+    'instagram_automation.tasks.schedule_due_scans': {'queue': 'db'},
+    'instagram_automation.tasks.renew_scan_leases': {'queue': 'leases'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'collect-snapshot-garbage': {
+        'task': 'instagram_automation.tasks.collect_snapshot_garbage',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'schedule-due-scans': {
+        'task': 'instagram_automation.tasks.schedule_due_scans',
+        'schedule': SCAN_SCHEDULER_INTERVAL,
+    },
+    'renew-scan-leases': {
+        'task': 'instagram_automation.tasks.renew_scan_leases',
+        'schedule': SCAN_LEASE_RENEW_INTERVAL,
+        # A renewal that couldn't run in time is superseded by the next one.
+        'options': {'expires': SCAN_LEASE_RENEW_INTERVAL},
+    },
+}